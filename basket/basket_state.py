@@ -1,5 +1,6 @@
+from collections import Counter
 from enum import Enum
-from typing import List
+from typing import Iterable, List
 
 
 class BilledState(Enum):
@@ -69,21 +70,18 @@ class BasketState:
         self._billing_state = billing_state
 
     @staticmethod
-    def get_products_in_basket_state(item_list: List[str]) -> List['BasketState']:
+    def get_products_in_basket_state(item_list: Iterable[str]) -> List['BasketState']:
         """
         This function converts items entered on console to basketState clubbing together important information
         such as  quantity purchased and its billing state. Initially billingState is set to BillingState.Unprocessed.
 
+        Items are counted in a single pass so item_list can be any iterable, products are in the order they were
+        first entered. SkuBasket keeps the counts without creating a BasketState for each product
+
         :param item_list - is the list of product names entered from console
         :return: returns converted list of product names entered through theconsole into BasketState
         """
-        basket_products = []
-
-        for x in set(item_list):
-            basket_product = BasketState(x, item_list.count(x), BilledState.Unprocessed)
-            basket_products.append(basket_product)
-
-        return basket_products
+        return [BasketState(x, quantity, BilledState.Unprocessed) for x, quantity in Counter(item_list).items()]
 
     def change_billing_state(self):
         if self._billing_state == BilledState.Unprocessed:
@@ -0,0 +1,80 @@
+from collections import Counter
+from typing import Iterable, Iterator, List
+
+from basket.basket_state import BasketState, BilledState
+
+
+class SkuBasket:
+    """
+    This class represents a basket as the quantity purchased of each SKU/Product
+
+    Items are counted in a single pass as they are scanned so building the basket takes linear time in the number
+    of items, and scanned items can come from any iterable, e.g. a generator reading a wholesale order, without
+    being held in a list. Only one entry is kept per SKU instead of one BasketState per item.
+    SKUs are kept in the order they were first scanned
+
+    to_basket_states converts the basket to the list of BasketState which PriceBasket prices
+        ...
+    Attributes
+    ----------
+    _quantities : Counter
+        name of the SKU/Product to the quantity purchased
+    """
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_quantities']
+
+    def __init__(self, items: Iterable[str] = ()):
+        self._quantities = Counter(items)
+
+    @staticmethod
+    def from_quantities(quantities: Iterable[tuple[str, int]]) -> 'SkuBasket':
+        """
+        Creates a basket from (SKU, quantity) pairs, quantities of the same SKU are added together
+        :param quantities: iterable of SKU and quantity pairs
+        :return: SkuBasket
+        """
+        basket = SkuBasket()
+        for sku, quantity in quantities:
+            basket.add(sku, quantity)
+        return basket
+
+    @property
+    def quantities(self):
+        return self._quantities
+
+    def add(self, sku: str, quantity: int = 1) -> None:
+        self._quantities[sku] += quantity
+
+    def update(self, items: Iterable[str]) -> None:
+        """
+        Adds scanned items to the basket
+        :param items: iterable of names of SKU/Product
+        :return: None
+        """
+        self._quantities.update(items)
+
+    def get_quantity(self, sku: str) -> int:
+        return self._quantities.get(sku, 0)
+
+    def total_quantity(self) -> int:
+        return sum(self._quantities.values())
+
+    def to_basket_states(self) -> List[BasketState]:
+        """
+        Converts the basket to products in BasketState, initially billingState is set to BillingState.Unprocessed
+        :return: list of BasketState, one for each SKU
+        """
+        return [BasketState(sku, quantity, BilledState.Unprocessed) for sku, quantity in self._quantities.items()]
+
+    def __len__(self):
+        return len(self._quantities)
+
+    def __iter__(self) -> Iterator[tuple[str, int]]:
+        return iter(self._quantities.items())
+
+    def __eq__(self, other):
+        return isinstance(other, SkuBasket) and self._quantities == other._quantities
+
+    def __repr__(self):
+        return f"SkuBasket: _quantities = {dict(self._quantities)}"
@@ -0,0 +1,68 @@
+"""
+Compares throughput of the float pricing path (PriceBasket) with the integer pence pricing path
+(PencePriceBasket), both from basket to display strings, and with the compact path (CompactPriceBasket) which
+keeps integer totals and only aggregates them unless --format is given
+
+Run from the project directory:
+    python -m benchmarks.bench_pence_pricing [--baskets N] [--repeat R] [--format]
+"""
+import argparse
+import timeit
+
+from basket.basket_state import BasketState
+from price_basket_result_display.PriceBasketResultDisplay import PriceBasketResultDisplay
+from pricebasket.compact_price_basket import CompactPriceBasket
+from pricebasket.pence_price_basket import PencePriceBasket
+from pricebasket.price_basket import PriceBasket
+
+BASKETS = [['apples', 'milk', 'bread'], ['bread', 'bread'], ['soup', 'soup', 'bread'], ['milk'],
+           ['apples', 'apples', 'soup', 'milk']]
+
+
+def get_baskets(count: int) -> list:
+    return [BasketState.get_products_in_basket_state(BASKETS[i % len(BASKETS)]) for i in range(count)]
+
+
+def price_float(price_basket: PriceBasket, baskets: list) -> None:
+    for basket in baskets:
+        sub_total, total, discounted_items = price_basket.price_basket(basket)
+        repr(PriceBasketResultDisplay(sub_total, discounted_items, total))
+
+
+def price_pence(price_basket: PencePriceBasket, baskets: list) -> None:
+    for basket in baskets:
+        sub_total, total, discounted_items = price_basket.price_basket(basket)
+        repr(PriceBasketResultDisplay.from_pence(sub_total, discounted_items, total))
+
+
+def price_compact(price_basket: CompactPriceBasket, baskets: list, formatted: bool) -> int:
+    total_pence = 0
+    for basket in baskets:
+        result = price_basket.price_basket_result(basket)
+        total_pence += result.total_pence
+        if formatted:
+            repr(PriceBasketResultDisplay.from_result(result))
+    return total_pence
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--baskets', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--format', action='store_true', help="format receipts of the compact path too")
+    args = parser.parse_args()
+
+    paths = [("float", PriceBasket(), price_float), ("pence", PencePriceBasket(), price_pence),
+             ("compact", CompactPriceBasket(), lambda x, y: price_compact(x, y, args.format))]
+    for name, price_basket, price in paths:
+        # baskets are prepared outside the timer as pricing updates their billing state
+        timings = []
+        for _ in range(args.repeat):
+            baskets = get_baskets(args.baskets)
+            timings.append(timeit.timeit(lambda: price(price_basket, baskets), number=1))
+        best = min(timings)
+        print(f"{name}: {args.baskets / best:,.0f} baskets/s (best of {args.repeat}, {best * 1000:.1f} ms)")
+
+
+if __name__ == '__main__':
+    main()
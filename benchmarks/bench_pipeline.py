@@ -0,0 +1,152 @@
+"""
+Measures each phase of the pricing pipeline on a synthetic catalog: preparing the cart products cache
+(prepare_cart_products), loading the cache, building BasketState from the items entered, pricing the baskets
+(PriceBasket.price_basket) and rendering the results (PriceBasketResultDisplay)
+
+Phases run once per basket are timed per basket and reported as percentiles, the others are timed per run.
+Results are printed and can be written as JSON to compare runs over time.
+Caches are written in a temporary directory, the project cache is not modified
+
+Run from the project directory:
+    python -m benchmarks.bench_pipeline [--products N] [--offers M] [--baskets K] [--basket-size S]
+                                        [--seed S] [--repeat R] [--out results.json]
+"""
+import argparse
+import json
+import os
+import pickle
+import platform
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+from basket.basket_state import BasketState
+from benchmarks.synthetic_catalog import SyntheticCatalog
+from price_basket_result_display.PriceBasketResultDisplay import PriceBasketResultDisplay
+from pricebasket.cart_product import CartProduct
+from pricebasket.catalog_snapshot import CART_PRODUCTS_CACHE, CatalogSnapshot
+from pricebasket.price_basket import PriceBasket
+
+
+def summarize(samples: list) -> dict:
+    """
+    Returns count, mean and nearest rank percentiles of samples in seconds, reported in microseconds
+    :param samples: timings in seconds
+    :return: summary of the timings
+    """
+    ordered = sorted(samples)
+    count = len(ordered)
+    summary = {"count": count, "mean_us": sum(ordered) / count * 1e6}
+    for percentile in (50, 90, 99):
+        summary[f"p{percentile}_us"] = ordered[min(count - 1, max(0, -(-percentile * count // 100) - 1))] * 1e6
+    summary["max_us"] = ordered[-1] * 1e6
+    summary["total_s"] = sum(ordered)
+    return summary
+
+
+def load(path: str):
+    with open(path, 'rb') as in_file:
+        return pickle.load(in_file)
+
+
+def run_benchmark(products: int = 10000, offers: int = 1000, baskets: int = 10000, basket_size: int = 10,
+                  seed: int = 0, repeat: int = 3) -> dict:
+    """
+    Runs every phase of the pipeline on a generated catalog
+    :return: parameters of the run and summary of the timings of each phase
+    """
+    catalog = SyntheticCatalog(products, offers, seed)
+    entered_baskets = catalog.generate_baskets(baskets, basket_size)
+    phases = {}
+
+    # caches are given by path, the working directory of the process is not changed
+    directory = tempfile.mkdtemp()
+    cache_path = os.path.join(directory, os.path.basename(CART_PRODUCTS_CACHE))
+    try:
+        service_caches = []
+        for name, data in [('products.pkl', catalog.products), ('pricelist.pkl', catalog.price_list),
+                           ('offers.pkl', catalog.offers)]:
+            service_caches.append(os.path.join(directory, name))
+            with open(service_caches[-1], 'wb') as out_file:
+                pickle.dump(data, out_file)
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            # services data is read from its caches as prepare_cart_products does without arguments
+            products_data, price_list, offers_data = [load(x) for x in service_caches]
+            CartProduct.prepare_cart_products(products_data, offers_data, price_list, path=cache_path)
+            timings.append(time.perf_counter() - started)
+        phases["prepare_cart_products"] = summarize(timings)
+
+        timings = []
+        for _ in range(repeat):
+            snapshot = CatalogSnapshot(cache_path)
+            started = time.perf_counter()
+            snapshot.get()
+            timings.append(time.perf_counter() - started)
+        phases["cache_load"] = summarize(timings)
+
+        timings = []
+        basket_states = []
+        for basket in entered_baskets:
+            started = time.perf_counter()
+            basket_state = BasketState.get_products_in_basket_state(basket)
+            timings.append(time.perf_counter() - started)
+            basket_states.append(basket_state)
+        phases["basket_state"] = summarize(timings)
+
+        price_basket = PriceBasket(snapshot)
+        timings = []
+        results = []
+        for basket_state in basket_states:
+            started = time.perf_counter()
+            result = price_basket.price_basket(basket_state)
+            timings.append(time.perf_counter() - started)
+            results.append(result)
+        phases["price_basket"] = summarize(timings)
+
+        timings = []
+        for sub_total, total, discounted_items in results:
+            started = time.perf_counter()
+            repr(PriceBasketResultDisplay(sub_total, discounted_items, total))
+            timings.append(time.perf_counter() - started)
+        phases["render"] = summarize(timings)
+    finally:
+        shutil.rmtree(directory)
+
+    return {
+        "benchmark": "pipeline",
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {"products": products, "offers": offers, "baskets": baskets, "basket_size": basket_size,
+                       "seed": seed, "repeat": repeat},
+        "phases": phases,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--offers', type=int, default=1000)
+    parser.add_argument('--baskets', type=int, default=10000)
+    parser.add_argument('--basket-size', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--out', help="JSON file to write the results to")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.products, args.offers, args.baskets, args.basket_size, args.seed, args.repeat)
+    for name, summary in results["phases"].items():
+        print(f"{name}: p50 {summary['p50_us']:,.1f} us, p90 {summary['p90_us']:,.1f} us, "
+              f"p99 {summary['p99_us']:,.1f} us, max {summary['max_us']:,.1f} us ({summary['count']} samples)")
+
+    if args.out:
+        with open(args.out, 'w') as out_file:
+            json.dump(results, out_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Compares checking offer conditions with RuleInferenceEngine.all_conditions_satisfy (interpreted on every call)
+and with conditions compiled once by RuleInferenceEngine.compile_conditions
+
+Run from the project directory:
+    python -m benchmarks.bench_rule_engine [--conditions N] [--number N]
+"""
+import argparse
+import timeit
+
+from basket.basket_state import BasketState
+from rule_engine.condition_rule import ConditionRule
+from rule_engine.custom_operator import CustomOperator
+from rule_engine.rule_inference_engine import RuleInferenceEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--conditions', type=int, default=3)
+    parser.add_argument('--number', type=int, default=200000)
+    args = parser.parse_args()
+
+    conditions = [ConditionRule(CustomOperator.EqualOrGreater if x % 2 else CustomOperator.Equal, "soup", 2)
+                  for x in range(args.conditions)]
+    compiled_rule = RuleInferenceEngine.compile_conditions(conditions)
+    baskets = [BasketState("soup", 2), BasketState("soup", 3)]
+
+    timings = {
+        "interpreted": min(timeit.repeat(lambda: [RuleInferenceEngine.all_conditions_satisfy(conditions, x)
+                                                  for x in baskets], number=args.number, repeat=3)),
+        "compiled": min(timeit.repeat(lambda: [compiled_rule.satisfied(x) for x in baskets],
+                                      number=args.number, repeat=3)),
+    }
+    checks = args.number * len(baskets)
+    for name, seconds in timings.items():
+        print(f"{name}: {seconds / checks * 1e9:.0f} ns per check")
+    print(f"speedup: {timings['interpreted'] / timings['compiled']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
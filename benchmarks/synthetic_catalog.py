@@ -0,0 +1,120 @@
+"""
+Seeded generator of synthetic catalogs and baskets for the benchmarks, the mock services only have four products
+
+The same seed always generates the same products, prices, offers and baskets so runs can be compared over time
+"""
+import datetime as dt
+import random
+import uuid
+
+from mock_services.offer import OfferFlat, OfferGroup
+from mock_services.price import Price
+from mock_services.product import Product
+from rule_engine.condition_rule import ConditionRule
+from rule_engine.custom_operator import CustomOperator
+
+PRODUCT_TYPES = ['drinks', 'bakery', 'fruit', 'dairy', 'frozen', 'household']
+UNITS = ['tin', 'loaf', 'bottle', 'bag', 'box', 'pack']
+
+
+class SyntheticCatalog:
+    """
+    This class represents a generated catalog of products, their prices and offers as returned by the services
+
+    Descriptions all have the same length so that no description is a part of another one and every item
+    of a basket matches exactly one product.
+    Offers are on distinct products, a quarter of them are OfferGroup (buy some of a product and get another
+    product at a discount) and the rest are OfferFlat
+        ...
+    Attributes
+    ----------
+    _products : list
+        products as returned by the products service
+    _price_list : list
+        prices as returned by the price service
+    _offers : list
+        offers as returned by the offers service
+    _random : Random
+        seeded generator of the baskets
+    """
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_products', '_price_list', '_offers', '_random']
+
+    def __init__(self, products: int = 1000, offers: int = 100, seed: int = 0):
+        if offers > products // 2:
+            raise ValueError(f"offers must be at most half of products, got {offers} offers for {products} products")
+        generator = random.Random(seed)
+
+        self._products = [Product(str(uuid.UUID(int=generator.getrandbits(128), version=4)),
+                                  f"product{x:07d}",
+                                  generator.choice(PRODUCT_TYPES),
+                                  0.0,
+                                  generator.choice(UNITS)) for x in range(products)]
+        self._price_list = [Price(x.product_id, generator.randint(10, 1000) / 100) for x in self._products]
+
+        start_date = dt.datetime(2022, 2, 12)
+        end_date = dt.datetime(2022, 3, 12)
+        # two products for each offer so that group offers have distinct discounted products
+        offer_products = generator.sample(self._products, 2 * offers)
+        self._offers = []
+        for x in range(offers):
+            product, discounted_product = offer_products[2 * x], offer_products[2 * x + 1]
+            offer_id = uuid.UUID(int=generator.getrandbits(128), version=4)
+            if x % 4 == 3:
+                quantity = generator.randint(1, 3)
+                operator = generator.choice([CustomOperator.Equal, CustomOperator.EqualOrGreater])
+                self._offers.append(OfferGroup(offer_id,
+                                               f"Buy {quantity} {product.product_description} and get "
+                                               f"{discounted_product.product_description} at a discount",
+                                               [product.product_id], start_date, end_date, True,
+                                               discounted_product.product_id, generator.choice([25, 50]),
+                                               [ConditionRule(operator, product.product_id, quantity)]))
+            else:
+                discount = generator.choice([5, 10, 20, 30])
+                self._offers.append(OfferFlat(offer_id,
+                                              f"{product.product_description} have {discount}% off",
+                                              product.product_id, start_date, end_date, True, discount))
+
+        self._random = random.Random(seed + 1)
+
+    @property
+    def products(self):
+        return self._products
+
+    @property
+    def price_list(self):
+        return self._price_list
+
+    @property
+    def offers(self):
+        return self._offers
+
+    def generate_baskets(self, count: int, size: int, offer_share: float = 0.5) -> list:
+        """
+        Generates baskets as lists of descriptions entered by the user
+        :param count: number of baskets
+        :param size: number of items in each basket
+        :param offer_share: share of the items which are products having an offer or discounted by an offer
+        :return: list of baskets
+        """
+        descriptions = [x.product_description for x in self._products]
+        by_id = {x.product_id: x.product_description for x in self._products}
+        offer_descriptions = []
+        for offer in self._offers:
+            if isinstance(offer, OfferGroup):
+                offer_descriptions.extend(by_id[x] for x in offer.product_id)
+                offer_descriptions.append(by_id[offer.discounted_product_id])
+            else:
+                offer_descriptions.append(by_id[offer.product_id])
+
+        baskets = []
+        for _ in range(count):
+            basket = []
+            for _ in range(size):
+                if offer_descriptions and self._random.random() < offer_share:
+                    basket.append(self._random.choice(offer_descriptions))
+                else:
+                    basket.append(self._random.choice(descriptions))
+            baskets.append(basket)
+        return baskets
@@ -0,0 +1,446 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, Optional
+
+from logs.logging import CustomLogging
+
+# upper bounds in seconds, suited to latencies from a basket (microseconds) to a catalog rebuild (seconds)
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """
+    This class represents a count which only goes up, e.g. number of catalog lookups
+        ...
+    Attributes
+    ----------
+    _name : str
+        name of the metric as exported
+    _description : str
+        what is counted
+    _value : int
+        count
+    _lock : Lock
+        so that threads pricing baskets don't lose increments
+    """
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_name', '_description', '_value', '_lock']
+
+    def __init__(self, name: str, description: str = ""):
+        self._name = name
+        self._description = description
+        self._value = 0
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def description(self):
+        return self._description
+
+    @property
+    def value(self):
+        return self._value
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def __getstate__(self):
+        # the lock is not sent to other processes
+        return self._name, self._description, self._value
+
+    def __setstate__(self, state):
+        self._name, self._description, self._value = state
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"Counter: name = {self._name}, value = {self._value}"
+
+
+class Histogram:
+    """
+    This class represents the distribution of observed values, e.g. latency of pricing a basket,
+    as counts of values in buckets like a Prometheus histogram
+        ...
+    Attributes
+    ----------
+    _name : str
+        name of the metric as exported
+    _description : str
+        what is observed
+    _buckets : tuple
+        sorted upper bounds of the buckets, values above the last bound are only in count
+    _bucket_counts : list
+        number of values observed in each bucket (not cumulative)
+    _count : int
+        number of values observed
+    _sum : float
+        sum of values observed
+    _lock : Lock
+        so that observations from several threads are not lost
+    """
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_name', '_description', '_buckets', '_bucket_counts', '_count', '_sum', '_lock']
+
+    def __init__(self, name: str, description: str = "", buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self._name = name
+        self._description = description
+        self._buckets = tuple(sorted(buckets))
+        self._bucket_counts = [0] * (len(self._buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def description(self):
+        return self._description
+
+    @property
+    def buckets(self):
+        return self._buckets
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def sum(self):
+        return self._sum
+
+    def observe(self, value: float) -> None:
+        position = bisect_left(self._buckets, value)
+        with self._lock:
+            self._bucket_counts[position] += 1
+            self._count += 1
+            self._sum += value
+
+    def merge(self, other: 'Histogram') -> None:
+        """
+        Adds the values observed by another histogram with the same buckets, e.g. by a worker process
+        :param other: histogram to add
+        :return: None
+        """
+        if other.buckets != self._buckets:
+            raise ValueError(f"histogram {self._name} can't be merged with different buckets")
+        with self._lock:
+            for position, count in enumerate(other._bucket_counts):
+                self._bucket_counts[position] += count
+            self._count += other.count
+            self._sum += other.sum
+
+    def __getstate__(self):
+        # the lock is not sent to other processes
+        return self._name, self._description, self._buckets, self._bucket_counts, self._count, self._sum
+
+    def __setstate__(self, state):
+        self._name, self._description, self._buckets, self._bucket_counts, self._count, self._sum = state
+        self._lock = threading.Lock()
+
+    def cumulative_counts(self) -> list:
+        """
+        Returns number of values less than or equal to each upper bound, as exported to Prometheus
+        :return: list of counts, one for each bucket
+        """
+        with self._lock:
+            counts = list(self._bucket_counts)
+        cumulative = []
+        total = 0
+        for count in counts[:-1]:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Returns the upper bound of the bucket holding the q quantile, None if nothing has been observed
+        or the quantile is above the last bucket
+        :param q: quantile between 0 and 1
+        :return: upper bound of the bucket
+        """
+        if self._count == 0:
+            return None
+        rank = q * self._count
+        for bound, count in zip(self._buckets, self.cumulative_counts()):
+            if count >= rank:
+                return bound
+        return None
+
+    def __repr__(self):
+        return f"Histogram: name = {self._name}, count = {self._count}, sum = {self._sum}"
+
+
+class _Timer:
+    """
+    Context manager observing the time spent in its block in a histogram
+    """
+
+    __slots__ = ['_histogram', '_started']
+
+    def __init__(self, histogram: Histogram):
+        self._histogram = histogram
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._histogram.observe(time.perf_counter() - self._started)
+        return False
+
+
+class _NoTimer:
+    """
+    Context manager doing nothing, used when metrics are not enabled
+    """
+
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NO_TIMER = _NoTimer()
+
+
+class MetricsRegistry:
+    """
+    This class represents the counters and histograms recorded by the process
+
+    Recording is off by default. Code recording metrics calls MetricsRegistry.active() which returns None when
+    metrics are not enabled, so the only cost when they are off is that call and a None check. Hot paths such as
+    PriceBasket.price_basket call it once per basket, not once per value recorded.
+
+    Metrics are created on first use by name and can be exported as a text snapshot or in Prometheus exposition
+    format, to a file which is replaced atomically, once or periodically by SnapshotWriter.
+    Registries can be pickled and merged, worker processes record in their own registry which is merged in the
+    registry of the parent process
+
+    This class is thread safe
+        ...
+    Attributes
+    ----------
+    _metrics : dict
+        name to Counter or Histogram, in the order they were created
+    _lock : Lock
+        so that a metric is created only once
+    """
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_metrics', '_lock']
+
+    # registry recording metrics, None when metrics are not enabled
+    _active: Optional['MetricsRegistry'] = None
+
+    def __init__(self):
+        self._metrics: Dict = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def enable(registry: 'MetricsRegistry' = None) -> 'MetricsRegistry':
+        """
+        Starts recording metrics in registry, a new registry if None
+        :param registry: registry to record metrics in
+        :return: registry recording metrics
+        """
+        if registry is None:
+            registry = MetricsRegistry._active or MetricsRegistry()
+        MetricsRegistry._active = registry
+        return registry
+
+    @staticmethod
+    def disable() -> None:
+        MetricsRegistry._active = None
+
+    @staticmethod
+    def active() -> Optional['MetricsRegistry']:
+        return MetricsRegistry._active
+
+    @staticmethod
+    def timed(name: str, description: str = ""):
+        """
+        Returns a context manager observing the time spent in its block in the histogram name of the active
+        registry, it does nothing if metrics are not enabled
+        :param name: name of the histogram
+        :param description: what is timed
+        :return: context manager
+        """
+        registry = MetricsRegistry._active
+        if registry is None:
+            return _NO_TIMER
+        return _Timer(registry.histogram(name, description))
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(name, Counter(name, description))
+        return metric
+
+    def histogram(self, name: str, description: str = "", buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(name, Histogram(name, description, buckets))
+        return metric
+
+    def get(self, name: str) -> Optional:
+        return self._metrics.get(name)
+
+    def merge(self, other: 'MetricsRegistry') -> None:
+        """
+        Adds the metrics recorded in another registry, e.g. by a worker process pricing a chunk of baskets
+        :param other: registry to add
+        :return: None
+        """
+        for metric in list(other._metrics.values()):
+            if isinstance(metric, Counter):
+                self.counter(metric.name, metric.description).inc(metric.value)
+            else:
+                self.histogram(metric.name, metric.description, metric.buckets).merge(metric)
+
+    def __getstate__(self):
+        # registries recorded by worker processes are sent back to be merged, the lock is not sent
+        return self._metrics
+
+    def __setstate__(self, state):
+        self._metrics = state
+        self._lock = threading.Lock()
+
+    def to_text(self) -> str:
+        """
+        Returns a human readable snapshot of the metrics, histograms are shown with count, mean and the bucket
+        upper bounds of their median and 99th percentile
+        :return: snapshot
+        """
+        lines = [f"# metrics at {time.strftime('%Y-%m-%d %H:%M:%S')}"]
+        for metric in list(self._metrics.values()):
+            if isinstance(metric, Counter):
+                lines.append(f"{metric.name} {metric.value}")
+            else:
+                mean = metric.sum / metric.count if metric.count else 0.0
+                lines.append(f"{metric.name} count={metric.count} mean={mean:.6f}s "
+                             f"p50<={metric.quantile(0.5)}s p99<={metric.quantile(0.99)}s")
+        return "\n".join(lines) + "\n"
+
+    def to_prometheus(self) -> str:
+        """
+        Returns the metrics in Prometheus text exposition format
+        :return: metrics
+        """
+        lines = []
+        for metric in list(self._metrics.values()):
+            if metric.description:
+                lines.append(f"# HELP {metric.name} {metric.description}")
+            if isinstance(metric, Counter):
+                lines.append(f"# TYPE {metric.name} counter")
+                lines.append(f"{metric.name} {metric.value}")
+            else:
+                lines.append(f"# TYPE {metric.name} histogram")
+                for bound, count in zip(metric.buckets, metric.cumulative_counts()):
+                    lines.append(f'{metric.name}_bucket{{le="{bound}"}} {count}')
+                lines.append(f'{metric.name}_bucket{{le="+Inf"}} {metric.count}')
+                lines.append(f"{metric.name}_sum {metric.sum}")
+                lines.append(f"{metric.name}_count {metric.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_text(self, path: str) -> None:
+        MetricsRegistry._write(path, self.to_text())
+
+    def write_prometheus(self, path: str) -> None:
+        MetricsRegistry._write(path, self.to_prometheus())
+
+    @staticmethod
+    def _write(path: str, content: str) -> None:
+        # readers such as a node exporter never see a partially written file
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, 'w') as out_file:
+            out_file.write(content)
+        os.replace(temporary_path, path)
+
+    def __repr__(self):
+        return f"MetricsRegistry: metrics = {len(self._metrics)}"
+
+
+class SnapshotWriter:
+    """
+    This class represents a background thread writing the metrics of a registry to files periodically
+        ...
+    Attributes
+    ----------
+    _registry : MetricsRegistry
+        registry whose metrics are written
+    _interval : float
+        seconds between two writes
+    _text_path : str
+        file the text snapshot is written to, not written if None
+    _prometheus_path : str
+        file the metrics in Prometheus format are written to, not written if None
+    _stopped : Event
+        set to stop the thread
+    _thread : Thread
+        thread writing the files
+    """
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_registry', '_interval', '_text_path', '_prometheus_path', '_stopped', '_thread']
+
+    def __init__(self, registry: MetricsRegistry, interval: float = 60.0, text_path: str = None,
+                 prometheus_path: str = None):
+        self._registry = registry
+        self._interval = interval
+        self._text_path = text_path
+        self._prometheus_path = prometheus_path
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self) -> 'SnapshotWriter':
+        self._thread = threading.Thread(target=self._run, name="metrics-snapshot-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Stops the thread after writing the files one last time
+        :return: None
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def write(self) -> None:
+        if self._text_path:
+            self._registry.write_text(self._text_path)
+        if self._prometheus_path:
+            self._registry.write_prometheus(self._prometheus_path)
+
+    def _run(self) -> None:
+        while True:
+            stopped = self._stopped.wait(self._interval)
+            try:
+                self.write()
+            except Exception as e:
+                CustomLogging.log_error(e)
+            if stopped:
+                break
+
+    def __repr__(self):
+        return f"SnapshotWriter: interval = {self._interval}," \
+               f"text_path = {self._text_path}," \
+               f"prometheus_path = {self._prometheus_path}"
@@ -1,5 +1,103 @@
+import atexit
 import logging
-from logging.handlers import TimedRotatingFileHandler
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from typing import Dict, Optional
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """
+    Queue handler which never blocks the logging thread and leaves formatting to the listener thread
+
+    Records are put on the queue as they are, the traceback is formatted by the file handler of the listener.
+    When the queue is full the record is dropped and counted instead of waiting for the listener
+        ...
+    Attributes
+    ----------
+    dropped : int
+        number of records dropped because the queue was full
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _RepeatLimiter:
+    """
+    Limits how often the same exception is logged, exceptions are the same when they have the same type,
+    message and the line they were raised at.
+    An exception is logged the first time and then at most once every interval seconds, the repeats in
+    between are only counted
+        ...
+    Attributes
+    ----------
+    _interval : float
+        seconds between two records of the same exception
+    _max_keys : int
+        number of distinct exceptions remembered, all are forgotten when it is reached
+    _last : dict
+        exception key to the time it was last logged and the number of repeats suppressed since
+    _suppressed : int
+        number of records suppressed since the limiter was created
+    _lock : Lock
+        as pricing threads log concurrently
+    """
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_interval', '_max_keys', '_last', '_suppressed', '_lock']
+
+    def __init__(self, interval: float, max_keys: int = 1024):
+        self._interval = interval
+        self._max_keys = max_keys
+        self._last: Dict[tuple, list] = {}
+        self._suppressed = 0
+        self._lock = threading.Lock()
+
+    @property
+    def suppressed(self):
+        return self._suppressed
+
+    @staticmethod
+    def key(e: BaseException) -> tuple:
+        traceback = e.__traceback__
+        while traceback is not None and traceback.tb_next is not None:
+            traceback = traceback.tb_next
+        if traceback is None:
+            return type(e), str(e), None, None
+        return type(e), str(e), traceback.tb_frame.f_code.co_filename, traceback.tb_lineno
+
+    def allow(self, e: BaseException) -> Optional[int]:
+        """
+        Returns None if the exception must not be logged else the number of its repeats suppressed since
+        it was last logged
+        :param e: exception to log
+        :return: number of repeats suppressed or None
+        """
+        key = _RepeatLimiter.key(e)
+        now = time.monotonic()
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last[0] < self._interval:
+                last[1] += 1
+                self._suppressed += 1
+                return None
+
+            if last is None and len(self._last) >= self._max_keys:
+                self._last.clear()
+            self._last[key] = [now, 0]
+            return 0 if last is None else last[1]
 
 
 class CustomLogging:
@@ -8,18 +106,107 @@ class CustomLogging:
        It can be extended/modified in future without making in other classes.
        In improves cohesiveness, code reusability and code maintainability.
 
-       Currently, it creates a date appended file for each day to maintain day wise logs
+       Currently, it creates a date appended file for each day to maintain day wise logs, in logs/app.log
+       unless another path is given.
+       With delay True the log file is opened only when the first record is written.
+
+       With queued True records are put on a bounded queue and a listener thread formats and writes them,
+       so threads logging errors while pricing never wait for the traceback to be formatted or for the file.
+       Records are dropped and counted when the queue is full, and an exception raised again at the same
+       line with the same message is logged at most once every repeat_interval seconds, the repeats are counted
+       and their number is added to the next record of that exception.
+
+       Creating it again does not add another handler, except to switch to the queued mode
     """
-    def __init__(self):
+
+    _file_handler: Optional[TimedRotatingFileHandler] = None
+    _queue_handler: Optional[_DroppingQueueHandler] = None
+    _listener: Optional[QueueListener] = None
+    _repeat_limiter: Optional[_RepeatLimiter] = None
+
+    def __init__(self, delay: bool = False, queued: bool = False, queue_size: int = 10000,
+                 repeat_interval: float = 60.0, path: str = "logs/app.log"):
+        root = logging.getLogger()
+        # configuring again (e.g. main run several times in a process) must not add another handler,
+        # every record would be written once per handler
+        if not queued and (CustomLogging._file_handler in root.handlers or CustomLogging._queue_handler is not None):
+            return
+
         log_format = "%(asctime)s - %(levelname)s - %(message)s"
         formatter = logging.Formatter(log_format)
         log_level = 10
-        handler = TimedRotatingFileHandler("logs/app.log", when="midnight", interval=1)
+        handler = TimedRotatingFileHandler(path, when="midnight", interval=1, delay=delay)
         handler.suffix = "%Y%m%d"
         handler.setLevel(log_level)
         handler.setFormatter(formatter)
-        logging.getLogger().addHandler(handler)
+
+        if not queued:
+            root.addHandler(handler)
+            CustomLogging._file_handler = handler
+            return
+
+        CustomLogging.stop()
+        if CustomLogging._file_handler in root.handlers:
+            # records go through the queue from now on
+            root.removeHandler(CustomLogging._file_handler)
+            CustomLogging._file_handler.close()
+        CustomLogging._file_handler = None
+        queue_handler = _DroppingQueueHandler(queue.Queue(queue_size))
+        listener = QueueListener(queue_handler.queue, handler, respect_handler_level=True)
+        listener.start()
+        root.addHandler(queue_handler)
+        CustomLogging._queue_handler = queue_handler
+        CustomLogging._listener = listener
+        CustomLogging._repeat_limiter = _RepeatLimiter(repeat_interval) if repeat_interval > 0 else None
+
+    @staticmethod
+    def stop() -> None:
+        """
+        Writes the records still queued and stops the listener thread of the queued mode
+        :return: None
+        """
+        queue_handler, listener = CustomLogging._queue_handler, CustomLogging._listener
+        CustomLogging._queue_handler = None
+        CustomLogging._listener = None
+        CustomLogging._repeat_limiter = None
+        if queue_handler is not None:
+            logging.getLogger().removeHandler(queue_handler)
+        if listener is not None:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+
+    @staticmethod
+    def dropped_count() -> int:
+        """
+        Returns the number of records dropped because the queue was full
+        :return: number of records
+        """
+        queue_handler = CustomLogging._queue_handler
+        return queue_handler.dropped if queue_handler is not None else 0
+
+    @staticmethod
+    def suppressed_count() -> int:
+        """
+        Returns the number of repeated exceptions which have not been logged
+        :return: number of exceptions
+        """
+        repeat_limiter = CustomLogging._repeat_limiter
+        return repeat_limiter.suppressed if repeat_limiter is not None else 0
 
     @staticmethod
     def log_error(e: Exception):
-        logging.exception("Exception occured")
+        repeat_limiter = CustomLogging._repeat_limiter
+        if repeat_limiter is None:
+            logging.exception("Exception occured")
+            return
+
+        suppressed = repeat_limiter.allow(e)
+        if suppressed is None:
+            return
+        message = "Exception occured" if not suppressed else f"Exception occured ({suppressed} repeats suppressed)"
+        logging.error(message, exc_info=(type(e), e, e.__traceback__))
+
+
+# records still queued are written when the interpreter exits
+atexit.register(CustomLogging.stop)
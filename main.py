@@ -1,24 +1,84 @@
+import argparse
+import json
+import os
 import pickle
-from typing import Optional
+from collections import deque
+from typing import TYPE_CHECKING, Iterator, Optional
 
 from basket.basket_state import BasketState
+from instrumentation.metrics_registry import MetricsRegistry, SnapshotWriter
 from logs.logging import CustomLogging
-from mock_services.dummy_api import DummyApi
-from price_basket_result_display.PriceBasketResultDisplay import PriceBasketResultDisplay
-from pricebasket.cart_product import CartProduct
+from price_basket_result_display.PriceBasketResultDisplay import BulkResultRenderer, PriceBasketResultDisplay
+from pricebasket.catalog_snapshot import CACHE_DIRECTORY, CART_PRODUCTS_CACHE, CatalogSnapshot
 from pricebasket.price_basket import PriceBasket
 
+# services and asyncio are imported where they are used as importing them takes longer than pricing a basket,
+# see --fast
+if TYPE_CHECKING:
+    from mock_services.async_dummy_api import AsyncDummyApi
 
-def main():
-    # initializing custom logging class
-    CustomLogging()
-    update_inventory(False)
-    display_inventory()
-    get_basket_to_price()
-    return 0
+# prebuilt snapshot loaded by --fast, same as COLUMNAR_CATALOG_CACHE of ColumnarCatalog
+FAST_SNAPSHOT = os.path.splitext(CART_PRODUCTS_CACHE)[0] + '.pbcat'
 
 
-def update_inventory(update: bool = False) -> None:
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Prices baskets entered on the console or read from a file")
+    parser.add_argument("--batch", help="price baskets read from this JSON lines file instead of the console")
+    parser.add_argument("--out", help="file to write the results of --batch to")
+    parser.add_argument("--format", default="jsonl", choices=list(BulkResultRenderer.FORMATS),
+                        help="format of the results written to --out, see BulkResultRenderer")
+    parser.add_argument("--mode", default="serial", choices=["serial", "threads", "processes"],
+                        help="how the batch is priced, see PriceBasket.price_baskets")
+    parser.add_argument("--workers", type=int, help="number of threads or processes pricing the batch")
+    parser.add_argument("--chunksize", type=int, default=256, help="number of baskets priced at once")
+    parser.add_argument("--metrics-text", help="record metrics and write a text snapshot of them to this file")
+    parser.add_argument("--metrics-prometheus", help="record metrics and write them in Prometheus format to this file")
+    parser.add_argument("--metrics-interval", type=float, default=60.0, help="seconds between two metrics writes")
+    parser.add_argument("--fast", action="store_true",
+                        help="start without refreshing the inventory or writing to the cache, "
+                             "prices with the prebuilt snapshot given by --snapshot")
+    parser.add_argument("--snapshot", default=FAST_SNAPSHOT,
+                        help="prebuilt catalog snapshot used by --fast, the cart products cache is used if missing")
+    parser.add_argument("--queued-logging", action="store_true",
+                        help="format and write logs on a background thread, repeated errors are rate limited")
+    parser.add_argument("--build-snapshot", action="store_true",
+                        help="build the snapshot used by --fast from the cart products cache and exit")
+    args = parser.parse_args(argv)
+    if bool(args.batch) != bool(args.out):
+        parser.error("--batch and --out must be used together")
+
+    # initializing custom logging class, with --fast the log file is opened only if something is logged
+    CustomLogging(delay=args.fast, queued=args.queued_logging)
+
+    if args.build_snapshot:
+        build_snapshot(args.snapshot)
+        return 0
+
+    snapshot_writer = None
+    if args.metrics_text or args.metrics_prometheus:
+        snapshot_writer = SnapshotWriter(MetricsRegistry.enable(), args.metrics_interval, args.metrics_text,
+                                         args.metrics_prometheus).start()
+    try:
+        snapshot = None
+        if args.fast:
+            snapshot = get_fast_snapshot(args.snapshot)
+        else:
+            update_inventory(False)
+
+        if args.batch:
+            price_batch(args.batch, args.out, args.mode, args.workers, args.chunksize, snapshot, args.format)
+            return 0
+
+        display_inventory(snapshot)
+        get_basket_to_price(snapshot)
+        return 0
+    finally:
+        if snapshot_writer is not None:
+            # metrics are written one last time on exit
+            snapshot_writer.stop()
+
+
+def update_inventory(update: bool = False, delta: bool = False) -> None:
     """
     This method fetches the updated products list, price list and updated offers
     and updated the data in the local cache if update value is True
@@ -32,21 +92,95 @@ def update_inventory(update: bool = False) -> None:
     get updated very often which also reduces api calls and caching increases speed
 
 
+    With delta True only the changes made since the last applied change set are fetched and applied to the
+    affected cart products, which is how intraday changes such as a price change should be picked up.
+    Changes are priced with as soon as they are applied in memory, the cache file is written on a background
+    thread (see CatalogSnapshot.persist_in_background) together with the version of the change set
+
     :param update:
+    :param delta:
     :return:
     """
-    if update:
-        try:
-            get_updated_products()
-            get_updated_offers()
-            get_updated_price_list()
+    if update and delta:
+        with MetricsRegistry.timed("pricebasket_update_inventory_delta_seconds",
+                                   "Time taken to fetch and apply changes to the inventory"):
+            try:
+                from mock_services.dummy_api import DummyApi
+                from pricebasket.cart_product import CartProduct
 
-            if update:
-                # if any update then local cart products also need to be recalculated and updated
-                CartProduct.prepare_cart_products()
+                snapshot = CatalogSnapshot.shared()
+                change_set = DummyApi.get_change_set(snapshot.change_set_version)
+                if change_set is not None and not change_set.is_empty():
+                    CartProduct.apply_change_set(change_set, snapshot)
+                    snapshot.persist_in_background()
+            except Exception as e:
+                CustomLogging.log_error(e)
 
-        except Exception as e:
-            CustomLogging.log_error(e)
+    elif update:
+        with MetricsRegistry.timed("pricebasket_update_inventory_seconds",
+                                   "Time taken to fetch the inventory and prepare cart products"):
+            try:
+                import asyncio
+
+                asyncio.run(update_inventory_async())
+            except Exception as e:
+                CustomLogging.log_error(e)
+
+
+async def update_inventory_async(api: 'AsyncDummyApi' = None, timeout: float = 5.0,
+                                 cache_directory: str = CACHE_DIRECTORY) -> Optional[dict]:
+    """
+    This method fetches the updated products list, price list and offers concurrently, stores them in the local
+    cache and prepares the cart products as soon as all three fetches have completed
+
+    Each fetch is given timeout seconds, a fetch which fails or times out is cancelled and logged and the data
+    of that service already in the local cache is used instead. Cancelling this coroutine cancels the fetches
+    still in flight
+
+    :param api: services to fetch from
+    :param timeout: seconds each service is given to respond
+    :param cache_directory: directory of the local cache, the cart products cache is prepared in it
+    :return: timings of prepare_cart_products or None if it did not complete
+    """
+    import asyncio
+    from pricebasket.cart_product import CartProduct
+
+    if api is None:
+        from mock_services.async_dummy_api import AsyncDummyApi
+        api = AsyncDummyApi()
+
+    fetches = [api.get_updated_products(), api.get_updated_offers(), api.get_updated_price_list()]
+    results = await asyncio.gather(*[asyncio.wait_for(x, timeout) for x in fetches], return_exceptions=True)
+
+    fetched = []
+    for file_name, result in zip(['products.pkl', 'offers.pkl', 'pricelist.pkl'], results):
+        if isinstance(result, BaseException):
+            CustomLogging.log_error(result)
+            result = None
+        if result is not None:
+            save_to_cache(file_name, result, cache_directory)
+        fetched.append(result)
+
+    # if any update then local cart products also need to be recalculated and updated,
+    # fetched data is used directly instead of being read back from the cache
+    products, offers, price_list = fetched
+    return CartProduct.prepare_cart_products(products, offers, price_list,
+                                             path=os.path.join(cache_directory, os.path.basename(CART_PRODUCTS_CACHE)))
+
+
+def save_to_cache(file_name: str, data, cache_directory: str = CACHE_DIRECTORY) -> None:
+    """
+    Stores data fetched from micro services in local cache
+    :param file_name: name of the cache file
+    :param data: data to store
+    :param cache_directory: directory of the local cache
+    :return: None
+    """
+    try:
+        with open(os.path.join(cache_directory, file_name), 'wb') as out_file:
+            pickle.dump(data, out_file)
+    except Exception as e:
+        CustomLogging.log_error(e)
 
 
 def get_updated_products() -> None:
@@ -55,6 +189,8 @@ def get_updated_products() -> None:
     :return: None
     """
     try:
+        from mock_services.dummy_api import DummyApi
+
         products = DummyApi.get_updated_products()
         if products is not None:
             with open('Cache/products.pkl', 'wb') as out_file:
@@ -70,6 +206,8 @@ def get_updated_price_list() -> None:
     :return: None
     """
     try:
+        from mock_services.dummy_api import DummyApi
+
         updated_price_list = DummyApi.get_updated_price_list()
         if updated_price_list is not None:
             with open('Cache/pricelist.pkl', 'wb') as out_file:
@@ -85,6 +223,8 @@ def get_updated_offers() -> Optional:
     :return: list of offers
     """
     try:
+        from mock_services.dummy_api import DummyApi
+
         offers = DummyApi.get_updated_offers()
         if offers is not None:
             with open('Cache/offers.pkl', 'wb') as out_file:
@@ -96,27 +236,56 @@ def get_updated_offers() -> Optional:
         return None
 
 
-def get_cart_products() -> Optional[tuple]:
+def build_snapshot(path: str = FAST_SNAPSHOT) -> str:
+    """
+    Builds the catalog snapshot loaded by --fast from the cart products cache, it is built again whenever
+    the cart products cache is updated
+    :param path: path of the snapshot
+    :return: path of the snapshot
+    """
+    from pricebasket.columnar_catalog import ColumnarCatalog
+
+    return ColumnarCatalog.convert_pickle(CART_PRODUCTS_CACHE, path)
+
+
+def get_fast_snapshot(path: str = FAST_SNAPSHOT) -> CatalogSnapshot:
+    """
+    Returns the snapshot used by --fast, the prebuilt snapshot if it exists else the cart products cache
+    Nothing is fetched from the services or written to the cache
+    :param path: path of the prebuilt snapshot
+    :return: snapshot
+    """
+    try:
+        os.stat(path)
+    except OSError as e:
+        CustomLogging.log_error(e)
+        path = CART_PRODUCTS_CACHE
+    return CatalogSnapshot.shared(path)
+
+
+def get_cart_products(snapshot: CatalogSnapshot = None) -> Optional[tuple]:
     """
     Fetches cart products from local cache
+    :param snapshot: snapshot to read cart products from, shared snapshot of the cache if None
     :return: tuple of Products if list is not empty else return None
     """
-    with open('Cache/cartProducts.pkl', 'rb') as in_file:
-        try:
-            products = tuple(pickle.load(in_file))
-            return products
-        except Exception as e:
-            CustomLogging.log_error(e)
-            return None
+    if snapshot is None:
+        snapshot = CatalogSnapshot.shared()
+    cart_products = snapshot.cart_products
+    if cart_products:
+        return cart_products
+    return None
 
 
-def display_inventory() -> None:
+def display_inventory(snapshot: CatalogSnapshot = None) -> None:
     """
     Displays inventory to the user on console
+    With a snapshot given, offers are the ones in the snapshot instead of being fetched from the offers service
+    :param snapshot: snapshot to display, shared snapshot of the cache if None
     :return: None
     """
     try:
-        cart_products = get_cart_products()
+        cart_products = get_cart_products(snapshot)
         if cart_products is not None:
             print("Available Items:")
             for product in cart_products:
@@ -125,7 +294,10 @@ def display_inventory() -> None:
                 else:
                     print(f"{product.product_description} - £{product.price} per {product.product_unit}")
 
-        offers = get_updated_offers()
+        if snapshot is None:
+            offers = get_updated_offers()
+        else:
+            offers = snapshot.catalog_index.get_offers()
         if offers is not None:
             print()
             print("Available offers:")
@@ -136,10 +308,11 @@ def display_inventory() -> None:
         CustomLogging.log_error(e)
 
 
-def get_basket_to_price() -> None:
+def get_basket_to_price(snapshot: CatalogSnapshot = None) -> None:
     """
     Asks users to input products in their basket to be priced and send baskets to be priced
     and then display output to the users
+    :param snapshot: snapshot to price with, shared snapshot of the cache if None
     :return:None
     """
     while True:
@@ -154,12 +327,65 @@ def get_basket_to_price() -> None:
                 # Could be replaced by Command Design Pattern in future
 
                 basket_products_list = BasketState.get_products_in_basket_state(input_list[1:])
-                sub_total, total, discounted_items = PriceBasket().price_basket(basket_products_list)
+                sub_total, total, discounted_items = PriceBasket(snapshot).price_basket(basket_products_list)
                 PriceBasketResultDisplay(sub_total, discounted_items, total).display_result()
             else:
                 print("Please enter valid input")
     print("Thank you")
 
 
+def read_baskets(in_file, basket_ids: deque) -> Iterator[list]:
+    """
+    Reads baskets from a JSON lines file, one basket per line as
+        {"id": "basket-1", "items": ["apples", "milk", "bread"]}
+    Lines are read only when the next basket is needed. Id of every basket read is appended to basket_ids
+    so that the caller can match results to baskets, id defaults to the line number.
+    Lines which are not valid baskets are logged and skipped
+
+    :param in_file: file opened for reading
+    :param basket_ids: ids of the baskets read
+    :return: iterator of baskets in BasketState
+    """
+    for line_number, line in enumerate(in_file, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            items = [str(x).lower() for x in record["items"]]
+            basket_ids.append(record.get("id", line_number))
+        except Exception as e:
+            CustomLogging.log_error(e)
+            continue
+        yield BasketState.get_products_in_basket_state(items)
+
+
+def price_batch(in_path: str, out_path: str, mode: str = "serial", workers: int = None, chunksize: int = 256,
+                snapshot: CatalogSnapshot = None, output_format: str = "jsonl") -> int:
+    """
+    Prices baskets read from a JSON lines file and writes one JSON line per basket as
+        {"id": "basket-1", "subtotal": "3.10", "total": "3.00", "discounts": ["Apples 10 % off: -10p"]}
+    or the results in another format of BulkResultRenderer.
+    Baskets are read, priced and written in chunks by PriceBasket.price_baskets so memory used does not
+    depend on the size of the file
+
+    :param in_path: JSON lines file of baskets
+    :param out_path: JSON lines file to write the results to
+    :param mode: serial, threads or processes
+    :param workers: number of threads or processes
+    :param chunksize: number of baskets priced at once
+    :param snapshot: snapshot to price with, shared snapshot of the cache if None
+    :param output_format: jsonl, csv or text
+    :return: number of baskets priced
+    """
+    # only ids of the baskets read but not yet written are kept
+    basket_ids = deque()
+    with open(in_path, 'r') as in_file, open(out_path, 'w') as out_file:
+        results = PriceBasket(snapshot).price_baskets(read_baskets(in_file, basket_ids), mode, workers, chunksize)
+        with BulkResultRenderer(out_file, output_format) as renderer:
+            for sub_total, total, discounted_items in results:
+                renderer.write(sub_total, total, discounted_items, basket_ids.popleft())
+        return renderer.count
+
+
 if __name__ == '__main__':
     exit(main())
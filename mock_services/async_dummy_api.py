@@ -0,0 +1,53 @@
+import asyncio
+from typing import Optional
+
+from mock_services.dummy_api import DummyApi
+
+
+class AsyncDummyApi:
+    """
+    This class represents asynchronous Mock APIs of the Product, Price and Offer services
+
+    Calls to the services wait on the network, with async calls the three services can be called concurrently
+    so refreshing the inventory takes as long as the slowest service instead of the sum of all three.
+
+    It is a local stand-in of the services: it returns the mock data of DummyApi after a configurable latency
+    per service, which is used to check timeouts and cancellation of the callers
+        ...
+    Attributes
+    ----------
+    _products_latency : float
+        seconds the products service takes to respond
+    _price_list_latency : float
+        seconds the price service takes to respond
+    _offers_latency : float
+        seconds the offers service takes to respond
+    """
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_products_latency', '_price_list_latency', '_offers_latency']
+
+    def __init__(self,
+                 products_latency: float = 0.0,
+                 price_list_latency: float = 0.0,
+                 offers_latency: float = 0.0):
+        self._products_latency = products_latency
+        self._price_list_latency = price_list_latency
+        self._offers_latency = offers_latency
+
+    async def get_updated_products(self) -> Optional:
+        await asyncio.sleep(self._products_latency)
+        return DummyApi.get_updated_products()
+
+    async def get_updated_price_list(self) -> Optional:
+        await asyncio.sleep(self._price_list_latency)
+        return DummyApi.get_updated_price_list()
+
+    async def get_updated_offers(self) -> Optional:
+        await asyncio.sleep(self._offers_latency)
+        return DummyApi.get_updated_offers()
+
+    def __repr__(self):
+        return f"AsyncDummyApi: _products_latency = {self._products_latency}," \
+               f"_price_list_latency = {self._price_list_latency}," \
+               f"_offers_latency = {self._offers_latency}"
@@ -0,0 +1,110 @@
+from typing import Iterable, List
+
+
+class ChangeSet:
+    """
+    This class represents changes made to products, prices and offers since a version of the services
+
+    Instead of fetching all products, prices and offers again when only a few of them have changed,
+    services return the changes and the local catalog applies them to the affected cart products only
+    ...
+    Attributes
+    ----------
+    _version : int
+        version of the services after these changes, used to ask for the next changes
+    _products : list
+        products which have been added or updated
+    _removed_product_ids : list
+        ids of the products which have been removed
+    _prices : list
+        prices which have been added or updated
+    _offers : list
+        offers which have been added or updated
+    _removed_offer_ids : list
+        ids of the offers which have been removed
+    """
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_version', '_products', '_removed_product_ids', '_prices', '_offers', '_removed_offer_ids']
+
+    def __init__(self,
+                 version: int,
+                 products: Iterable = (),
+                 removed_product_ids: Iterable = (),
+                 prices: Iterable = (),
+                 offers: Iterable = (),
+                 removed_offer_ids: Iterable = ()):
+        self._version = version
+        self._products = list(products)
+        self._removed_product_ids = list(removed_product_ids)
+        self._prices = list(prices)
+        self._offers = list(offers)
+        self._removed_offer_ids = list(removed_offer_ids)
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def products(self):
+        return self._products
+
+    @property
+    def removed_product_ids(self):
+        return self._removed_product_ids
+
+    @property
+    def prices(self):
+        return self._prices
+
+    @property
+    def offers(self):
+        return self._offers
+
+    @property
+    def removed_offer_ids(self):
+        return self._removed_offer_ids
+
+    def is_empty(self) -> bool:
+        return not (self._products or self._removed_product_ids or self._prices or self._offers or
+                    self._removed_offer_ids)
+
+    @staticmethod
+    def merge(change_sets: List['ChangeSet']) -> 'ChangeSet':
+        """
+        Merges change sets in the order of their versions into one change set, later changes of a product,
+        price or offer replace earlier ones
+        :param change_sets: change sets to merge
+        :return: merged change set
+        """
+        version = 0
+        products, prices, offers = {}, {}, {}
+        removed_product_ids, removed_offer_ids = {}, {}
+        for change_set in sorted(change_sets, key=lambda x: x.version):
+            version = change_set.version
+            for product_id in change_set.removed_product_ids:
+                products.pop(product_id, None)
+                prices.pop(product_id, None)
+                removed_product_ids[product_id] = True
+            for product in change_set.products:
+                removed_product_ids.pop(product.product_id, None)
+                products[product.product_id] = product
+            for price in change_set.prices:
+                prices[price.product_id] = price
+            for offer_id in change_set.removed_offer_ids:
+                offers.pop(offer_id, None)
+                removed_offer_ids[offer_id] = True
+            for offer in change_set.offers:
+                removed_offer_ids.pop(offer.offer_id, None)
+                offers[offer.offer_id] = offer
+
+        return ChangeSet(version, products.values(), removed_product_ids, prices.values(), offers.values(),
+                         removed_offer_ids)
+
+    def __repr__(self):
+        return f"ChangeSet: _version = {self._version}," \
+               f"_products = {len(self._products)}," \
+               f"_removed_product_ids = {len(self._removed_product_ids)}," \
+               f"_prices = {len(self._prices)}," \
+               f"_offers = {len(self._offers)}," \
+               f"_removed_offer_ids = {len(self._removed_offer_ids)}"
@@ -3,6 +3,7 @@ import uuid
 from typing import Optional
 
 from logs.logging import CustomLogging
+from mock_services.change_set import ChangeSet
 from mock_services.price import Price
 from mock_services.product import Product
 from rule_engine.custom_operator import CustomOperator
@@ -19,8 +20,14 @@ class DummyApi:
 
     This class represents getting mock data by calling Services of respective units
 
+    Changes made by the services are mocked by a change log, record_change_set adds changes to it and
+    get_change_set returns the changes made after a version
+
     """
 
+    # change sets recorded by the mock services in the order of their versions
+    _change_log = []
+
     @staticmethod
     def get_updated_products() -> Optional:
         """
@@ -92,3 +99,33 @@ class DummyApi:
         except Exception as e:
             CustomLogging.log_error(e)
             return None
+
+    @staticmethod
+    def record_change_set(products=(), removed_product_ids=(), prices=(), offers=(),
+                          removed_offer_ids=()) -> ChangeSet:
+        """
+        This function mocks changes made to products, prices and offers in the microservices
+        :return: the recorded change set with its version
+        """
+        change_set = ChangeSet(len(DummyApi._change_log) + 1, products, removed_product_ids, prices, offers,
+                               removed_offer_ids)
+        DummyApi._change_log.append(change_set)
+        return change_set
+
+    @staticmethod
+    def get_change_set(since_version: int = 0) -> Optional[ChangeSet]:
+        """
+        This function mocks fetching the changes made to products, prices and offers after a version
+        :param since_version: version of the last change set applied by the caller
+        :return: changes made after since_version merged in one change set, it is empty if there are no changes,
+        if exception occurs, it returns None
+        """
+        try:
+            changes = [x for x in DummyApi._change_log[since_version:] if x.version > since_version]
+            if not changes:
+                return ChangeSet(since_version)
+            return ChangeSet.merge(changes)
+        except Exception as e:
+            CustomLogging.log_error(e)
+            return None
+
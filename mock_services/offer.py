@@ -29,6 +29,10 @@ class Offer:
     # slots are used for faster attribute access and space saving in memory resources
     __slots__ = ['_offer_id', '_offer_description', '_product_id', '_date', '_active', '_offer_type']
 
+    # number of times an offer has been activated or deactivated in the process, results priced at a timestamp
+    # are cached with it (see PriceBasket) as offers are deactivated in place
+    _activation_version = 0
+
     def __init__(self,
                  offer_id: uuid,
                  offer_description: str,
@@ -44,6 +48,10 @@ class Offer:
         self._date = (start_date, end_date)
         self._offer_type = offer_type
 
+    @property
+    def offer_id(self):
+        return self._offer_id
+
     @property
     def product_id(self):
         return self._product_id
@@ -60,6 +68,28 @@ class Offer:
     def offer_type(self):
         return self._offer_type
 
+    @property
+    def start_date(self):
+        return self._date[0]
+
+    @property
+    def end_date(self):
+        return self._date[1]
+
+    @property
+    def active(self):
+        return self._active
+
+    @active.setter
+    def active(self, active):
+        if active != self._active:
+            Offer._activation_version += 1
+        self._active = active
+
+    @staticmethod
+    def activation_version() -> int:
+        return Offer._activation_version
+
     def __repr__(self):
         return f"offer_id = {self._offer_id},"\
                f"offer_description = {self._offer_description}",\
@@ -68,7 +98,6 @@ class Offer:
                f"active = {self._active}"
 
 
-# we need to add capability to apply flat promotion on product category as well
 class OfferFlat(Offer):
     """
         This class represents Flat Offers entity in the system
@@ -162,3 +191,36 @@ class OfferGroup(Offer):
                f"_discounted_product_id {self._discounted_product_id} ," \
                f"_discount_percent {self._discount_percent} ," \
                f"_conditions {self._conditions}"
+
+
+class OfferCategory(OfferFlat):
+    """
+        This class represents Flat Offers on a category of products (product type) such as 10% off all fruit
+        This is the sub class of OfferFlat class, it is priced as a flat offer on every product of the category
+
+        It is not valid on product ids, cart products don't carry it. It is kept once by the catalog and found
+        by the product type of the cart product (see CatalogIndex.get_offers_at), offers of the product itself
+        take precedence over the offers of its category
+        ...
+        Attributes
+        ----------
+        _product_type : str
+            Product type (category) the offer is valid on
+    """
+
+    __slots__ = ['_product_type']
+
+    def __init__(self,
+                 offer_id: uuid,
+                 offer_description: str,
+                 product_type: str,
+                 start_date: datetime,
+                 end_date: datetime,
+                 active: bool,
+                 discount_percent: float):
+        super().__init__(offer_id, offer_description, None, start_date, end_date, active, discount_percent)
+        self._product_type = product_type
+
+    @property
+    def product_type(self):
+        return self._product_type
@@ -1,6 +1,11 @@
 # separate entity so that if in future user interface changes from console then changes only need to be done in this
 # class to change the display method
+import io
+import json
+from typing import Iterable
+
 from logs.logging import CustomLogging
+from pricebasket.currency_utility_methods import CurrencyUtilityMethods
 
 
 class PriceBasketResultDisplay:
@@ -29,6 +34,29 @@ class PriceBasketResultDisplay:
         self._discounted_items = discounted_items
         self._total = total
 
+    @staticmethod
+    def from_pence(subtotal: int, discounted_items: list, total: int) -> 'PriceBasketResultDisplay':
+        """
+        Creates the display for a result priced in integer pence (PencePriceBasket),
+        this is where pence are formatted to strings
+        :param subtotal: subtotal in pence
+        :param discounted_items: list of discounted items
+        :param total: total in pence
+        :return: PriceBasketResultDisplay
+        """
+        return PriceBasketResultDisplay(CurrencyUtilityMethods.format_pence(subtotal),
+                                        discounted_items,
+                                        CurrencyUtilityMethods.format_pence(total))
+
+    @staticmethod
+    def from_result(result) -> 'PriceBasketResultDisplay':
+        """
+        Creates the display for a PricingResult (CompactPriceBasket), this is where its amounts are formatted
+        :param result: PricingResult
+        :return: PriceBasketResultDisplay
+        """
+        return PriceBasketResultDisplay(result.sub_total, result.discounted_items(), result.total)
+
     @property
     def sub_total(self):
         return self._sub_total
@@ -58,6 +86,16 @@ class PriceBasketResultDisplay:
                f"_total {self._total}," \
                f"_discounted_items {self._discounted_items}"
 
+    def to_dict(self) -> dict:
+        """
+        Returns the pricing result as a dict for JSON output (batch pricing, pricing server),
+        discounts are the discount lines as displayed on the console
+        :return: dict with subtotal, total and discounts
+        """
+        return {"subtotal": self._sub_total,
+                "total": self._total,
+                "discounts": [str(x) for x in self._discounted_items or ()]}
+
     def display_result(self):
         """
         This method prints the pricing result on the console
@@ -69,15 +107,209 @@ class PriceBasketResultDisplay:
 
     def __repr__(self):
         try:
-            result = f"Subtotal: £{self.sub_total}\n"
             if len(self.discounted_items) > 0:
-                for item in self.discounted_items:
-                    result = result + str(item)
+                discounts = "".join([str(item) for item in self.discounted_items])
             else:
-                result = result + str('no offers available')
+                discounts = 'no offers available'
 
-            result = result + str(f"\nTotal: £{self._total}")
-
-            return result
+            return "".join(["Subtotal: £", self.sub_total, "\n", discounts, "\nTotal: £", self._total])
         except Exception as e:
             CustomLogging.log_error(e)
+
+
+class BulkResultRenderer:
+    """
+        Writes the results of many priced baskets to a text or binary stream, e.g. receipts of a batch
+
+        Results are assembled with join into a buffer which is written to the stream once every buffer_size
+        results instead of printing each of them. Discount lines are formatted once and kept in a cache by
+        product, discount and amount (amounts in pence are formatted through a cache of currency strings),
+        baskets mostly get the same discounts so most lines are not formatted again.
+
+        PricingResult (CompactPriceBasket) is rendered with write_result, its discounts are formatted through the
+        same caches from their amount in pence.
+
+        Formats are
+            text - receipts as displayed on the console by PriceBasketResultDisplay, one after another
+            jsonl - one JSON object per basket: {"id": ..., "subtotal": ..., "total": ..., "discounts": [...]}
+            csv - header then one row per basket: id,subtotal,total,discounts with discounts separated by "; "
+        ...
+        Attributes
+        ----------
+        _out : stream
+            text or binary stream results are written to
+        _format : str
+            text, jsonl or csv
+        _binary : bool
+            if the stream is binary, text is encoded in utf-8
+        _buffer_size : int
+            number of results buffered before they are written
+        _buffer : list
+            strings not yet written
+        _buffered : int
+            number of results in the buffer
+        _count : int
+            number of results rendered
+        _lines : dict
+            discount line cache, key of the discount to the formatted line
+        _currencies : dict
+            amount in pence to the currency string
+        _encoded : dict
+            discount line to the line encoded for the format (JSON string, CSV field)
+    """
+
+    FORMATS = ("text", "jsonl", "csv")
+    CSV_HEADER = "id,subtotal,total,discounts\n"
+    # caches are cleared when they reach this size
+    MAX_CACHED = 65536
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_out', '_format', '_binary', '_buffer_size', '_buffer', '_buffered', '_count', '_lines',
+                 '_currencies', '_encoded']
+
+    def __init__(self, out, output_format: str = "text", buffer_size: int = 1024, binary: bool = None):
+        if output_format not in BulkResultRenderer.FORMATS:
+            raise ValueError(f"format must be one of {', '.join(BulkResultRenderer.FORMATS)}, got {output_format}")
+        if buffer_size < 1:
+            raise ValueError(f"buffer_size must be at least 1, got {buffer_size}")
+        self._out = out
+        self._format = output_format
+        self._binary = not isinstance(out, io.TextIOBase) if binary is None else binary
+        self._buffer_size = buffer_size
+        self._buffer = []
+        self._buffered = 0
+        self._count = 0
+        self._lines = {}
+        self._currencies = {}
+        self._encoded = {}
+        if output_format == "csv":
+            self._buffer.append(BulkResultRenderer.CSV_HEADER)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    @property
+    def count(self):
+        return self._count
+
+    def write(self, sub_total: str, total: str, discounted_items: list, basket_id=None) -> None:
+        """
+        Renders the result of a basket, as returned by PriceBasket.price_basket
+        :param sub_total: subtotal
+        :param total: total
+        :param discounted_items: discount lines of the basket
+        :param basket_id: id of the basket, written by jsonl and csv
+        :return: None
+        """
+        lines = [self._discount_line(x) for x in discounted_items or ()]
+        output_format = self._format
+        if output_format == "text":
+            self._buffer.append("".join(["Subtotal: £", sub_total, "\n",
+                                         "".join(lines) if lines else "no offers available",
+                                         "\nTotal: £", total, "\n"]))
+        elif output_format == "jsonl":
+            if basket_id is None:
+                head = "{"
+            else:
+                # line numbers are the most common ids
+                head = "".join(['{"id": ', str(basket_id) if type(basket_id) is int else json.dumps(basket_id), ', '])
+            self._buffer.append("".join([head, '"subtotal": "', sub_total, '", "total": "', total,
+                                         '", "discounts": [', ", ".join([self._encode(x) for x in lines]), "]}\n"]))
+        else:
+            self._buffer.append("".join(["" if basket_id is None else BulkResultRenderer.csv_field(str(basket_id)),
+                                         ",", sub_total, ",", total, ",", self._encode("; ".join(lines)), "\n"]))
+
+        self._count += 1
+        self._buffered += 1
+        if self._buffered >= self._buffer_size:
+            self.flush()
+
+    def write_result(self, result, basket_id=None) -> None:
+        """
+        Renders a PricingResult
+        :param result: PricingResult
+        :param basket_id: id of the basket, written by jsonl and csv
+        :return: None
+        """
+        self.write(result.sub_total, result.total, result.discounts, basket_id)
+
+    def write_all(self, results: Iterable[tuple], basket_ids: Iterable = None) -> int:
+        """
+        Renders results of many baskets, as returned by PriceBasket.price_baskets, and writes them out
+        :param results: results of the baskets as subtotal, total and discount lines
+        :param basket_ids: ids of the baskets in the same order, ids are not written if None
+        :return: number of results rendered
+        """
+        count = self._count
+        if basket_ids is None:
+            for sub_total, total, discounted_items in results:
+                self.write(sub_total, total, discounted_items)
+        else:
+            for (sub_total, total, discounted_items), basket_id in zip(results, basket_ids):
+                self.write(sub_total, total, discounted_items, basket_id)
+        self.flush()
+        return self._count - count
+
+    def flush(self) -> None:
+        """
+        Writes the buffered results to the stream
+        :return: None
+        """
+        if self._buffer:
+            text = "".join(self._buffer)
+            self._out.write(text.encode("utf-8") if self._binary else text)
+            self._buffer = []
+        self._buffered = 0
+
+    def _discount_line(self, item) -> str:
+        if type(item) is tuple:
+            # discount of a PricingResult: description, offer id, discount percent, discount in pence
+            return self._line(item[0], item[2], item[3])
+        pence = getattr(item, "discount_in_pence", None)
+        if pence is not None:
+            return self._line(item.description, item.discount_percentage, pence)
+
+        # amount of DiscountProductDetail is already a currency string
+        key = (item.description, item.discount_percentage, item.discount_in_currency)
+        line = self._lines.get(key)
+        if line is None:
+            if len(self._lines) >= BulkResultRenderer.MAX_CACHED:
+                self._lines.clear()
+            line = self._lines[key] = repr(item)
+        return line
+
+    def _line(self, description: str, discount_percent, pence: int) -> str:
+        key = (description, discount_percent, pence)
+        line = self._lines.get(key)
+        if line is None:
+            if len(self._lines) >= BulkResultRenderer.MAX_CACHED:
+                self._lines.clear()
+            line = self._lines[key] = f"{description.capitalize()} {discount_percent} % off: -{self._currency(pence)}"
+        return line
+
+    def _currency(self, pence: int) -> str:
+        currency = self._currencies.get(pence)
+        if currency is None:
+            if len(self._currencies) >= BulkResultRenderer.MAX_CACHED:
+                self._currencies.clear()
+            currency = self._currencies[pence] = CurrencyUtilityMethods.get_currency_with_unit_from_pence(pence)
+        return currency
+
+    def _encode(self, line: str) -> str:
+        encoded = self._encoded.get(line)
+        if encoded is None:
+            if len(self._encoded) >= BulkResultRenderer.MAX_CACHED:
+                self._encoded.clear()
+            encoded = json.dumps(line) if self._format == "jsonl" else BulkResultRenderer.csv_field(line)
+            self._encoded[line] = encoded
+        return encoded
+
+    @staticmethod
+    def csv_field(value: str) -> str:
+        # quoted as csv.writer does with QUOTE_MINIMAL
+        if any(x in value for x in ',"\r\n'):
+            return '"' + value.replace('"', '""') + '"'
+        return value
@@ -0,0 +1,128 @@
+import threading
+from collections import OrderedDict
+from typing import Hashable, Iterable, Optional
+
+from basket.basket_state import BasketState, BilledState
+
+
+class BasketResultCache:
+    """
+    This class represents a bounded least recently used cache of the results of priced baskets
+
+    Most baskets priced are one of a few thousand shapes (e.g. milk bread, soup soup bread), so their results
+    can be reused instead of pricing the same basket again. A result is looked up by the products in the basket
+    and their quantities, together with the version of the catalog the basket is priced with. When a newer
+    version of the catalog is seen (prepare_cart_products has rebuilt the cache or a change set has been applied)
+    results of the older versions are dropped.
+
+    Results of PriceBasket depend on the order of the products (e.g. when a discounted product has offers of its
+    own), so products are looked up in the order they were entered. Pricing which gives the same result in any
+    order (TwoPhasePriceBasket) looks them up irrespective of their order, discounted items of a result are then
+    in the order of the basket which was priced first
+
+    It is opt in, pass it to PriceBasket to use it. This class is thread safe
+        ...
+    Attributes
+    ----------
+    _max_size : int
+        maximum number of results kept, least recently used result is evicted first
+    _results : OrderedDict
+        key of the basket to its result, in order of use
+    _version : int
+        newest version of the catalog seen, results of other versions are not kept
+    _hits : int
+        number of baskets whose result has been found
+    _misses : int
+        number of baskets whose result has not been found
+    _evictions : int
+        number of results evicted because the cache was full
+    _lock : Lock
+        so that the cache can be shared by threads pricing baskets
+    """
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_max_size', '_results', '_version', '_hits', '_misses', '_evictions', '_lock']
+
+    def __init__(self, max_size: int = 4096):
+        if max_size < 1:
+            raise ValueError(f"max_size must be at least 1, got {max_size}")
+        self._max_size = max_size
+        self._results = OrderedDict()
+        self._version = None
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    @property
+    def evictions(self):
+        return self._evictions
+
+    @staticmethod
+    def key(basket: Iterable[BasketState], version: int, pricing: Hashable = None, ordered: bool = True) -> tuple:
+        """
+        Returns the key of a basket, which is the same for baskets having the same products in the same order,
+        or in any order if ordered is False.
+        Descriptions are kept as entered as matching them to the catalog depends on their case
+        :param basket: list of products in BasketState
+        :param version: version of the catalog the basket is priced with
+        :param pricing: what prices the basket (e.g. type of PriceBasket) so results of different ones don't mix
+        :param ordered: False if the result of the basket does not depend on the order of its products
+        :return: key
+        """
+        items = tuple((item.product_description,
+                       item.purchased_quantity,
+                       item.billing_state == BilledState.Processed) for item in basket)
+        return version, pricing, items if ordered else tuple(sorted(items))
+
+    def get(self, key: tuple) -> Optional[tuple]:
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                self._misses += 1
+                return None
+            self._results.move_to_end(key)
+            self._hits += 1
+            return result
+
+    def put(self, key: tuple, result: tuple) -> None:
+        version = key[0]
+        with self._lock:
+            if self._version is None or version > self._version:
+                # catalog has changed, results of the previous versions will never be looked up again
+                self._results.clear()
+                self._version = version
+            elif version < self._version:
+                return
+
+            self._results[key] = result
+            self._results.move_to_end(key)
+            if len(self._results) > self._max_size:
+                self._results.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+
+    def __len__(self):
+        return len(self._results)
+
+    def __repr__(self):
+        return f"BasketResultCache: size = {len(self._results)}," \
+               f"max_size = {self._max_size}," \
+               f"hits = {self._hits}," \
+               f"misses = {self._misses}," \
+               f"evictions = {self._evictions}"
@@ -1,10 +1,17 @@
+import os
 import pickle
+import time
 import uuid
 
+from instrumentation.metrics_registry import MetricsRegistry
 from logs.logging import CustomLogging
-from mock_services.offer import Offer
+from mock_services.change_set import ChangeSet
+from mock_services.offer import Offer, OfferCategory
+from pricebasket.catalog_index import CatalogIndex
+from pricebasket.catalog_snapshot import CACHE_DIRECTORY, CART_PRODUCTS_CACHE, CatalogSnapshot
+from pricebasket.regional_catalog import RegionalCatalog
 from mock_services.price import Price
-from typing import List, Optional
+from typing import Iterable, List, Optional
 
 
 class CartProduct:
@@ -66,6 +73,14 @@ class CartProduct:
     def product_id(self, product_id):
         self._product_id = product_id
 
+    @property
+    def product_type(self):
+        return self._product_type
+
+    @product_type.setter
+    def product_type(self, product_type):
+        self._product_type = product_type
+
     @property
     def product_unit(self):
         return self._product_unit
@@ -98,8 +113,19 @@ class CartProduct:
     def offers(self, offers):
         self._offers = offers
 
+    def copy(self) -> 'CartProduct':
+        """
+        Returns a shallow copy of the cart product, used to change a cart product which might still be in use
+        """
+        return CartProduct(self._product_id, self._product_description, self._product_type, self._price,
+                           self._product_unit, self._offers)
+
     @staticmethod
-    def prepare_cart_products() -> None:
+    def prepare_cart_products(products: Optional[list] = None,
+                              offers: Optional[list] = None,
+                              price_list: Optional[list] = None,
+                              region: str = None,
+                              path: str = CART_PRODUCTS_CACHE) -> Optional[dict]:
         """
         This function prepares the cart products from data from all other entities such as product, price and offers
         and saves the processed cart products in a cache
@@ -110,59 +136,370 @@ class CartProduct:
 
         Making products self sufficient and saving it in Cache increases speed
 
+        Offers and prices are bucketed by product id in one pass before the cart products are built, so the
+        rebuild is linear in the number of products, offers and prices instead of scanning the offers and
+        the price list for every product
+
+        Offers on categories (OfferCategory) are not copied in the cart products of the category, they are saved
+        once in their own cache file and found by product type when pricing (see CatalogIndex.get_offers_at)
+
+        With a region only the overrides of the region are prepared and saved, see prepare_region.
+        Without a region the overrides of every region are prepared again on the rebuilt cart products, see
+        prepare_regions
+
         This method is not thread safe, should be executed on a single thread
 
-        :return: None
+        :param products: products just fetched from the services, read from the cache next to path if None
+        :param offers: offers just fetched from the services, read from the cache next to path if None
+        :param price_list: price list just fetched from the services, read from the cache next to path if None
+        :param region: name of the region whose offers and price list are given
+        :param path: path of the cart products cache written
+        :return: time taken in seconds by each phase (load, index, build, save) or None if rebuild failed
         """
-        products = CartProduct.get_updated_products()
-        offers = CartProduct.get_updated_offers()
-        price_list = CartProduct.get_updated_price_list()
+        if region is not None:
+            return CartProduct.prepare_region(region, offers, price_list)
+
+        timings = {}
+        started = time.perf_counter()
+
+        # data of the services is cached in the directory of the cart products cache
+        cache_directory = os.path.dirname(path)
+        if products is None:
+            products = CartProduct.get_updated_products(cache_directory)
+        if offers is None:
+            offers = CartProduct.get_updated_offers(cache_directory)
+        if price_list is None:
+            price_list = CartProduct.get_updated_price_list(cache_directory)
+        timings['load'] = time.perf_counter() - started
 
         updated_products = []
 
         try:
             if products is not None:
+                started = time.perf_counter()
+                category_offers = [x for x in offers or () if isinstance(x, OfferCategory)]
+                if category_offers:
+                    offers = [x for x in offers if not isinstance(x, OfferCategory)]
+                offers_by_product = CartProduct.index_offers_by_product(offers)
+                prices_by_product = CartProduct.index_prices_by_product(price_list)
+                timings['index'] = time.perf_counter() - started
+
+                started = time.perf_counter()
                 for product in products:
                     cart_product = CartProduct(product.product_id, product.product_description,
                                                product.product_type, product.price, product.product_unit)
 
-                    price = CartProduct.get_price_by_product(cart_product.product_id, price_list)
+                    price = prices_by_product.get(cart_product.product_id)
                     if price is not None:
                         cart_product.price = price.price_per_unit
 
-                    valid_offers = CartProduct.get_offer_by_product(product.product_id, offers)
-                    if valid_offers is not None:
-                        cart_product.offers = valid_offers
+                    cart_product.offers = offers_by_product.get(product.product_id, ())
 
                     updated_products.append(cart_product)
+                timings['build'] = time.perf_counter() - started
 
-                with open('Cache/cartProducts.pkl', 'wb') as out_file:
+                started = time.perf_counter()
+                with open(path, 'wb') as out_file:
                     pickle.dump(updated_products, out_file)
+                CartProduct.save_category_offers(category_offers, path)
+                # overrides are written before the version so a snapshot loading the new cache finds them
+                CartProduct.prepare_regions(updated_products, path)
+
+                # snapshots loaded in this process pick up the new cache on their next use
+                CatalogSnapshot.write_version(path)
+                timings['save'] = time.perf_counter() - started
+
+                metrics = MetricsRegistry.active()
+                if metrics is not None:
+                    for phase, seconds in timings.items():
+                        metrics.histogram(f"pricebasket_prepare_cart_products_{phase}_seconds",
+                                          f"Time taken by the {phase} phase of preparing cart products").observe(
+                            seconds)
+                    metrics.histogram("pricebasket_prepare_cart_products_seconds",
+                                      "Time taken to prepare cart products").observe(sum(timings.values()))
+                return timings
         except Exception as e:
             CustomLogging.log_error(e)
+        metrics = MetricsRegistry.active()
+        if metrics is not None:
+            metrics.counter("pricebasket_prepare_cart_products_failures_total",
+                            "Cart products which could not be prepared").inc()
+        return None
 
     @staticmethod
-    def get_updated_products() -> Optional:
+    def prepare_region(region: str,
+                       offers: Optional[list] = None,
+                       price_list: Optional[list] = None,
+                       snapshot: CatalogSnapshot = None,
+                       products_without_offers: Iterable = ()) -> Optional[dict]:
+        """
+        This function prepares the overlay of a region on the cart products and saves it next to the cache
+
+        Only the prices of the regional price list which differ from the cart products and the offers of the
+        products whose regional offers differ are saved, the cart products themselves are not copied.
+        Regional offers of a product replace its offers, products without regional offers keep theirs unless
+        they are listed in products_without_offers. Offers on categories are those of the cart products.
+        The feed of the region is saved too, so that the overrides can be prepared again when the cart products
+        are rebuilt (see prepare_regions)
+
+        :param region: name of the region
+        :param offers: offers of the region
+        :param price_list: price list of the region
+        :param snapshot: catalog the overlay is prepared on, defaults to the shared catalog
+        :param products_without_offers: ids of the products which have no offers in the region
+        :return: time taken in seconds by each phase (index, build, save) or None if it failed
+        """
+        if snapshot is None:
+            snapshot = CatalogSnapshot.shared()
+        timings = {}
         try:
-            with open('Cache/products.pkl', 'rb') as in_file:
+            started = time.perf_counter()
+            offers_by_product = CartProduct.index_offers_by_product([x for x in offers or ()
+                                                                     if not isinstance(x, OfferCategory)])
+            for product_id in products_without_offers:
+                offers_by_product.setdefault(product_id, ())
+            price_list = list(price_list or ())
+            timings['index'] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            prices, offer_overrides = RegionalCatalog.overlay(snapshot.catalog_index, price_list, offers_by_product)
+            timings['build'] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            CatalogSnapshot.write_region_feed(region, price_list, offers_by_product, snapshot.path)
+            CatalogSnapshot.write_region(region, prices, offer_overrides, snapshot.path)
+            timings['save'] = time.perf_counter() - started
+            return timings
+        except Exception as e:
+            CustomLogging.log_error(e)
+            return None
+
+    @staticmethod
+    def prepare_regions(cart_products, path: str = CART_PRODUCTS_CACHE) -> int:
+        """
+        This function prepares again the overrides of every region from its saved feed, overrides are what differs
+        from the cart products so they must follow the cart products when these are rebuilt
+        :param cart_products: rebuilt cart products
+        :param path: path of the cart products cache
+        :return: number of regions prepared
+        """
+        regions = CatalogSnapshot.regions(path)
+        if not regions:
+            return 0
+        catalog_index = CatalogIndex(cart_products)
+        for region in regions:
+            price_list, offers_by_product = CatalogSnapshot.read_region_feed(region, path)
+            prices, offer_overrides = RegionalCatalog.overlay(catalog_index, price_list, offers_by_product)
+            CatalogSnapshot.write_region(region, prices, offer_overrides, path)
+        return len(regions)
+
+    @staticmethod
+    def save_category_offers(category_offers: List[OfferCategory], path: str = CART_PRODUCTS_CACHE) -> None:
+        """
+        Saves offers on categories next to the cart products cache, the file is removed when there are none
+        :param category_offers: offers on categories
+        :param path: path of the cart products cache
+        :return: None
+        """
+        if category_offers:
+            CatalogSnapshot.write_category_offers(category_offers, path)
+            return
+        try:
+            os.remove(CatalogSnapshot.category_offers_path(path))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def apply_change_set(change_set: ChangeSet, snapshot: CatalogSnapshot = None, persist: bool = False) -> int:
+        """
+        This function applies changes made to products, prices and offers to the cart products of the catalog
+        instead of rebuilding all cart products with prepare_cart_products
+
+        Only the cart products affected by the changes are replaced (by changed copies, cart products in use by
+        PriceBasket are never modified) and the catalog index is updated for them only.
+        Removing products shifts positions of the cart products so the index is built again in that case.
+        Changes to offers on categories only change the index, no cart product is affected.
+        A snapshot of a columnar catalog file gets a CatalogIndex over its cart products, with persist the
+        columnar file is written again.
+        Overrides of the regions are not prepared again, they follow the changes at the next rebuild of the cart
+        products (see prepare_regions)
+
+        This method is not thread safe, should be executed on a single thread
+
+        :param change_set: changes fetched from the services
+        :param snapshot: catalog to apply the changes to, defaults to the shared catalog
+        :param persist: if True the updated cart products are also written to the cache
+        :return: new version of the catalog
+        """
+        if snapshot is None:
+            snapshot = CatalogSnapshot.shared()
+        cart_products, catalog_index = snapshot.get()
+        if not isinstance(catalog_index, CatalogIndex):
+            # columnar catalog is read only, changes are applied to an index over its cart products
+            catalog_index = CatalogIndex(catalog_index, catalog_index.category_offers)
+            cart_products = catalog_index.products
+
+        # changed copies of the cart products by product id
+        changed = {}
+
+        def current(product_id):
+            cart_product = changed.get(product_id)
+            return cart_product if cart_product is not None else catalog_index.get_product_by_id(product_id)
+
+        def changed_copy(product_id):
+            cart_product = changed.get(product_id)
+            if cart_product is None:
+                cart_product = changed[product_id] = catalog_index.get_product_by_id(product_id).copy()
+            return cart_product
+
+        for product in change_set.products:
+            existing = current(product.product_id)
+            if existing is not None:
+                price, offers = existing.price, existing.offers
+            else:
+                price = product.price
+                offers = tuple(x for x in catalog_index.get_offers()
+                               if product.product_id in CartProduct.get_offer_product_ids(x))
+            changed[product.product_id] = CartProduct(product.product_id, product.product_description,
+                                                      product.product_type, price, product.product_unit, offers)
+
+        for price in change_set.prices:
+            if current(price.product_id) is not None:
+                changed_copy(price.product_id).price = price.price_per_unit
+
+        category_offers = {x.offer_id: x for x in catalog_index.category_offers}
+        categories_changed = False
+        for offer in change_set.offers:
+            if isinstance(offer, OfferCategory):
+                category_offers[offer.offer_id] = offer
+                categories_changed = True
+        for offer_id in change_set.removed_offer_ids:
+            if category_offers.pop(offer_id, None) is not None:
+                categories_changed = True
+        category_offers = tuple(category_offers.values()) if categories_changed else None
+
+        updated_offers = {x.offer_id: x for x in change_set.offers if not isinstance(x, OfferCategory)}
+        changed_offer_ids = set(change_set.removed_offer_ids) | set(updated_offers)
+        affected_product_ids = set()
+        for offer_id in changed_offer_ids:
+            affected_product_ids |= catalog_index.get_product_ids_with_offer(offer_id)
+        for offer in updated_offers.values():
+            affected_product_ids.update(CartProduct.get_offer_product_ids(offer))
+
+        for product_id in affected_product_ids:
+            existing = current(product_id)
+            if existing is None:
+                continue
+            # updated offers keep their place among the offers of the product, new offers are added at the end
+            offers = []
+            for offer in existing.offers or ():
+                if offer.offer_id not in changed_offer_ids:
+                    offers.append(offer)
+                elif offer.offer_id in updated_offers and \
+                        product_id in CartProduct.get_offer_product_ids(updated_offers[offer.offer_id]):
+                    offers.append(updated_offers[offer.offer_id])
+            offer_ids = {x.offer_id for x in offers}
+            for offer in updated_offers.values():
+                if offer.offer_id not in offer_ids and product_id in CartProduct.get_offer_product_ids(offer):
+                    offers.append(offer)
+            changed_copy(product_id).offers = tuple(offers)
+
+        removed_product_ids = {x for x in change_set.removed_product_ids if current(x) is not None}
+        if removed_product_ids:
+            updated_products = tuple(changed.pop(x.product_id, x) for x in cart_products
+                                     if x.product_id not in removed_product_ids)
+            updated_products += tuple(x for x in changed.values() if x.product_id not in removed_product_ids)
+            updated_index = CatalogIndex(updated_products, catalog_index.category_offers if category_offers is None
+                                         else category_offers)
+        else:
+            updated_products = list(cart_products)
+            changed_positions = []
+            for product_id, cart_product in changed.items():
+                position = catalog_index.get_position(product_id)
+                if position is None:
+                    position = len(updated_products)
+                    updated_products.append(cart_product)
+                else:
+                    updated_products[position] = cart_product
+                changed_positions.append(position)
+            updated_products = tuple(updated_products)
+            updated_index = catalog_index.updated(updated_products, changed_positions, category_offers)
+
+        return snapshot.publish(updated_products, updated_index, change_set.version, persist)
+
+    @staticmethod
+    def get_offer_product_ids(offer: Offer) -> tuple:
+        """
+        Returns ids of the products an offer is valid on, an offer can be on a single product id or on a list of
+        product ids (OfferGroup)
+        :param offer: offer
+        :return: tuple of product ids
+        """
+        product_ids = offer.product_id
+        if isinstance(product_ids, (list, tuple, set, frozenset)):
+            # same product listed twice must not add the offer twice
+            return tuple(dict.fromkeys(product_ids))
+        return product_ids,
+
+    @staticmethod
+    def index_offers_by_product(offers: Optional[List[Offer]]) -> dict:
+        """
+        Buckets offers by the ids of the products they are valid on in a single pass over the offers
+        An offer can be on a single product id or on a list of product ids (OfferGroup),
+        order of the offers is kept within each bucket
+        :param offers: list of offers
+        :return: dict of product id to tuple of offers
+        """
+        buckets = {}
+        for offer in offers or ():
+            for product_id in CartProduct.get_offer_product_ids(offer):
+                buckets.setdefault(product_id, []).append(offer)
+        return {product_id: tuple(bucket) for product_id, bucket in buckets.items()}
+
+    @staticmethod
+    def index_prices_by_product(price_list: Optional[List[Price]]) -> dict:
+        """
+        Indexes the price list by product id in a single pass, first price of a product wins
+        :param price_list: list of prices
+        :return: dict of product id to price
+        """
+        prices = {}
+        for price in price_list or ():
+            prices.setdefault(price.product_id, price)
+        return prices
+
+    @staticmethod
+    def build_catalog_index(cart_products: List['CartProduct']) -> CatalogIndex:
+        """
+        Builds a hash index over the cart products which can be passed to get_product_by_id and
+        get_product_by_description instead of the list of cart products for O(1) lookups
+        :param cart_products: list of cart products
+        :return: index over the cart products
+        """
+        return CatalogIndex(cart_products)
+
+    @staticmethod
+    def get_updated_products(cache_directory: str = CACHE_DIRECTORY) -> Optional:
+        try:
+            with open(os.path.join(cache_directory, 'products.pkl'), 'rb') as in_file:
                 return pickle.load(in_file)
         except Exception as e:
             CustomLogging.log_error(e)
             return None
 
     @staticmethod
-    def get_updated_price_list() -> Optional:
+    def get_updated_price_list(cache_directory: str = CACHE_DIRECTORY) -> Optional:
         try:
-            with open('Cache/pricelist.pkl', 'rb') as in_file:
+            with open(os.path.join(cache_directory, 'pricelist.pkl'), 'rb') as in_file:
                 return pickle.load(in_file)
         except Exception as e:
             CustomLogging.log_error(e)
             return None
 
     @staticmethod
-    def get_updated_offers() -> Optional:
+    def get_updated_offers(cache_directory: str = CACHE_DIRECTORY) -> Optional:
         try:
-            with open('Cache/offers.pkl', 'rb') as in_file:
+            with open(os.path.join(cache_directory, 'offers.pkl'), 'rb') as in_file:
                 return pickle.load(in_file)
         except Exception as e:
             CustomLogging.log_error(e)
@@ -170,7 +507,10 @@ class CartProduct:
 
     @staticmethod
     # using lambda instead of comprehension to avoid extra initialization of memory
-    def get_product_by_description(description: str, products: List['CartProduct']) -> Optional:
+    def get_product_by_description(description: str, products: List['CartProduct'] | CatalogIndex) -> Optional:
+        if isinstance(products, CatalogIndex):
+            return products.get_product_by_description(description)
+
         product = CartProduct.get_filtered_data(lambda x: x.product_description.lower() == description.lower(),
                                                 products)
         if product is not None:
@@ -181,6 +521,9 @@ class CartProduct:
     # using lambda instead of comprehension to avoid extra initialization of memory
     @staticmethod
     def get_product_by_id(product_id, products) -> Optional:
+        if isinstance(products, CatalogIndex):
+            return products.get_product_by_id(product_id)
+
         product = CartProduct.get_filtered_data(lambda x: x.product_id == product_id,
                                                 products)
         if product is not None:
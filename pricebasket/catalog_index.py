@@ -0,0 +1,330 @@
+import datetime
+from typing import Dict, Iterable, Optional
+
+from pricebasket.offer_interval_index import OfferIntervalIndex
+from rule_engine.compiled_rule import CompiledRule
+from rule_engine.rule_inference_engine import RuleInferenceEngine
+
+
+class CatalogIndex:
+    """
+    This class represents a hash index over the cart products so that pricing does not need to scan
+    the whole catalog for every item in the basket
+
+    It is built once from the cart products and gives O(1) lookups by product id and by normalized
+    (lower case) product description. Both PriceBasket and CartProduct use it instead of filtering the
+    catalog with a lambda on every lookup.
+
+    Substring matching used by PriceBasket (a catalog description contained in the description entered
+    by the user) is resolved by looking up the substrings of the entered description in the index, so
+    it returns the same product as scanning the catalog in order but its cost depends on the length
+    of the entered description instead of the size of the catalog
+        ...
+    Attributes
+    ----------
+    _products : tuple
+        cart products in catalog order
+    _by_id : dict
+        product id to the position of the cart product
+    _by_description : dict
+        normalized description to the position of the first cart product having that description
+    _description_lengths : tuple
+        distinct lengths of the normalized descriptions, used to limit substrings looked up
+    _compiled_rules : dict
+        offer id to the conditions of the offer compiled by RuleInferenceEngine, compiled when the index is built
+        so that they are reused by every basket
+    _offer_products : dict
+        offer id to the set of ids of the cart products carrying the offer, built on first use as only
+        catalog updates need it
+    _offers_by_id : dict
+        offer id to offer, built together with _offer_products
+    _offer_intervals : OfferIntervalIndex
+        validity windows of the offers, built on first use as only pricing at a timestamp needs it
+    _by_product_type : dict
+        product type to the positions of the cart products of that type
+    _category_offers : dict
+        product type to the offers on the whole category (OfferCategory), they are kept once here instead of
+        being copied in every cart product of the category
+    """
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_products', '_by_id', '_by_description', '_description_lengths', '_compiled_rules',
+                 '_offer_products', '_offers_by_id', '_offer_intervals', '_by_product_type', '_category_offers']
+
+    def __init__(self, cart_products: Iterable = (), category_offers: Iterable = ()):
+        self._products = tuple(cart_products)
+        self._by_id: Dict = {}
+        self._by_description: Dict[str, int] = {}
+        by_product_type = {}
+
+        # first occurrence wins to keep the results of the previous linear scans
+        for position, cart_product in enumerate(self._products):
+            self._by_id.setdefault(cart_product.product_id, position)
+            self._by_description.setdefault(CatalogIndex.normalize(cart_product.product_description), position)
+            by_product_type.setdefault(cart_product.product_type, []).append(position)
+
+        self._description_lengths = tuple(sorted({len(x) for x in self._by_description}))
+        self._by_product_type: Dict = {x: tuple(y) for x, y in by_product_type.items()}
+        self._category_offers = CatalogIndex.index_category_offers(category_offers)
+
+        self._compiled_rules: Dict = {}
+        for cart_product in self._products:
+            self._compile_offers(cart_product)
+
+        self._offer_products = None
+        self._offers_by_id = None
+        self._offer_intervals = None
+
+    def __len__(self):
+        return len(self._products)
+
+    def __iter__(self):
+        return iter(self._products)
+
+    def __repr__(self):
+        return f"CatalogIndex: products = {len(self._products)}"
+
+    @property
+    def products(self):
+        return self._products
+
+    @property
+    def category_offers(self) -> tuple:
+        return tuple(x for offers in self._category_offers.values() for x in offers)
+
+    @staticmethod
+    def normalize(description: str) -> str:
+        return description.lower()
+
+    @staticmethod
+    def index_category_offers(category_offers: Iterable) -> dict:
+        """
+        Buckets offers on categories by product type, order of the offers is kept within each bucket
+        :param category_offers: offers on categories (OfferCategory)
+        :return: dict of product type to tuple of offers
+        """
+        buckets = {}
+        for offer in category_offers or ():
+            buckets.setdefault(offer.product_type, []).append(offer)
+        return {product_type: tuple(bucket) for product_type, bucket in buckets.items()}
+
+    def get_compiled_rule(self, offer) -> CompiledRule:
+        """
+        Returns the compiled conditions of the offer, offers which are not in the catalog are compiled on first use
+        :param offer: offer with conditions (OfferGroup)
+        :return: compiled conditions
+        """
+        compiled_rule = self._compiled_rules.get(offer.offer_id)
+        if compiled_rule is None:
+            compiled_rule = self._compiled_rules.setdefault(offer.offer_id,
+                                                            RuleInferenceEngine.compile_conditions(offer.conditions))
+        return compiled_rule
+
+    def get_product_by_id(self, product_id) -> Optional:
+        position = self._by_id.get(product_id)
+        if position is None:
+            return None
+        return self._products[position]
+
+    def get_position(self, product_id) -> Optional[int]:
+        return self._by_id.get(product_id)
+
+    def get_product_ids_by_type(self, product_type) -> tuple:
+        """
+        Returns ids of the cart products of a product type (category) in catalog order
+        :param product_type: product type
+        :return: tuple of product ids
+        """
+        return tuple(self._products[x].product_id for x in self._by_product_type.get(product_type, ()))
+
+    def get_category_offers(self, product_type) -> tuple:
+        """
+        Returns offers on the whole category of products of the given type
+        :param product_type: product type
+        :return: tuple of offers
+        """
+        return self._category_offers.get(product_type, ())
+
+    def updated(self, cart_products: tuple, changed_positions: Iterable[int],
+                category_offers: Iterable = None) -> 'CatalogIndex':
+        """
+        Returns the index of cart_products, which are the cart products of this index where only the products at
+        changed_positions have been replaced or appended at the end.
+        This index is not modified so it stays valid for the callers still using it, only the dicts are copied
+        and entries of the changed products are updated which is much cheaper than indexing the catalog again.
+        If a replaced product has a different id, description or product type the whole index is built again
+
+        :param cart_products: cart products after the change
+        :param changed_positions: positions of the replaced and appended cart products
+        :param category_offers: offers on categories after the change, those of this index are kept if None
+        :return: index of cart_products
+        """
+        if category_offers is None:
+            category_offers = self.category_offers
+        index = CatalogIndex.__new__(CatalogIndex)
+        index._products = tuple(cart_products)
+        index._by_id = self._by_id.copy()
+        index._by_description = self._by_description.copy()
+        index._by_product_type = self._by_product_type.copy()
+        index._category_offers = CatalogIndex.index_category_offers(category_offers)
+        index._compiled_rules = self._compiled_rules.copy()
+        index._offer_products = None
+        index._offers_by_id = None
+        index._offer_intervals = None
+        if self._offer_products is not None:
+            # sets are copied only when they change
+            index._offer_products = self._offer_products.copy()
+            index._offers_by_id = self._offers_by_id.copy()
+
+        lengths = set(self._description_lengths)
+        for position in sorted(changed_positions):
+            cart_product = index._products[position]
+            description = CatalogIndex.normalize(cart_product.product_description)
+            if position < len(self._products):
+                previous = self._products[position]
+                if previous.product_id != cart_product.product_id or \
+                        CatalogIndex.normalize(previous.product_description) != description or \
+                        previous.product_type != cart_product.product_type:
+                    return CatalogIndex(cart_products, category_offers)
+                index._update_offer_products(previous, cart_product)
+            else:
+                index._update_offer_products(None, cart_product)
+                index._by_id.setdefault(cart_product.product_id, position)
+                index._by_description.setdefault(description, position)
+                index._by_product_type[cart_product.product_type] = \
+                    index._by_product_type.get(cart_product.product_type, ()) + (position,)
+                lengths.add(len(description))
+            # offers of a changed product might have been updated under the same offer id
+            index._compile_offers(cart_product, True)
+
+        index._description_lengths = tuple(sorted(lengths))
+        return index
+
+    def get_product_ids_with_offer(self, offer_id) -> frozenset:
+        """
+        Returns ids of the cart products carrying the offer
+        :param offer_id: id of the offer
+        :return: set of product ids
+        """
+        if self._offer_products is None:
+            self._index_offers()
+        return frozenset(self._offer_products.get(offer_id, ()))
+
+    def get_offers(self) -> tuple:
+        """
+        Returns all offers carried by the cart products followed by the offers on categories
+        :return: tuple of offers
+        """
+        if self._offers_by_id is None:
+            self._index_offers()
+        return tuple(self._offers_by_id.values()) + self.category_offers
+
+    def get_offer_intervals(self) -> OfferIntervalIndex:
+        if self._offer_intervals is None:
+            self._offer_intervals = OfferIntervalIndex(self.get_offers())
+        return self._offer_intervals
+
+    def get_offers_at(self, cart_product, priced_at: Optional[datetime.datetime]) -> tuple:
+        """
+        Returns offers of the cart product which are active and valid at the pricing timestamp
+        If the cart product has no such offer of its own the offers on its category are returned instead,
+        they are found by the product type of the cart product so the lookup is O(1).
+        Offers on the category also apply when none of the offers of the product applies (e.g. an OfferGroup whose
+        discounted product has not been purchased), pricing engines get them with get_category_offers_at
+        :param cart_product: cart product
+        :param priced_at: pricing timestamp, all offers of the cart product are returned if None
+        :return: tuple of offers
+        """
+        offers = cart_product.offers or ()
+        if priced_at is not None and offers:
+            valid = self.get_offer_intervals().valid_at(priced_at)
+            offers = tuple(x for x in offers if x.offer_id in valid and x.active)
+        if offers or not self._category_offers:
+            # offers of cart products are already tuples, which tuple does not copy
+            return tuple(offers)
+        return self.get_category_offers_at(cart_product, priced_at)
+
+    def get_category_offers_at(self, cart_product, priced_at: Optional[datetime.datetime]) -> tuple:
+        """
+        Returns offers on the category of the cart product which are active and valid at the pricing timestamp
+        :param cart_product: cart product
+        :param priced_at: pricing timestamp, all offers on the category are returned if None
+        :return: tuple of offers
+        """
+        offers = self._category_offers.get(cart_product.product_type, ())
+        if priced_at is not None and offers:
+            valid = self.get_offer_intervals().valid_at(priced_at)
+            offers = tuple(x for x in offers if x.offer_id in valid and x.active)
+        return offers
+
+    def _index_offers(self) -> None:
+        offer_products = {}
+        offers_by_id = {}
+        for cart_product in self._products:
+            for offer in cart_product.offers or ():
+                offer_products.setdefault(offer.offer_id, set()).add(cart_product.product_id)
+                offers_by_id[offer.offer_id] = offer
+        self._offers_by_id = offers_by_id
+        self._offer_products = offer_products
+
+    def _update_offer_products(self, previous, cart_product) -> None:
+        if self._offer_products is None:
+            return
+        for offer in (previous.offers or ()) if previous is not None else ():
+            product_ids = self._offer_products.get(offer.offer_id)
+            if product_ids is not None:
+                product_ids = product_ids - {previous.product_id}
+                if product_ids:
+                    self._offer_products[offer.offer_id] = product_ids
+                else:
+                    del self._offer_products[offer.offer_id]
+                    del self._offers_by_id[offer.offer_id]
+        for offer in cart_product.offers or ():
+            self._offer_products[offer.offer_id] = self._offer_products.get(offer.offer_id, set()) | {
+                cart_product.product_id}
+            self._offers_by_id[offer.offer_id] = offer
+
+    def _compile_offers(self, cart_product, recompile: bool = False) -> None:
+        for offer in cart_product.offers or ():
+            if hasattr(offer, 'conditions') and (recompile or offer.offer_id not in self._compiled_rules):
+                self._compiled_rules[offer.offer_id] = RuleInferenceEngine.compile_conditions(offer.conditions)
+
+    def get_product_by_description(self, description: str) -> Optional:
+        """
+        Returns the cart product whose description is equal to the given description ignoring case
+        :param description: description of the product
+        :return: cart product if found else None
+        """
+        position = self._by_description.get(CatalogIndex.normalize(description))
+        if position is None:
+            return None
+        return self._products[position]
+
+    def match_description(self, description: str) -> Optional:
+        """
+        Returns the first cart product (in catalog order) whose normalized description is contained in the
+        given description, which is how products entered by the user are matched to the catalog
+
+        :param description: description entered by the user
+        :return: cart product if found else None
+        """
+        by_description = self._by_description
+
+        # most of the time user enters the exact description and no other product is a part of it
+        position = by_description.get(description)
+        if position == 0:
+            return self._products[0]
+
+        best = position
+        description_length = len(description)
+        for length in self._description_lengths:
+            if length >= description_length:
+                break
+            for start in range(description_length - length + 1):
+                found = by_description.get(description[start:start + length])
+                if found is not None and (best is None or found < best):
+                    best = found
+
+        if best is None:
+            return None
+        return self._products[best]
@@ -0,0 +1,504 @@
+import os
+import pickle
+import re
+import threading
+from typing import Dict, Optional
+
+from logs.logging import CustomLogging
+from pricebasket.catalog_index import CatalogIndex
+from pricebasket.regional_catalog import RegionalCatalog
+
+CACHE_DIRECTORY = 'Cache'
+CART_PRODUCTS_CACHE = 'Cache/cartProducts.pkl'
+CATEGORY_OFFERS_FILE = 'categoryOffers.pkl'
+REGIONS_DIRECTORY = 'regions'
+REGION_FEED_SUFFIX = '.feed.pkl'
+# region names are file names
+REGION_NAME = re.compile(r'[A-Za-z0-9_-]+')
+
+
+class CatalogSnapshot:
+    """
+    This class represents an in-memory snapshot of the cart products cache which is shared by the whole process
+
+    Unpickling the cart products for every PriceBasket costs more than pricing the basket, so the snapshot
+    loads the cache once and every PriceBasket reuses the same cart products and CatalogIndex.
+    Before handing out the snapshot the version file and modification time of the cache file are checked
+    (a stat call, no reading) and the cache is reloaded only if one of them has changed,
+    e.g. after CartProduct.prepare_cart_products has rebuilt the cache
+
+    Snapshots are shared per cache path, use CatalogSnapshot.shared() to get one.
+    The cache can also be a columnar catalog file (.pbcat, see ColumnarCatalog) which is opened with mmap
+    instead of being unpickled, the ColumnarCatalog is then both the cart products and their index.
+    Offers on categories are not part of the cart products, they are loaded from their own cache file in the
+    directory of the cache (see category_offers_path) and given to the index.
+    Catalogs of regions are overlays on the loaded catalog (see RegionalCatalog), an overlay is loaded from its
+    own file (see region_path) the first time the region is used and again when the file or the catalog changes
+
+    Catalogs published in memory (see publish) are written to the cache file by persist, on the calling thread or
+    on a background thread with persist_in_background. Files are written next to the cache and renamed over it,
+    readers never load a partially written file and the lock is held only for the renames. The version file
+    also holds the version of the last change set applied, so changes are fetched from there after a restart
+
+    This class is thread safe
+        ...
+    Attributes
+    ----------
+    _path : str
+        path of the cart products cache file
+    _cart_products : tuple
+        cart products loaded from the cache
+    _catalog_index : CatalogIndex
+        index over the loaded cart products
+    _signature : tuple
+        modification time and size of the cache file, of its version file and of its category offers file
+        when it was loaded
+    _version : int
+        version of the catalog, it is the version written in the version file by prepare_cart_products when
+        the cache is loaded and it is incremented by every change set applied to the catalog
+    _change_set_version : int
+        version of the services in the last change set applied to the catalog
+    _persisted_version : int
+        version of the catalog written in the cache file, lower than version while published changes are not written
+    _load_count : int
+        number of times the cache file has been loaded
+    _hit_count : int
+        number of times the loaded snapshot has been reused
+    _regions : dict
+        region to the catalog index it overlays, the signature of its file and its RegionalCatalog
+    _region_version : int
+        number of overlays loaded, used as the version of the last one
+    _lock : Lock
+        so that concurrent callers don't load the same file twice
+    _write_lock : Lock
+        so that the cache file is written by one thread at a time
+    _writer : Thread
+        background thread writing published changes, None when there is nothing to write
+    _write_requested : bool
+        whether published changes are to be written by the background thread
+    """
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_path', '_cart_products', '_catalog_index', '_signature', '_version', '_change_set_version',
+                 '_persisted_version', '_load_count', '_hit_count', '_regions', '_region_version', '_lock',
+                 '_write_lock', '_writer', '_write_requested']
+
+    _shared: Dict[str, 'CatalogSnapshot'] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path: str = CART_PRODUCTS_CACHE):
+        self._path = path
+        self._cart_products = tuple([])
+        self._catalog_index = CatalogIndex()
+        self._signature = None
+        self._version = 0
+        self._change_set_version = 0
+        self._persisted_version = 0
+        self._load_count = 0
+        self._hit_count = 0
+        self._regions = {}
+        self._region_version = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._writer = None
+        self._write_requested = False
+
+    @staticmethod
+    def shared(path: str = CART_PRODUCTS_CACHE) -> 'CatalogSnapshot':
+        """
+        Returns the snapshot shared by the whole process for the given cache file
+        :param path: path of the cart products cache file
+        :return: shared snapshot
+        """
+        snapshot = CatalogSnapshot._shared.get(path)
+        if snapshot is None:
+            with CatalogSnapshot._shared_lock:
+                snapshot = CatalogSnapshot._shared.setdefault(path, CatalogSnapshot(path))
+        return snapshot
+
+    @staticmethod
+    def version_path(path: str = CART_PRODUCTS_CACHE) -> str:
+        # columnar catalog is built from the cache and rewritten on its own, so it is versioned on its own
+        if path.endswith('.pbcat'):
+            return path + '.version'
+        return os.path.splitext(path)[0] + '.version'
+
+    @staticmethod
+    def category_offers_path(path: str = CART_PRODUCTS_CACHE) -> str:
+        return os.path.join(os.path.dirname(path), CATEGORY_OFFERS_FILE)
+
+    @staticmethod
+    def read_category_offers(path: str = CART_PRODUCTS_CACHE) -> tuple:
+        """
+        Reads offers on categories stored next to the cache file
+        :param path: path of the cart products cache file
+        :return: tuple of offers, empty if there are none
+        """
+        try:
+            with open(CatalogSnapshot.category_offers_path(path), 'rb') as in_file:
+                return tuple(pickle.load(in_file))
+        except FileNotFoundError:
+            return ()
+
+    @staticmethod
+    def write_category_offers(category_offers, path: str = CART_PRODUCTS_CACHE) -> None:
+        CatalogSnapshot._write_file(CatalogSnapshot.category_offers_path(path), pickle.dumps(list(category_offers)))
+
+    @staticmethod
+    def region_path(region: str, path: str = CART_PRODUCTS_CACHE) -> str:
+        if not REGION_NAME.fullmatch(region):
+            raise ValueError(f"region must be letters, digits, _ or -, got {region!r}")
+        return os.path.join(os.path.dirname(path), REGIONS_DIRECTORY, f"{region}.pkl")
+
+    @staticmethod
+    def read_region(region: str, path: str = CART_PRODUCTS_CACHE) -> tuple[dict, dict]:
+        """
+        Reads the overrides of a region stored next to the cache file
+        :param region: name of the region
+        :param path: path of the cart products cache file
+        :return: product id to price and product id to offers, both empty if the region has no overrides
+        """
+        try:
+            with open(CatalogSnapshot.region_path(region, path), 'rb') as in_file:
+                overlay = pickle.load(in_file)
+            return overlay['prices'], overlay['offers']
+        except FileNotFoundError:
+            return {}, {}
+
+    @staticmethod
+    def write_region(region: str, prices: dict, offers: dict, path: str = CART_PRODUCTS_CACHE) -> None:
+        region_path = CatalogSnapshot.region_path(region, path)
+        os.makedirs(os.path.dirname(region_path), exist_ok=True)
+        CatalogSnapshot._write_file(region_path, pickle.dumps({'prices': prices, 'offers': offers}))
+
+    @staticmethod
+    def region_feed_path(region: str, path: str = CART_PRODUCTS_CACHE) -> str:
+        return os.path.splitext(CatalogSnapshot.region_path(region, path))[0] + REGION_FEED_SUFFIX
+
+    @staticmethod
+    def regions(path: str = CART_PRODUCTS_CACHE) -> list:
+        """
+        Returns the names of the regions whose feed is stored next to the cache file
+        :param path: path of the cart products cache file
+        :return: sorted list of region names
+        """
+        try:
+            file_names = os.listdir(os.path.join(os.path.dirname(path), REGIONS_DIRECTORY))
+        except FileNotFoundError:
+            return []
+        return sorted(x[:-len(REGION_FEED_SUFFIX)] for x in file_names if x.endswith(REGION_FEED_SUFFIX))
+
+    @staticmethod
+    def read_region_feed(region: str, path: str = CART_PRODUCTS_CACHE) -> tuple[list, dict]:
+        """
+        Reads the feed a region was prepared from, stored next to the cache file
+        :param region: name of the region
+        :param path: path of the cart products cache file
+        :return: regional price list and product id to regional offers
+        """
+        with open(CatalogSnapshot.region_feed_path(region, path), 'rb') as in_file:
+            feed = pickle.load(in_file)
+        return feed['prices'], feed['offers']
+
+    @staticmethod
+    def write_region_feed(region: str, price_list: list, offers: dict, path: str = CART_PRODUCTS_CACHE) -> None:
+        feed_path = CatalogSnapshot.region_feed_path(region, path)
+        os.makedirs(os.path.dirname(feed_path), exist_ok=True)
+        CatalogSnapshot._write_file(feed_path, pickle.dumps({'prices': price_list, 'offers': offers}))
+
+    @staticmethod
+    def read_versions(path: str = CART_PRODUCTS_CACHE) -> tuple[int, int]:
+        """
+        Reads the version file stored next to the cache file
+        :param path: path of the cart products cache file
+        :return: version of the cache file and version of the last change set applied to it, 0 if not stored
+        """
+        try:
+            with open(CatalogSnapshot.version_path(path), 'r') as in_file:
+                lines = in_file.read().split()
+        except FileNotFoundError:
+            return 0, 0
+        return int(lines[0]) if lines else 0, int(lines[1]) if len(lines) > 1 else 0
+
+    @staticmethod
+    def read_version(path: str = CART_PRODUCTS_CACHE) -> int:
+        return CatalogSnapshot.read_versions(path)[0]
+
+    @staticmethod
+    def read_change_set_version(path: str = CART_PRODUCTS_CACHE) -> int:
+        return CatalogSnapshot.read_versions(path)[1]
+
+    @staticmethod
+    def write_version(path: str = CART_PRODUCTS_CACHE, change_set_version: int = None) -> int:
+        """
+        Increments the version stored next to the cache file, called whenever the cache file is rewritten
+        :param path: path of the cart products cache file
+        :param change_set_version: version of the last change set applied to the cache file, unchanged if None
+        :return: new version
+        """
+        version, stored_change_set_version = CatalogSnapshot.read_versions(path)
+        if change_set_version is None:
+            change_set_version = stored_change_set_version
+        CatalogSnapshot._write_file(CatalogSnapshot.version_path(path),
+                                    f"{version + 1}\n{change_set_version}\n".encode())
+        return version + 1
+
+    @staticmethod
+    def _write_file(path: str, data: bytes) -> None:
+        # written next to the file and renamed, readers never see a partially written file
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, 'wb') as out_file:
+            out_file.write(data)
+        os.replace(temporary_path, path)
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def cart_products(self):
+        return self.refresh()._cart_products
+
+    @property
+    def catalog_index(self):
+        return self.refresh()._catalog_index
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def change_set_version(self):
+        return self._change_set_version
+
+    @property
+    def load_count(self):
+        return self._load_count
+
+    @property
+    def hit_count(self):
+        return self._hit_count
+
+    def get(self) -> tuple[tuple, CatalogIndex]:
+        """
+        Returns cart products and their index, reloading the cache file first if it has changed
+        Both are returned together so that they always belong to the same load
+        :return: tuple of cart products and CatalogIndex
+        """
+        with self._lock:
+            self._refresh_locked()
+            return self._cart_products, self._catalog_index
+
+    def get_versioned(self, region: str = None) -> tuple[tuple, CatalogIndex, int]:
+        """
+        Returns cart products, their index and the version of the catalog they belong to,
+        reloading the cache file first if it has changed
+        With a region the RegionalCatalog of the region is both the cart products and their index,
+        version is the version of the base catalog
+        :param region: name of the region, the base catalog if None
+        :return: tuple of cart products, CatalogIndex and version
+        """
+        with self._lock:
+            self._refresh_locked()
+            if region is not None:
+                regional_catalog = self._get_region_locked(region)
+                return regional_catalog, regional_catalog, self._version
+            return self._cart_products, self._catalog_index, self._version
+
+    def get_region(self, region: str) -> RegionalCatalog:
+        """
+        Returns the catalog of a region, overlay of the region on the catalog of this snapshot
+        :param region: name of the region
+        :return: RegionalCatalog
+        """
+        with self._lock:
+            self._refresh_locked()
+            return self._get_region_locked(region)
+
+    def refresh(self) -> 'CatalogSnapshot':
+        with self._lock:
+            self._refresh_locked()
+        return self
+
+    def publish(self, cart_products: tuple, catalog_index: CatalogIndex, change_set_version: int = None,
+                persist: bool = False) -> int:
+        """
+        Replaces the cart products of the snapshot, used to apply changes to the catalog without loading
+        the cache file again. PriceBasket instances created before keep the cart products they were created with
+
+        :param cart_products: new cart products
+        :param catalog_index: index over the new cart products
+        :param change_set_version: version of the services in the change set which has been applied
+        :param persist: if True the cart products are also written to the cache file before returning, see persist
+        :return: new version of the catalog
+        """
+        with self._lock:
+            self._cart_products = cart_products
+            self._catalog_index = catalog_index
+            self._version += 1
+            if change_set_version is not None:
+                self._change_set_version = change_set_version
+        if persist:
+            self.persist()
+        return self._version
+
+    def persist(self) -> bool:
+        """
+        Writes the cart products published in memory to the cache file, in the columnar format if the cache file
+        is a columnar catalog file, together with the version of the last change set applied
+
+        Cart products are written to a file next to the cache file without holding the lock, so PriceBasket
+        instances are created meanwhile, the file is then renamed over the cache file
+        :return: True if the cache file has been written, False if there was nothing to write or writing failed
+        """
+        with self._write_lock:
+            with self._lock:
+                if self._persisted_version == self._version:
+                    return False
+                cart_products, catalog_index = self._cart_products, self._catalog_index
+                version, change_set_version = self._version, self._change_set_version
+
+            temporary_path = f"{self._path}.tmp"
+            try:
+                if self._path.endswith('.pbcat'):
+                    from pricebasket.columnar_catalog import ColumnarCatalog
+                    ColumnarCatalog.write(cart_products, temporary_path)
+                else:
+                    with open(temporary_path, 'wb') as out_file:
+                        pickle.dump(list(cart_products), out_file)
+
+                with self._lock:
+                    # renamed while holding the lock so that the snapshot never loads the file it is writing,
+                    # processes which have the previous columnar file mapped keep using it
+                    os.replace(temporary_path, self._path)
+                    CatalogSnapshot.write_category_offers(getattr(catalog_index, 'category_offers', ()), self._path)
+                    file_version = CatalogSnapshot.write_version(self._path, change_set_version)
+                    self._signature = self._file_signature()
+                    # cart products published while the file was written are newer and are written next time
+                    if self._version == version:
+                        self._version = version = max(version, file_version)
+                    self._persisted_version = version
+                return True
+            except Exception as e:
+                CustomLogging.log_error(e)
+                return False
+
+    def persist_in_background(self) -> None:
+        """
+        Writes the cart products published in memory to the cache file on a background thread, see persist
+        Changes published while a write is in progress are written once it has completed, only the last one
+        is written if several are published meanwhile
+        :return: None
+        """
+        with self._lock:
+            self._write_requested = True
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_requested_changes, name="catalog-snapshot-writer",
+                                                daemon=True)
+                self._writer.start()
+
+    def flush(self, timeout: float = None) -> None:
+        """
+        Waits for the background thread to write the published changes
+        :param timeout: seconds to wait, waits until written if None
+        :return: None
+        """
+        writer = self._writer
+        if writer is not None:
+            writer.join(timeout)
+
+    def _write_requested_changes(self) -> None:
+        while True:
+            with self._lock:
+                if not self._write_requested:
+                    self._writer = None
+                    return
+                self._write_requested = False
+            self.persist()
+
+    def invalidate(self) -> None:
+        """
+        Forces the cache file to be loaded again on the next use
+        :return: None
+        """
+        with self._lock:
+            self._signature = None
+
+    def _refresh_locked(self) -> None:
+        signature = self._file_signature()
+        # without a cache file, cart products published in memory are kept
+        if signature == self._signature and (signature is not None or self._version > 0):
+            self._hit_count += 1
+            return
+
+        loaded = self._load()
+        if loaded is not None:
+            self._cart_products, self._catalog_index = loaded
+            version = CatalogSnapshot.read_version(self._path)
+            # version never goes back within the process, even if changes have been applied to the loaded catalog
+            if self._load_count > 0 and version <= self._version:
+                version = self._version + 1
+            self._version = version
+            self._persisted_version = version
+            self._change_set_version = CatalogSnapshot.read_change_set_version(self._path)
+            self._signature = signature
+            self._load_count += 1
+
+    def _get_region_locked(self, region: str) -> RegionalCatalog:
+        region_path = CatalogSnapshot.region_path(region, self._path)
+        try:
+            region_stat = os.stat(region_path)
+            signature = (region_stat.st_mtime_ns, region_stat.st_size)
+        except OSError:
+            signature = None
+
+        loaded = self._regions.get(region)
+        # overlay is kept while neither its file nor the catalog it overlays have changed
+        if loaded is not None and loaded[0] is self._catalog_index and loaded[1] == signature:
+            return loaded[2]
+
+        prices, offers = {}, {}
+        try:
+            prices, offers = CatalogSnapshot.read_region(region, self._path)
+        except Exception as e:
+            CustomLogging.log_error(e)
+        self._region_version += 1
+        regional_catalog = RegionalCatalog(self._catalog_index, region, prices, offers, self._region_version)
+        self._regions[region] = (self._catalog_index, signature, regional_catalog)
+        return regional_catalog
+
+    def _file_signature(self) -> Optional[tuple]:
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            return None
+        signatures = []
+        for path in [CatalogSnapshot.version_path(self._path), CatalogSnapshot.category_offers_path(self._path)]:
+            try:
+                path_stat = os.stat(path)
+                signatures.append((path_stat.st_mtime_ns, path_stat.st_size))
+            except OSError:
+                signatures.append(None)
+        return (stat.st_mtime_ns, stat.st_size) + tuple(signatures)
+
+    def _load(self) -> Optional[tuple]:
+        try:
+            category_offers = CatalogSnapshot.read_category_offers(self._path)
+            if self._path.endswith('.pbcat'):
+                # imported here as columnar catalog builds on cart products which depend on this module
+                from pricebasket.columnar_catalog import ColumnarCatalog
+                catalog = ColumnarCatalog(self._path, category_offers)
+                return catalog, catalog
+
+            with open(self._path, 'rb') as in_file:
+                cart_products = tuple(pickle.load(in_file))
+            return cart_products, CatalogIndex(cart_products, category_offers)
+        except Exception as e:
+            CustomLogging.log_error(e)
+            return None
+
+    def __repr__(self):
+        return f"CatalogSnapshot: path = {self._path}," \
+               f"version = {self._version}," \
+               f"load_count = {self._load_count}," \
+               f"hit_count = {self._hit_count}"
@@ -0,0 +1,491 @@
+import array
+import datetime
+import mmap
+import os
+import pickle
+import struct
+import sys
+import uuid
+import zlib
+from typing import Iterable, Optional
+
+from mock_services.offer import OfferFlat, OfferGroup
+from pricebasket.cart_product import CartProduct
+from pricebasket.catalog_index import CatalogIndex
+from pricebasket.catalog_snapshot import CART_PRODUCTS_CACHE
+from pricebasket.offer_interval_index import OfferIntervalIndex
+from rule_engine.compiled_rule import CompiledRule
+from rule_engine.condition_rule import ConditionRule
+from rule_engine.custom_operator import CustomOperator
+from rule_engine.rule_inference_engine import RuleInferenceEngine
+
+COLUMNAR_CATALOG_EXTENSION = '.pbcat'
+COLUMNAR_CATALOG_CACHE = os.path.splitext(CART_PRODUCTS_CACHE)[0] + COLUMNAR_CATALOG_EXTENSION
+
+MAGIC = b'PBCAT\x00\x00\x01'
+BYTE_ORDER_MARK = 0x01020304
+FORMAT_VERSION = 1
+
+# reference to a missing string (None)
+NO_STRING = 0xFFFFFFFF
+
+# kinds of the values stored as strings so they are restored with the same type
+KIND_STR = 1
+KIND_UUID = 2
+
+OFFER_FLAT = 1
+OFFER_GROUP = 2
+
+OPERATOR_CODES = {CustomOperator.Equal: 1, CustomOperator.EqualOrGreater: 2}
+OPERATORS = {code: operator for operator, code in OPERATOR_CODES.items()}
+
+# columns of the file in the order they are written, with their array type code
+# u32 - 'I', u8 - 'B', f64 - 'd', i64 - 'q'
+COLUMNS = [
+    ('product_id', 'I'), ('product_id_kind', 'B'), ('product_description', 'I'), ('product_type', 'I'),
+    ('product_unit', 'I'), ('product_price', 'd'), ('product_offer_start', 'I'), ('product_offer_count', 'I'),
+    ('product_link', 'I'),
+    ('offer_kind', 'B'), ('offer_id', 'I'), ('offer_id_kind', 'B'), ('offer_description', 'I'),
+    ('offer_percent', 'd'), ('offer_percent_is_int', 'B'), ('offer_active', 'B'), ('offer_start_date', 'I'),
+    ('offer_end_date', 'I'), ('offer_discounted_id', 'I'), ('offer_discounted_id_kind', 'B'),
+    ('offer_eligible_start', 'I'), ('offer_eligible_count', 'I'), ('offer_eligible_is_list', 'B'),
+    ('offer_condition_start', 'I'), ('offer_condition_count', 'I'),
+    ('eligible_id', 'I'), ('eligible_id_kind', 'B'),
+    ('condition_operator', 'B'), ('condition_product_id', 'I'), ('condition_product_id_kind', 'B'),
+    ('condition_quantity', 'q'),
+    ('string_offset', 'I'), ('string_data', 'B'),
+    ('id_hash', 'I'), ('description_hash', 'I'), ('description_length', 'I'),
+]
+
+# magic, byte order mark, format version, then offset and length of every column
+HEADER = struct.Struct('=8sII' + 'QQ' * len(COLUMNS))
+
+
+class ColumnarCatalog:
+    """
+    This class represents the cart products stored in a compact binary file which is used through mmap
+
+    Unpickling the cart products cache builds every CartProduct, Offer and ConditionRule object in every process.
+    This file stores them as fixed width columns (ids, prices, units, ... as references to a string table)
+    plus tables of offers, conditions and two open addressing hash tables (by product id and by normalized
+    description). The file is opened with mmap and the columns are used in place through memoryviews, so
+    opening it takes constant time whatever the size of the catalog and processes opening the same file share
+    its pages instead of each holding a copy.
+
+    Cart products are created only when they are looked up (and kept for the next lookups of the same product).
+    It has the same lookups as CatalogIndex so PriceBasket can price baskets with it, and it is also a sequence
+    of cart products. It is read only, change sets are applied to a CatalogIndex over its cart products and
+    persisted by writing a new file (see CartProduct.apply_change_set).
+
+    Files are written with the byte order of the machine writing them, ColumnarCatalog.write builds a file
+    from cart products and ColumnarCatalog.convert_pickle from the cart products cache:
+        python -m pricebasket.columnar_catalog [Cache/cartProducts.pkl] [Cache/cartProducts.pbcat]
+        ...
+    Attributes
+    ----------
+    _path : str
+        path of the catalog file
+    _mmap : mmap
+        file mapped in memory
+    _columns : dict
+        column name to memoryview over the mapped file
+    _description_lengths : tuple
+        distinct lengths of the normalized descriptions, used to limit substrings looked up
+    _products : dict
+        cart products created so far by position
+    _offers : dict
+        offers created so far by position
+    _compiled_rules : dict
+        offer id to compiled conditions of the offer, compiled on first use
+    _offer_intervals : OfferIntervalIndex
+        validity windows of all the offers, built on first use as only pricing at a timestamp needs it
+    _category_offers : dict
+        product type to the offers on the whole category, they are not stored in the file (see CatalogIndex)
+    """
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_path', '_mmap', '_columns', '_description_lengths', '_products', '_offers', '_compiled_rules',
+                 '_offer_intervals', '_category_offers']
+
+    def __init__(self, path: str = COLUMNAR_CATALOG_CACHE, category_offers: Iterable = ()):
+        self._path = path
+        self._category_offers = CatalogIndex.index_category_offers(category_offers)
+        with open(path, 'rb') as in_file:
+            self._mmap = mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, byte_order_mark, format_version, *sections = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a columnar catalog file of version {FORMAT_VERSION}")
+        if byte_order_mark != BYTE_ORDER_MARK:
+            self._mmap.close()
+            raise ValueError(f"{path} has been written on a machine with a different byte order")
+
+        view = memoryview(self._mmap)
+        self._columns = {}
+        for (name, type_code), offset, length in zip(COLUMNS, sections[0::2], sections[1::2]):
+            self._columns[name] = view[offset:offset + length].cast(type_code)
+
+        self._description_lengths = tuple(self._columns['description_length'])
+        self._products = {}
+        self._offers = {}
+        self._compiled_rules = {}
+        self._offer_intervals = None
+
+    def __reduce__(self):
+        # worker processes open the same file instead of receiving a copy of the catalog
+        return ColumnarCatalog, (self._path, self.category_offers)
+
+    def __len__(self):
+        return len(self._columns['product_id'])
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return tuple(self._product(x) for x in range(*position.indices(len(self))))
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("cart product position out of range")
+        return self._product(position)
+
+    def __iter__(self):
+        return (self._product(x) for x in range(len(self)))
+
+    def __repr__(self):
+        return f"ColumnarCatalog: path = {self._path}," \
+               f"products = {len(self)}"
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def products(self):
+        return tuple(self)
+
+    @property
+    def category_offers(self) -> tuple:
+        return tuple(x for offers in self._category_offers.values() for x in offers)
+
+    def close(self) -> None:
+        for column in self._columns.values():
+            column.release()
+        self._columns = {}
+        self._mmap.close()
+
+    def get_product_by_id(self, product_id) -> Optional[CartProduct]:
+        position = self.get_position(product_id)
+        if position is None:
+            return None
+        return self._product(position)
+
+    def get_position(self, product_id) -> Optional[int]:
+        kind = KIND_UUID if isinstance(product_id, uuid.UUID) else KIND_STR
+        ids = self._columns['product_id']
+        kinds = self._columns['product_id_kind']
+        return self._find(self._columns['id_hash'], str(product_id),
+                          lambda x: kinds[x] == kind and self._string(ids[x]) == str(product_id))
+
+    def get_product_ids_by_type(self, product_type) -> tuple:
+        # product types are not indexed in the file, only pricing needs to be fast
+        return tuple(x.product_id for x in self if x.product_type == product_type)
+
+    def get_category_offers(self, product_type) -> tuple:
+        return self._category_offers.get(product_type, ())
+
+    def get_product_ids_with_offer(self, offer_id) -> frozenset:
+        # offers are not indexed by product in the file, changes are applied to a CatalogIndex (see
+        # CartProduct.apply_change_set)
+        return frozenset(x.product_id for x in self if any(y.offer_id == offer_id for y in x.offers or ()))
+
+    def get_product_by_description(self, description: str) -> Optional[CartProduct]:
+        position = self._find_description(CatalogIndex.normalize(description))
+        if position is None:
+            return None
+        return self._product(position)
+
+    def match_description(self, description: str) -> Optional[CartProduct]:
+        """
+        Returns the first cart product whose normalized description is contained in the given description,
+        same as CatalogIndex.match_description
+        :param description: description entered by the user
+        :return: cart product if found else None
+        """
+        best = self._find_description(description)
+        description_length = len(description)
+        for length in self._description_lengths:
+            if length >= description_length:
+                break
+            for start in range(description_length - length + 1):
+                found = self._find_description(description[start:start + length])
+                if found is not None and (best is None or found < best):
+                    best = found
+
+        if best is None:
+            return None
+        return self._product(best)
+
+    def get_compiled_rule(self, offer) -> CompiledRule:
+        compiled_rule = self._compiled_rules.get(offer.offer_id)
+        if compiled_rule is None:
+            compiled_rule = self._compiled_rules.setdefault(offer.offer_id,
+                                                            RuleInferenceEngine.compile_conditions(offer.conditions))
+        return compiled_rule
+
+    def get_offers(self) -> tuple:
+        """
+        Returns all offers of the catalog followed by the offers on categories, creating those which have not
+        been created yet
+        :return: tuple of offers
+        """
+        return tuple(self._offer(x) for x in range(len(self._columns['offer_kind']))) + self.category_offers
+
+    def get_offer_intervals(self) -> OfferIntervalIndex:
+        if self._offer_intervals is None:
+            self._offer_intervals = OfferIntervalIndex(self.get_offers())
+        return self._offer_intervals
+
+    def get_offers_at(self, cart_product, priced_at: Optional[datetime.datetime]) -> tuple:
+        # same as CatalogIndex, it only depends on get_offer_intervals
+        return CatalogIndex.get_offers_at(self, cart_product, priced_at)
+
+    def get_category_offers_at(self, cart_product, priced_at: Optional[datetime.datetime]) -> tuple:
+        return CatalogIndex.get_category_offers_at(self, cart_product, priced_at)
+
+    def _find_description(self, normalized_description: str) -> Optional[int]:
+        descriptions = self._columns['product_description']
+        return self._find(self._columns['description_hash'], normalized_description,
+                          lambda x: CatalogIndex.normalize(self._string(descriptions[x])) == normalized_description)
+
+    @staticmethod
+    def _find(table, key: str, matches) -> Optional[int]:
+        # open addressing with linear probing, slots hold position + 1 and 0 for an empty slot
+        mask = len(table) - 1
+        slot = ColumnarCatalog._hash(key) & mask
+        while True:
+            entry = table[slot]
+            if entry == 0:
+                return None
+            if matches(entry - 1):
+                return entry - 1
+            slot = (slot + 1) & mask
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        # python hash of strings changes between processes, crc32 is the same for every reader
+        return zlib.crc32(key.encode('utf-8'))
+
+    def _string(self, reference: int) -> Optional[str]:
+        if reference == NO_STRING:
+            return None
+        offsets = self._columns['string_offset']
+        return str(self._columns['string_data'][offsets[reference]:offsets[reference + 1]], 'utf-8')
+
+    def _value(self, reference: int, kind: int):
+        value = self._string(reference)
+        if value is not None and kind == KIND_UUID:
+            return uuid.UUID(value)
+        return value
+
+    def _date(self, reference: int) -> Optional[datetime.datetime]:
+        value = self._string(reference)
+        return datetime.datetime.fromisoformat(value) if value is not None else None
+
+    def _product(self, position: int) -> CartProduct:
+        cart_product = self._products.get(position)
+        if cart_product is None:
+            columns = self._columns
+            start = columns['product_offer_start'][position]
+            links = columns['product_link'][start:start + columns['product_offer_count'][position]]
+            cart_product = CartProduct(self._value(columns['product_id'][position],
+                                                   columns['product_id_kind'][position]),
+                                       self._string(columns['product_description'][position]),
+                                       self._string(columns['product_type'][position]),
+                                       columns['product_price'][position],
+                                       self._string(columns['product_unit'][position]),
+                                       tuple(self._offer(x) for x in links))
+            cart_product = self._products.setdefault(position, cart_product)
+        return cart_product
+
+    def _offer(self, position: int):
+        offer = self._offers.get(position)
+        if offer is None:
+            columns = self._columns
+            offer_id = self._value(columns['offer_id'][position], columns['offer_id_kind'][position])
+            description = self._string(columns['offer_description'][position])
+            percent = columns['offer_percent'][position]
+            if columns['offer_percent_is_int'][position]:
+                percent = int(percent)
+            active = bool(columns['offer_active'][position])
+            start_date = self._date(columns['offer_start_date'][position])
+            end_date = self._date(columns['offer_end_date'][position])
+
+            start = columns['offer_eligible_start'][position]
+            eligible = [self._value(columns['eligible_id'][x], columns['eligible_id_kind'][x])
+                        for x in range(start, start + columns['offer_eligible_count'][position])]
+            product_id = eligible if columns['offer_eligible_is_list'][position] else eligible[0]
+
+            if columns['offer_kind'][position] == OFFER_FLAT:
+                offer = OfferFlat(offer_id, description, product_id, start_date, end_date, active, percent)
+            else:
+                start = columns['offer_condition_start'][position]
+                conditions = [ConditionRule(OPERATORS.get(columns['condition_operator'][x]),
+                                            self._value(columns['condition_product_id'][x],
+                                                        columns['condition_product_id_kind'][x]),
+                                            columns['condition_quantity'][x])
+                              for x in range(start, start + columns['offer_condition_count'][position])]
+                offer = OfferGroup(offer_id, description, product_id, start_date, end_date, active,
+                                   self._value(columns['offer_discounted_id'][position],
+                                               columns['offer_discounted_id_kind'][position]),
+                                   percent, conditions)
+            offer = self._offers.setdefault(position, offer)
+        return offer
+
+    @staticmethod
+    def write(cart_products: Iterable[CartProduct], path: str = COLUMNAR_CATALOG_CACHE) -> None:
+        """
+        Writes cart products to a columnar catalog file
+        The file is written next to the path and then renamed, so processes which have the previous file open
+        keep using it
+        :param cart_products: cart products to write
+        :param path: path of the catalog file
+        :return: None
+        """
+        columns = {name: array.array(type_code) for name, type_code in COLUMNS}
+        strings = {}
+        string_data = bytearray()
+        columns['string_offset'].append(0)
+
+        def string(value) -> int:
+            if value is None:
+                return NO_STRING
+            value = value.isoformat() if isinstance(value, datetime.datetime) else str(value)
+            reference = strings.get(value)
+            if reference is None:
+                reference = strings[value] = len(strings)
+                string_data.extend(value.encode('utf-8'))
+                columns['string_offset'].append(len(string_data))
+            return reference
+
+        def kind(value) -> int:
+            return KIND_UUID if isinstance(value, uuid.UUID) else KIND_STR
+
+        offer_positions = {}
+
+        def offer_position(offer) -> int:
+            position = offer_positions.get(offer.offer_id)
+            if position is not None:
+                return position
+            position = offer_positions[offer.offer_id] = len(offer_positions)
+
+            is_group = offer.offer_type == OfferGroup.offer_class()
+            columns['offer_kind'].append(OFFER_GROUP if is_group else OFFER_FLAT)
+            columns['offer_id'].append(string(offer.offer_id))
+            columns['offer_id_kind'].append(kind(offer.offer_id))
+            columns['offer_description'].append(string(offer.offer_description))
+            columns['offer_percent'].append(float(offer.discount_percent))
+            columns['offer_percent_is_int'].append(isinstance(offer.discount_percent, int))
+            columns['offer_active'].append(bool(offer.active))
+            columns['offer_start_date'].append(string(offer.start_date))
+            columns['offer_end_date'].append(string(offer.end_date))
+
+            product_ids = offer.product_id
+            is_list = isinstance(product_ids, (list, tuple))
+            columns['offer_eligible_start'].append(len(columns['eligible_id']))
+            columns['offer_eligible_count'].append(len(product_ids) if is_list else 1)
+            columns['offer_eligible_is_list'].append(is_list)
+            for product_id in (product_ids if is_list else [product_ids]):
+                columns['eligible_id'].append(string(product_id))
+                columns['eligible_id_kind'].append(kind(product_id))
+
+            discounted_id = offer.discounted_product_id if is_group else None
+            columns['offer_discounted_id'].append(string(discounted_id))
+            columns['offer_discounted_id_kind'].append(kind(discounted_id))
+
+            conditions = offer.conditions if is_group else []
+            columns['offer_condition_start'].append(len(columns['condition_operator']))
+            columns['offer_condition_count'].append(len(conditions))
+            for condition in conditions:
+                columns['condition_operator'].append(OPERATOR_CODES.get(condition.operator, 0))
+                columns['condition_product_id'].append(string(condition.product))
+                columns['condition_product_id_kind'].append(kind(condition.product))
+                columns['condition_quantity'].append(condition.quantity)
+            return position
+
+        cart_products = list(cart_products)
+        for cart_product in cart_products:
+            columns['product_id'].append(string(cart_product.product_id))
+            columns['product_id_kind'].append(kind(cart_product.product_id))
+            columns['product_description'].append(string(cart_product.product_description))
+            columns['product_type'].append(string(cart_product.product_type))
+            columns['product_unit'].append(string(cart_product.product_unit))
+            columns['product_price'].append(float(cart_product.price))
+            offers = cart_product.offers or ()
+            columns['product_offer_start'].append(len(columns['product_link']))
+            columns['product_offer_count'].append(len(offers))
+            for offer in offers:
+                columns['product_link'].append(offer_position(offer))
+
+        columns['string_data'] = array.array('B', string_data)
+
+        # hash tables at most half full, first product with an id or a description wins like in CatalogIndex
+        size = 1
+        while size < 2 * len(cart_products) + 1:
+            size *= 2
+        id_hash = array.array('I', bytes(4 * size))
+        description_hash = array.array('I', bytes(4 * size))
+        ids, descriptions = set(), set()
+        for position, cart_product in enumerate(cart_products):
+            ColumnarCatalog._insert(id_hash, ids, str(cart_product.product_id), (kind(cart_product.product_id),),
+                                    position)
+            ColumnarCatalog._insert(description_hash, descriptions,
+                                    CatalogIndex.normalize(cart_product.product_description), (), position)
+        columns['id_hash'] = id_hash
+        columns['description_hash'] = description_hash
+        columns['description_length'] = array.array('I', sorted({len(x[0]) for x in descriptions}))
+
+        sections = []
+        offset = HEADER.size
+        for name, _ in COLUMNS:
+            offset += -offset % 8
+            length = len(columns[name]) * columns[name].itemsize
+            sections.extend([offset, length])
+            offset += length
+
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'wb') as out_file:
+            out_file.write(HEADER.pack(MAGIC, BYTE_ORDER_MARK, FORMAT_VERSION, *sections))
+            for (name, _), offset in zip(COLUMNS, sections[0::2]):
+                out_file.write(bytes(offset - out_file.tell()))
+                out_file.write(columns[name].tobytes())
+        os.replace(temporary_path, path)
+
+    @staticmethod
+    def _insert(table, inserted: set, key: str, kind: tuple, position: int) -> None:
+        if (key,) + kind in inserted:
+            return
+        inserted.add((key,) + kind)
+        mask = len(table) - 1
+        slot = ColumnarCatalog._hash(key) & mask
+        while table[slot] != 0:
+            slot = (slot + 1) & mask
+        table[slot] = position + 1
+
+    @staticmethod
+    def convert_pickle(pickle_path: str = CART_PRODUCTS_CACHE, path: str = None) -> str:
+        """
+        Converts the cart products cache written by CartProduct.prepare_cart_products to a columnar catalog file
+        :param pickle_path: path of the cart products cache
+        :param path: path of the catalog file, defaults to the cache path with the .pbcat extension
+        :return: path of the catalog file
+        """
+        if path is None:
+            path = os.path.splitext(pickle_path)[0] + COLUMNAR_CATALOG_EXTENSION
+        with open(pickle_path, 'rb') as in_file:
+            cart_products = pickle.load(in_file)
+        ColumnarCatalog.write(cart_products, path)
+        return path
+
+
+if __name__ == '__main__':
+    print(ColumnarCatalog.convert_pickle(*sys.argv[1:3]))
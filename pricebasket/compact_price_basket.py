@@ -0,0 +1,55 @@
+import datetime
+from typing import List
+
+from basket.basket_state import BasketState
+from pricebasket.cart_product import CartProduct
+from pricebasket.currency_utility_methods import CurrencyUtilityMethods
+from pricebasket.pence_price_basket import PencePriceBasket
+from pricebasket.pricing_result import PricingResult
+
+
+class CompactPriceBasket(PencePriceBasket):
+    """
+    This class prices baskets like PencePriceBasket and gives the result as a PricingResult
+
+    Discounts are billed as plain tuples holding the offer id and the discount in pence instead of a discount
+    object with a display string, and subtotal and total stay in pence, so price_basket_result formats nothing.
+    price_basket (and so price_baskets) returns the strings returned by PriceBasket.price_basket, so this class
+    can be used wherever a PriceBasket is
+    """
+
+    __slots__ = []
+
+    @staticmethod
+    def bill_calculation_with_offer(purchased_quantity, cart_product: CartProduct, offer) -> tuple[int, int, tuple]:
+        """
+        This method calculates bills in pence if any offer is applied on the product
+        :param purchased_quantity: amount in which product is purchased
+        :param cart_product: product which has been purchased and bill is calculated for
+        :param offer: what is the offer on this item
+        :return: a tuples containing regular price, final price and the discount as a PricingResult discount
+        """
+        regular_price = purchased_quantity * CurrencyUtilityMethods.to_pence(cart_product.price)
+        discount_offered = CurrencyUtilityMethods.percentage_in_pence(offer.discount_percent, regular_price)
+
+        return regular_price, regular_price - discount_offered, (cart_product.product_description, offer.offer_id,
+                                                                  offer.discount_percent, discount_offered)
+
+    def price_basket_result(self, basket: List[BasketState], priced_at: datetime.datetime = None) -> PricingResult:
+        """
+        This method prices the basket, see PriceBasket.price_basket
+        :param basket: list of products in BasketState containing quantity of each product purchased
+        :param priced_at: time the basket is priced at
+        :return: PricingResult
+        """
+        sub_total, total, discounts = super().price_basket(basket, priced_at)
+        return PricingResult(sub_total, total, discounts)
+
+    def price_basket(self, basket: List[BasketState], priced_at: datetime.datetime = None) -> tuple[str, str, list]:
+        """
+        This method prices the basket and returns the result as PriceBasket.price_basket does
+        :param basket: list of products in BasketState containing quantity of each product purchased
+        :param priced_at: time the basket is priced at
+        :return: subtotal, total and the list of discounted items
+        """
+        return self.price_basket_result(basket, priced_at).to_tuple()
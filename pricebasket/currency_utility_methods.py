@@ -1,3 +1,6 @@
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+
 from logs.logging import CustomLogging
 
 
@@ -39,4 +42,41 @@ class CurrencyUtilityMethods:
             return "{:.2f}".format(value)
         except Exception as e:
             CustomLogging.log_error(e)
-            return ""
\ No newline at end of file
+            return ""
+
+    # Integer pence methods
+    # Amounts are held as whole pence, rounding happens only in these two places and always rounds half up:
+    #   to_pence - price in pounds is rounded to whole pence once when it enters the calculation
+    #   percentage_in_pence - discount on a line is rounded to whole pence
+    # Everything else (multiplying by quantity, adding up totals) is exact integer arithmetic
+
+    @staticmethod
+    @lru_cache(maxsize=65536)
+    def to_pence(amount_in_pounds: float) -> int:
+        # going through str gives the decimal value the price was written with, e.g. 0.29 and not 0.28999...
+        return int((Decimal(str(amount_in_pounds)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+    @staticmethod
+    def percentage_in_pence(percent, whole_in_pence: int) -> int:
+        try:
+            if isinstance(percent, int):
+                # round half up in integer arithmetic, floor division keeps it correct for negative amounts
+                return (2 * percent * whole_in_pence + 100) // 200
+            return int((Decimal(str(percent)) * whole_in_pence / 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+        except Exception as e:
+            CustomLogging.log_error(e)
+            return 0
+
+    @staticmethod
+    def format_pence(pence: int) -> str:
+        # same output as get_two_decimal_formatted_string for the amount in pounds
+        sign = "-" if pence < 0 else ""
+        pounds, pence = divmod(abs(pence), 100)
+        return f"{sign}{pounds}.{pence:02d}"
+
+    @staticmethod
+    def get_currency_with_unit_from_pence(pence: int) -> str:
+        if pence < 100:
+            return f"{pence}p"
+        return "£" + CurrencyUtilityMethods.format_pence(pence)
+
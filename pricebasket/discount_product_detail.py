@@ -1,3 +1,5 @@
+from pricebasket.currency_utility_methods import CurrencyUtilityMethods
+
 
 class DiscountProductDetail:
     """
@@ -45,3 +47,32 @@ class DiscountProductDetail:
 
     def __repr__(self):
         return f"{self.description.capitalize()} {self._discount_percentage} % off: -{self._discount_in_currency}"
+
+
+class PenceDiscountProductDetail(DiscountProductDetail):
+    """
+        This class represents discounted product details where the discount is held in integer pence
+
+        Discount is formatted to a currency string only when it is displayed, so pricing does not spend
+        time formatting strings which might never be shown
+    """
+
+    __slots__ = ['_discount_in_pence']
+
+    def __init__(self,
+                 description: str,
+                 discount_percentage=None,
+                 discount_in_pence: int = 0):
+        super().__init__(description, discount_percentage)
+        self._discount_in_pence = discount_in_pence
+
+    @property
+    def discount_in_pence(self):
+        return self._discount_in_pence
+
+    @property
+    def discount_in_currency(self):
+        return CurrencyUtilityMethods.get_currency_with_unit_from_pence(self._discount_in_pence)
+
+    def __repr__(self):
+        return f"{self.description.capitalize()} {self._discount_percentage} % off: -{self.discount_in_currency}"
@@ -0,0 +1,148 @@
+import datetime
+from bisect import bisect_left
+from typing import Iterable, Optional
+
+# offers without a start or an end date are valid from the beginning or until the end of time
+EARLIEST = datetime.datetime.min
+LATEST = datetime.datetime.max
+
+
+class _IntervalNode:
+    """
+    Node of a centered interval tree: intervals containing the center, intervals entirely before it (left)
+    and entirely after it (right)
+    """
+
+    __slots__ = ['center', 'by_start', 'by_end', 'left', 'right']
+
+    def __init__(self, center, by_start: tuple, by_end: tuple, left, right):
+        self.center = center
+        self.by_start = by_start
+        self.by_end = by_end
+        self.left = left
+        self.right = right
+
+
+class OfferIntervalIndex:
+    """
+    This class represents an interval index over the validity windows (start date to end date, both included)
+    of offers, so that offers valid at a pricing timestamp are found without checking every offer
+
+    Offers are held in a centered interval tree, finding the k offers valid at a timestamp costs O(log n + k).
+    Offers valid at a timestamp only change at the start and end dates, so the ids found are kept for the window
+    between two consecutive dates and the next lookups in the same window only cost a binary search.
+    This is what lets offers be loaded ahead of time: an offer starting next week is in the catalog and becomes
+    valid when pricing timestamps reach its start date, without the catalog being rebuilt.
+
+    Active flag of an offer is not part of the index, it is checked when the offer is used (see get_offers_at of
+    CatalogIndex) so deactivating an offer takes effect at once, results cached by PriceBasket at a timestamp
+    are keyed by Offer.activation_version so they are not reused after an offer is activated or deactivated
+        ...
+    Attributes
+    ----------
+    _root : _IntervalNode
+        root of the interval tree
+    _offers : dict
+        offer id to offer
+    _boundaries : list
+        sorted distinct start and end dates
+    _valid : dict
+        window (see window) to ids of the offers valid in it
+    _max_windows : int
+        number of windows whose offers are kept
+    """
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_root', '_offers', '_boundaries', '_valid', '_max_windows']
+
+    def __init__(self, offers: Iterable = (), max_windows: int = 256):
+        self._offers = {}
+        intervals = []
+        for offer in offers:
+            if offer.offer_id not in self._offers:
+                self._offers[offer.offer_id] = offer
+                intervals.append((offer.start_date or EARLIEST, offer.end_date or LATEST, offer.offer_id))
+
+        self._boundaries = sorted({x[0] for x in intervals} | {x[1] for x in intervals})
+        self._root = OfferIntervalIndex._build(intervals)
+        self._valid = {}
+        self._max_windows = max_windows
+
+    def __len__(self):
+        return len(self._offers)
+
+    def __repr__(self):
+        return f"OfferIntervalIndex: offers = {len(self._offers)}, windows = {len(self._valid)}"
+
+    @staticmethod
+    def _build(intervals: list) -> Optional[_IntervalNode]:
+        if not intervals:
+            return None
+        points = sorted(x[y] for x in intervals for y in (0, 1))
+        center = points[len(points) // 2]
+
+        containing = [x for x in intervals if x[0] <= center <= x[1]]
+        return _IntervalNode(center,
+                             tuple(sorted(containing, key=lambda x: x[0])),
+                             tuple(sorted(containing, key=lambda x: x[1], reverse=True)),
+                             OfferIntervalIndex._build([x for x in intervals if x[1] < center]),
+                             OfferIntervalIndex._build([x for x in intervals if x[0] > center]))
+
+    def window(self, timestamp: datetime.datetime) -> tuple:
+        """
+        Returns the window of the timestamp, offers valid are the same for all timestamps in the same window.
+        Windows are the start and end dates themselves and the time between two consecutive dates
+        :param timestamp: pricing timestamp
+        :return: window
+        """
+        position = bisect_left(self._boundaries, timestamp)
+        return position, position < len(self._boundaries) and self._boundaries[position] == timestamp
+
+    def find(self, timestamp: datetime.datetime) -> list:
+        """
+        Searches the tree for the ids of the offers whose validity window contains timestamp, O(log n + k)
+        :param timestamp: pricing timestamp
+        :return: list of offer ids
+        """
+        found = []
+        node = self._root
+        while node is not None:
+            if timestamp < node.center:
+                for start, end, offer_id in node.by_start:
+                    if start > timestamp:
+                        break
+                    found.append(offer_id)
+                node = node.left
+            elif timestamp > node.center:
+                for start, end, offer_id in node.by_end:
+                    if end < timestamp:
+                        break
+                    found.append(offer_id)
+                node = node.right
+            else:
+                found.extend(x[2] for x in node.by_start)
+                break
+        return found
+
+    def valid_at(self, timestamp: datetime.datetime) -> frozenset:
+        """
+        Returns ids of the offers whose validity window contains timestamp, whether they are active or not
+        :param timestamp: pricing timestamp
+        :return: set of offer ids
+        """
+        window = self.window(timestamp)
+        valid = self._valid.get(window)
+        if valid is None:
+            valid = frozenset(self.find(timestamp))
+            if len(self._valid) >= self._max_windows:
+                self._valid.clear()
+            self._valid[window] = valid
+        return valid
+
+    def offers_at(self, timestamp: datetime.datetime) -> list:
+        """
+        Returns the active offers valid at timestamp
+        :param timestamp: pricing timestamp
+        :return: list of offers
+        """
+        return [self._offers[x] for x in self.find(timestamp) if self._offers[x].active]
@@ -0,0 +1,272 @@
+from typing import Callable, Dict, List, Optional, Union
+
+
+class OfferOption:
+    """
+    This class represents one way an offer can be applied to the lines (SKUs) of a basket
+        ...
+    Attributes
+    ----------
+    _offer : Offer
+        offer applied
+    _target : int
+        position of the line whose product is discounted
+    _carrier : int
+        position of the line carrying the offer which is consumed by it (OfferGroup on a different product),
+        None when the offer discounts the product carrying it
+    _value : float or int
+        discount of the target line, amount taken off the total of the basket
+    _billing : tuple
+        regular price, discounted price and discounted item of the target line as billed with the offer
+    """
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_offer', '_target', '_carrier', '_value', '_billing']
+
+    def __init__(self, offer, target: int, carrier: Optional[int], value, billing: tuple):
+        self._offer = offer
+        self._target = target
+        self._carrier = carrier
+        self._value = value
+        self._billing = billing
+
+    @property
+    def offer(self):
+        return self._offer
+
+    @property
+    def target(self):
+        return self._target
+
+    @property
+    def carrier(self):
+        return self._carrier
+
+    @property
+    def value(self):
+        return self._value
+
+    @property
+    def billing(self):
+        return self._billing
+
+    def lines(self) -> tuple:
+        if self._carrier is None or self._carrier == self._target:
+            return (self._target,)
+        return tuple(sorted((self._target, self._carrier)))
+
+    def __repr__(self):
+        return f"OfferOption: _offer {self._offer.offer_id}," \
+               f"_target {self._target}," \
+               f"_carrier {self._carrier}," \
+               f"_value {self._value}"
+
+
+class OfferResolver:
+    """
+    This class chooses which offers are applied to a basket when several offers compete for the same lines
+
+    Each line of the basket takes part in at most one applied offer, so a product is never discounted twice and
+    a product consumed by an OfferGroup is not discounted as well.
+
+    policy can be
+        max_discount - offers giving the largest total discount to the customer
+        first - offers in the order of the lines and of their offers, skipping those whose lines are taken
+        a callable scoring an OfferOption - offers with the largest total score, e.g. to prefer offers funded by
+                                            suppliers
+
+    Offers apply to one line (discounting the product carrying them) or to two lines (OfferGroup consuming the
+    product carrying it and discounting another one), so choosing them is a matching problem:
+        - lines are split into groups which share no offer, each group is solved on its own
+        - of the options on the same lines only the best one can be chosen
+        - every line takes its best single line option unless a pair of lines gives more than their single line
+          options together, what is left is the matching of pairs with the largest gain which is searched by
+          branch and bound, memoizing the gain each set of free lines has been reached with
+    Search of a group stops after node_budget nodes with the best matching found so far, which is never worse than
+    taking the pairs greedily by gain, so pricing time stays bounded on baskets with many competing offers
+        ...
+    Attributes
+    ----------
+    _policy : str or callable
+        how offers are chosen
+    _node_budget : int
+        maximum number of nodes searched for each group of lines
+    """
+
+    MAX_DISCOUNT = "max_discount"
+    FIRST = "first"
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_policy', '_node_budget']
+
+    def __init__(self, policy: Union[str, Callable[[OfferOption], float]] = MAX_DISCOUNT, node_budget: int = 2000):
+        if not callable(policy) and policy not in (OfferResolver.MAX_DISCOUNT, OfferResolver.FIRST):
+            raise ValueError(f"policy must be max_discount, first or a callable, got {policy}")
+        self._policy = policy
+        self._node_budget = node_budget
+
+    @property
+    def policy(self):
+        return self._policy
+
+    @property
+    def node_budget(self):
+        return self._node_budget
+
+    def resolve(self, options: List[OfferOption], line_count: int) -> List[OfferOption]:
+        """
+        Chooses the offers applied to a basket
+        :param options: options of the offers in the order of their carrier lines and of the offers of each line
+        :param line_count: number of lines in the basket
+        :return: chosen options, in the order they were given
+        """
+        if self._policy == OfferResolver.FIRST:
+            return OfferResolver._first(options)
+
+        score = self._policy if callable(self._policy) else OfferResolver._discount
+        chosen = set()
+        for group in OfferResolver._independent_groups(options, line_count):
+            chosen.update(id(x) for x in OfferResolver._maximize(group, score, self._node_budget))
+        return [x for x in options if id(x) in chosen]
+
+    @staticmethod
+    def _discount(option: OfferOption):
+        return option.value
+
+    @staticmethod
+    def _first(options: List[OfferOption]) -> List[OfferOption]:
+        taken = set()
+        chosen = []
+        for option in options:
+            lines = option.lines()
+            if not taken.intersection(lines):
+                taken.update(lines)
+                chosen.append(option)
+        return chosen
+
+    @staticmethod
+    def _independent_groups(options: List[OfferOption], line_count: int) -> list:
+        # lines linked by an option are in the same group (union find)
+        parent = list(range(line_count))
+
+        def find(line):
+            while parent[line] != line:
+                parent[line] = parent[parent[line]]
+                line = parent[line]
+            return line
+
+        for option in options:
+            lines = option.lines()
+            for line in lines[1:]:
+                parent[find(line)] = find(lines[0])
+
+        groups: Dict[int, list] = {}
+        for option in options:
+            groups.setdefault(find(option.lines()[0]), []).append(option)
+        return list(groups.values())
+
+    @staticmethod
+    def _maximize(options: List[OfferOption], score: Callable, node_budget: int) -> List[OfferOption]:
+        # only the best option of each line and of each pair of lines can be chosen, earliest one on ties
+        singles = {}
+        pairs = {}
+        for option in options:
+            value = score(option)
+            if value <= 0:
+                continue
+            lines = option.lines()
+            best = singles if len(lines) == 1 else pairs
+            key = lines[0] if len(lines) == 1 else lines
+            if key not in best or value > best[key][1]:
+                best[key] = (option, value)
+
+        # every line gets its best single option unless a pair of lines gives more than their singles together,
+        # so what is left to choose is a matching of the pairs with a positive gain
+        edges = {}
+        for (first, second), (option, value) in pairs.items():
+            gain = value - singles.get(first, (None, 0))[1] - singles.get(second, (None, 0))[1]
+            if gain > 0:
+                edges.setdefault(first, []).append((gain, second, option))
+                edges.setdefault(second, []).append((gain, first, option))
+        for neighbours in edges.values():
+            neighbours.sort(key=lambda x: -x[0])
+
+        matching = OfferResolver._match(edges, node_budget)
+        matched = {x for option in matching for x in option.lines()}
+        return matching + [option for line, (option, value) in singles.items() if line not in matched]
+
+    @staticmethod
+    def _match(edges: dict, node_budget: int) -> list:
+        """
+        Branch and bound search of the matching with the largest gain: the first line not yet decided is matched
+        with each of its free neighbours, best gain first, or left unmatched. A branch is cut when the gain so far
+        plus half of the best gain of each free line can't beat the best matching found, which starts as the greedy
+        matching. Search stops after node_budget nodes keeping the best matching found
+        :param edges: line to (gain, other line, option) of its pairs, best gain first
+        :param node_budget: maximum number of nodes searched
+        :return: options of the matching
+        """
+        lines = sorted(edges)
+
+        # greedy matching, best gain first
+        best_options = []
+        best_gain = 0
+        taken = set()
+        for gain, first, second, option in sorted(((g, x, y, o) for x in lines for g, y, o in edges[x] if x < y),
+                                                  key=lambda x: -x[0]):
+            if first not in taken and second not in taken:
+                taken.update((first, second))
+                best_options.append(option)
+                best_gain += gain
+
+        free = set(lines)
+        chosen = []
+        nodes = 0
+        # free lines to the largest gain they have been reached with, reaching them again with less can't do better
+        reached = {}
+
+        def bound() -> float:
+            total = 0
+            for line in free:
+                for gain, other, option in edges[line]:
+                    if other in free:
+                        total += gain
+                        break
+            return total / 2
+
+        def search(position: int, gain_so_far) -> None:
+            nonlocal best_gain, best_options, nodes
+            nodes += 1
+            if nodes > node_budget:
+                return
+            while position < len(lines) and lines[position] not in free:
+                position += 1
+            if position == len(lines):
+                if gain_so_far > best_gain:
+                    best_gain = gain_so_far
+                    best_options = list(chosen)
+                return
+            if gain_so_far + bound() <= best_gain:
+                return
+            key = frozenset(free)
+            if reached.get(key, -1) >= gain_so_far:
+                return
+            reached[key] = gain_so_far
+
+            line = lines[position]
+            free.discard(line)
+            for gain, other, option in edges[line]:
+                if other in free:
+                    free.discard(other)
+                    chosen.append(option)
+                    search(position + 1, gain_so_far + gain)
+                    chosen.pop()
+                    free.add(other)
+            search(position + 1, gain_so_far)
+            free.add(line)
+
+        search(0, 0)
+        return best_options
+
+    def __repr__(self):
+        return f"OfferResolver: _policy {self._policy}"
@@ -0,0 +1,174 @@
+import datetime
+from typing import Callable, List, Union
+
+from basket.basket_state import BasketState
+from instrumentation.metrics_registry import MetricsRegistry
+from logs.logging import CustomLogging
+from mock_services.offer import OfferFlat, OfferGroup
+from pricebasket.basket_result_cache import BasketResultCache
+from pricebasket.catalog_snapshot import CatalogSnapshot
+from pricebasket.offer_resolver import OfferOption, OfferResolver
+from pricebasket.two_phase_price_basket import TwoPhasePriceBasket
+
+
+class OptimalOfferPriceBasket(TwoPhasePriceBasket):
+    """
+    This class prices baskets choosing which offers apply when several offers compete for the same products
+
+    PriceBasket applies the offers of a product in the order they are listed, so a product can be discounted by
+    several offers or miss a better one. Here every offer which could apply to the basket becomes an OfferOption
+    and OfferResolver chooses among them with a policy (largest discount for the customer by default), each
+    product taking part in at most one applied offer.
+
+    Offers apply to all the units of a product as in PriceBasket, conditions are checked on the quantity purchased.
+    A product carrying an OfferGroup on a different product is consumed by the offer when it applies: it is billed
+    at the regular price and takes part in no other offer, the discount is taken off the discounted product.
+    Unlike PriceBasket and TwoPhasePriceBasket, which do not bill the consumed product, baskets where such an
+    offer applies are billed for every product (e.g. soup soup bread is 2.10, 1.70 and not 0.80, 0.40).
+    Value of an option is the discount it gives, so the policy compares offers by how much they take off the
+    total. A product none of whose offers is chosen is billed with the first offer on its category
+        ...
+    Attributes
+    ----------
+    _offer_resolver : OfferResolver
+        chooses the offers applied
+    """
+
+    __slots__ = ['_offer_resolver']
+
+    def __init__(self,
+                 snapshot: CatalogSnapshot = None,
+                 result_cache: BasketResultCache = None,
+                 policy: Union[str, Callable[[OfferOption], float]] = OfferResolver.MAX_DISCOUNT,
+                 region: str = None):
+        super().__init__(snapshot, result_cache, region)
+        self._offer_resolver = OfferResolver(policy)
+
+    @classmethod
+    def from_cart_products(cls, cart_products) -> 'OptimalOfferPriceBasket':
+        price_basket = super().from_cart_products(cart_products)
+        price_basket._offer_resolver = OfferResolver()
+        return price_basket
+
+    @classmethod
+    def from_catalog_index(cls, catalog_index) -> 'OptimalOfferPriceBasket':
+        price_basket = super().from_catalog_index(catalog_index)
+        price_basket._offer_resolver = OfferResolver()
+        return price_basket
+
+    @property
+    def offer_resolver(self):
+        return self._offer_resolver
+
+    @offer_resolver.setter
+    def offer_resolver(self, offer_resolver):
+        self._offer_resolver = offer_resolver
+
+    def _results_depend_on_order(self) -> bool:
+        # competing offers are chosen in the order of the lines, by the first policy or when they give the same
+        # score, see PriceBasket
+        return True
+
+    def _worker_settings(self) -> dict:
+        return {'_offer_resolver': self._offer_resolver}
+
+    def get_offer_options(self, lines: list, purchased: dict,
+                          priced_at: datetime.datetime = None) -> tuple[List[OfferOption], int, int]:
+        """
+        Returns every way the offers of the purchased products can apply to the basket
+        :param lines: lines of the basket as (BasketState, cart product)
+        :param purchased: product id to the position of its first line
+        :param priced_at: time the basket is priced at, see PriceBasket.price_basket
+        :return: options in the order of the lines and of their offers, number of offers and of rules evaluated
+        """
+        catalog_index = self._catalog_index
+        flat_offer_class = OfferFlat.offer_class()
+        group_offer_class = OfferGroup.offer_class()
+
+        options = []
+        offers_evaluated = 0
+        rules_evaluated = 0
+        for position, (line, cart_product) in enumerate(lines):
+            for offer in catalog_index.get_offers_at(cart_product, priced_at):
+                offers_evaluated += 1
+                try:
+                    target = None
+                    carrier = None
+                    if offer.offer_type == flat_offer_class or offer.product_id == offer.discounted_product_id:
+                        target = position
+                    elif offer.offer_type == group_offer_class:
+                        discounted_position = purchased.get(offer.discounted_product_id)
+                        if discounted_position is not None:
+                            rules_evaluated += 1
+                            if catalog_index.get_compiled_rule(offer).satisfied(line):
+                                target = discounted_position
+                                carrier = None if discounted_position == position else position
+
+                    if target is not None:
+                        target_line, target_product = lines[target]
+                        billing = self.bill_calculation_with_offer(target_line.purchased_quantity, target_product,
+                                                                   offer)
+                        options.append(OfferOption(offer, target, carrier, billing[0] - billing[1], billing))
+                except Exception as e:
+                    CustomLogging.log_error(e)
+        return options, offers_evaluated, rules_evaluated
+
+    def _price_basket(self, basket: List[BasketState], metrics: MetricsRegistry = None,
+                      priced_at: datetime.datetime = None) -> tuple:
+        lines, purchased, lookups = self._get_lines(basket)
+        options, offers_evaluated, rules_evaluated = self.get_offer_options(lines, purchased, priced_at)
+
+        # line position to the option discounting it and to the option consuming it
+        discounted_by = {}
+        consumed_by = {}
+        for option in self._offer_resolver.resolve(options, len(lines)):
+            discounted_by[option.target] = option
+            if option.carrier is not None:
+                consumed_by[option.carrier] = option
+
+        total = 0
+        sub_total = 0
+        discounted_items = []
+        exceptions = 0
+        for position, (line, cart_product) in enumerate(lines):
+            try:
+                consuming = consumed_by.get(position)
+                if consuming is not None:
+                    # discount is listed where the offer is, as in PriceBasket, the product carrying the offer
+                    # is billed at the regular price
+                    discounted_items.append(consuming.billing[2])
+                    regular_bill = self.bill_calculation_without_offer(cart_product.price, line.purchased_quantity)
+                    sub_total = sub_total + regular_bill
+                    total = total + regular_bill
+                    continue
+
+                option = discounted_by.get(position)
+                if option is None:
+                    # no offer of the product has been chosen, offers on its category apply
+                    regular_price, discounted_price, discounted_item = self._bill_without_own_offer(
+                        line, cart_product, priced_at)
+                    if discounted_item is not None:
+                        discounted_items.append(discounted_item)
+                    sub_total = sub_total + regular_price
+                    total = total + discounted_price
+                    continue
+
+                regular_price, discounted_price, discounted_item = option.billing
+                if option.carrier is None:
+                    discounted_items.append(discounted_item)
+                sub_total = sub_total + regular_price
+                total = total + discounted_price
+            except Exception as e:
+                exceptions += 1
+                CustomLogging.log_error(e)
+
+        if metrics is not None:
+            metrics.counter("pricebasket_catalog_lookups_total", "Products looked up in the catalog").inc(lookups)
+            metrics.counter("pricebasket_offers_evaluated_total", "Offers of purchased products evaluated").inc(
+                offers_evaluated)
+            metrics.counter("pricebasket_rules_evaluated_total", "Offer conditions evaluated").inc(rules_evaluated)
+            if exceptions:
+                metrics.counter("pricebasket_exceptions_total", "Exceptions caught while pricing baskets").inc(
+                    exceptions)
+
+        return self.format_amount(sub_total), self.format_amount(total), discounted_items
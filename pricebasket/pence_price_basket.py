@@ -0,0 +1,54 @@
+from pricebasket.cart_product import CartProduct
+from pricebasket.currency_utility_methods import CurrencyUtilityMethods
+from pricebasket.discount_product_detail import PenceDiscountProductDetail
+from pricebasket.price_basket import PriceBasket
+
+
+class PencePriceBasket(PriceBasket):
+    """
+    This class prices baskets in integer pence instead of floating point pounds
+
+    Pricing rules are the same as PriceBasket, only the arithmetic differs:
+    prices are converted to whole pence (rounded half up) when they are billed, discounts are calculated per
+    line and rounded half up to whole pence and subtotal and total are exact sums of whole pence, so no
+    floating point error can creep into the bill
+
+    price_basket returns subtotal and total as int pence and discounted items as PenceDiscountProductDetail,
+    nothing is formatted to strings until the result is displayed
+    (PriceBasketResultDisplay.from_pence)
+    """
+
+    __slots__ = []
+
+    @staticmethod
+    def format_amount(amount: int) -> int:
+        # amounts stay in pence, they are formatted only at the display boundary
+        return amount
+
+    @staticmethod
+    def bill_calculation_with_offer(purchased_quantity, cart_product: CartProduct, offer) -> tuple[
+                                                                    int, int, PenceDiscountProductDetail]:
+        """
+        This method calculates bills in pence if any offer is applied on the product
+        :param purchased_quantity: amount in which product is purchased
+        :param cart_product: product which has been purchased and bill is calculated for
+        :param offer: what is the offer on this item
+        :return: a tuples containing regular price, final price and discounted item, prices are in pence
+        """
+        regular_price = purchased_quantity * CurrencyUtilityMethods.to_pence(cart_product.price)
+        discount_offered = CurrencyUtilityMethods.percentage_in_pence(offer.discount_percent, regular_price)
+
+        discounted_item = PenceDiscountProductDetail(cart_product.product_description, offer.discount_percent,
+                                                     discount_offered)
+
+        return regular_price, regular_price - discount_offered, discounted_item
+
+    @staticmethod
+    def bill_calculation_without_offer(price: float, quantity: int) -> int:
+        """
+        This method calculates bill in pence using regular price as no offer is applied
+        :param price: price of the product in pounds
+        :param quantity: amount of product purchased
+        :return: returns the bill of the purchased product in pence
+        """
+        return CurrencyUtilityMethods.to_pence(price) * quantity
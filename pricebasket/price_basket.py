@@ -1,13 +1,22 @@
-import pickle
-from typing import Optional, List
+import copy
+import datetime
+import os
+import time
+from collections import deque
+from itertools import islice
+from typing import Iterable, Iterator, Optional, List
 
 from basket.basket_state import BasketState, BilledState
+from instrumentation.metrics_registry import MetricsRegistry
 from logs.logging import CustomLogging
-from mock_services.offer import OfferFlat, OfferGroup
+from mock_services.offer import Offer, OfferFlat, OfferGroup
+from pricebasket.basket_result_cache import BasketResultCache
 from pricebasket.cart_product import CartProduct
+from pricebasket.catalog_index import CatalogIndex
+from pricebasket.catalog_snapshot import CatalogSnapshot
 from pricebasket.currency_utility_methods import CurrencyUtilityMethods
 from pricebasket.discount_product_detail import DiscountProductDetail
-from rule_engine.rule_inference_engine import RuleInferenceEngine
+from pricebasket.regional_catalog import RegionalCatalog
 
 
 class PriceBasket:
@@ -19,17 +28,23 @@ class PriceBasket:
     It does not print the result of basket pricing as it is a separate functionality and is dedicated to
     PriceBasketResultDisplay class
 
+    Results of priced baskets are reused if a BasketResultCache is given, only when cart products come from
+    a snapshot as results are cached by the version of the catalog
+
+    With a region baskets are priced with the prices and offers of the region, see RegionalCatalog
+
     """
     # slots are used for faster attribute access and space saving in memory resources
-    __slots__ = ['_cart_products']
+    __slots__ = ['_cart_products', '_catalog_index', '_version', '_result_cache']
 
-    def __init__(self):
-        # using tuples because it consumes less memory and we don't need to update it either
-        cart_prods = PriceBasket.get_cart_products()
-        if cart_prods is not None:
-            self._cart_products = tuple(cart_prods)
-        else:
-            self._cart_products = tuple([])
+    def __init__(self, snapshot: CatalogSnapshot = None, result_cache: BasketResultCache = None,
+                 region: str = None):
+        # cart products and their index are loaded once per process and shared by all PriceBasket instances,
+        # the snapshot reloads them only if the cache file has changed
+        if snapshot is None:
+            snapshot = CatalogSnapshot.shared()
+        self._cart_products, self._catalog_index, self._version = snapshot.get_versioned(region)
+        self._result_cache = result_cache
 
     @property
     def cart_products(self):
@@ -38,8 +53,56 @@ class PriceBasket:
     @cart_products.setter
     def cart_products(self, cart_products):
         self._cart_products = cart_products
+        self._catalog_index = CatalogIndex(cart_products)
+        # cart products are no longer a version of the catalog, results can't be cached
+        self._version = None
+        self._result_cache = None
+
+    @property
+    def catalog_index(self):
+        return self._catalog_index
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def region(self):
+        return self._catalog_index.region if isinstance(self._catalog_index, RegionalCatalog) else None
 
-    def price_basket(self, basket: List[BasketState]) -> tuple[str, str, list]:
+    @property
+    def result_cache(self):
+        return self._result_cache
+
+    @classmethod
+    def from_cart_products(cls, cart_products) -> 'PriceBasket':
+        """
+        Creates a PriceBasket over the given cart products instead of the cart products cache
+        :param cart_products: cart products used to price the baskets
+        :return: PriceBasket
+        """
+        price_basket = cls.__new__(cls)
+        price_basket.cart_products = tuple(cart_products)
+        return price_basket
+
+    @classmethod
+    def from_catalog_index(cls, catalog_index) -> 'PriceBasket':
+        """
+        Creates a PriceBasket over an already built catalog index (CatalogIndex or ColumnarCatalog)
+        :param catalog_index: index over the cart products used to price the baskets
+        :return: PriceBasket
+        """
+        price_basket = cls.__new__(cls)
+        # ColumnarCatalog is a sequence of cart products itself
+        price_basket._cart_products = catalog_index.products if isinstance(catalog_index, CatalogIndex) \
+            else catalog_index
+        price_basket._catalog_index = catalog_index
+        price_basket._version = None
+        price_basket._result_cache = None
+        return price_basket
+
+    def price_basket(self, basket: List[BasketState],
+                     priced_at: datetime.datetime = None) -> tuple[str, str, list]:
         """
         This method prices the basket
 
@@ -47,33 +110,107 @@ class PriceBasket:
         calculate discounted bill Or of conditions are not satisfied then price the products regularly
 
         This method is thread safe and if there are thousands of baskets to be priced, this method can be called in
-        parallel for pricing multiple baskets at the same time.
+        parallel for pricing multiple baskets at the same time, price_baskets does it on a thread or process pool.
+
+        It uses cart products loaded from cache once per process to price the basket which increases the speed
+
+        If metrics are enabled (MetricsRegistry) latency of the basket, catalog lookups, offers and rules evaluated,
+        result cache hits and exceptions caught are recorded
 
-        It loads cart products from cache and use them to price the basket which increases the speed
+        With priced_at only the offers which are active and valid at that time are applied (see
+        CatalogIndex.get_offers_at), e.g. to price a basket at the time it was bought. Without it every offer of the
+        cart products is applied, as the offers service is expected to return only the offers valid now
 
         :param basket: list of products in BasketState containing quantity of each product purchased
+        :param priced_at: time the basket is priced at
         :return: It returns total bill, Subtotal bill and the list of discounted items
         """
+        metrics = MetricsRegistry.active()
+        if metrics is None:
+            return self._price_basket_cached(basket, None, priced_at)
+
+        started = time.perf_counter()
+        result = self._price_basket_cached(basket, metrics, priced_at)
+        metrics.histogram("pricebasket_basket_seconds", "Time taken to price a basket").observe(
+            time.perf_counter() - started)
+        metrics.counter("pricebasket_baskets_total", "Baskets priced").inc()
+        return result
+
+    def _price_basket_cached(self, basket: List[BasketState], metrics: Optional[MetricsRegistry],
+                             priced_at: Optional[datetime.datetime] = None) -> tuple:
+        if self._result_cache is None or self._version is None:
+            return self._price_basket(basket, metrics, priced_at)
+
+        pricing = type(self)
+        if isinstance(self._catalog_index, RegionalCatalog):
+            # regions share the version of the base catalog, their overlays have their own
+            pricing = (pricing, self._catalog_index.region, self._catalog_index.version)
+        if priced_at is not None:
+            # offers valid are the same for every time in a window of the offer validity dates, as long as no offer
+            # is activated or deactivated
+            pricing = (pricing, self._catalog_index.get_offer_intervals().window(priced_at),
+                       Offer.activation_version())
+        key = BasketResultCache.key(basket, self._version, pricing, self._results_depend_on_order())
+        cached = self._result_cache.get(key)
+        if metrics is not None:
+            if cached is not None:
+                metrics.counter("pricebasket_result_cache_hits_total", "Baskets found in the result cache").inc()
+            else:
+                metrics.counter("pricebasket_result_cache_misses_total", "Baskets not found in the result cache").inc()
+        if cached is not None:
+            sub_total, total, discounted_items, billed = cached
+            # products are marked billed as if the basket had been priced
+            for item in basket:
+                if item.billing_state == BilledState.Unprocessed and item.product_description in billed:
+                    item.change_billing_state()
+            # discounted items can be changed by the caller, each caller gets its own
+            return sub_total, total, [copy.copy(x) for x in discounted_items]
+
+        unprocessed = [x for x in basket if x.billing_state == BilledState.Unprocessed]
+        sub_total, total, discounted_items = self._price_basket(basket, metrics, priced_at)
+        billed = frozenset(x.product_description for x in unprocessed if x.billing_state == BilledState.Processed)
+        self._result_cache.put(key, (sub_total, total, tuple(copy.copy(x) for x in discounted_items), billed))
+        return sub_total, total, discounted_items
+
+    def _results_depend_on_order(self) -> bool:
+        """
+        Whether the result of a basket can depend on the order of its products, results of baskets having the
+        same products in another order are then not reused from the result cache
+        PriceBasket bills item by item, e.g. a discounted product with offers of its own entered before the product
+        carrying the offer is billed with its own offers and then discounted again
+        :return: True
+        """
+        return True
 
-        total = 0.0
-        sub_total = 0.0
+    def _price_basket(self, basket: List[BasketState], metrics: MetricsRegistry = None,
+                      priced_at: datetime.datetime = None) -> tuple[str, str, list]:
+        total = 0
+        sub_total = 0
         discounted_items = []
+        # counted locally and recorded once for the basket
+        lookups = 0
+        offers_evaluated = 0
+        rules_evaluated = 0
+        exceptions = 0
 
         for item in basket:
             if item.billing_state == BilledState.Unprocessed:
 
                 try:
 
-                    cart_product: CartProduct = PriceBasket.get_product_by_description(item.product_description,
-                                                                                       self._cart_products)
+                    lookups += 1
+                    cart_product: CartProduct = self._catalog_index.match_description(item.product_description)
                     if cart_product is not None:
+                        # offers of the product or else of its category
+                        offers = self._catalog_index.get_offers_at(cart_product, priced_at)
                         # offer available on the product purchased
-                        if cart_product.offers:
-                            for offer in cart_product.offers:
+                        if offers:
+                            for offer in offers:
+                                offers_evaluated += 1
 
                                 if offer.offer_type == OfferFlat.offer_class():
 
-                                    regular_price, discounted_price, discounted_item = PriceBasket.bill_calculation_with_offer(
+                                    regular_price, discounted_price, discounted_item = self.bill_calculation_with_offer(
                                         item.purchased_quantity,
                                         cart_product,
                                         offer)
@@ -89,8 +226,9 @@ class PriceBasket:
                                     if offer.product_id != offer.discounted_product_id:
 
                                         # check if discounted product exist in basket
-                                        discounted_product = CartProduct.get_product_by_id(offer.discounted_product_id,
-                                                                                           self.cart_products)
+                                        lookups += 1
+                                        discounted_product = self._catalog_index.get_product_by_id(
+                                            offer.discounted_product_id)
 
                                         discounted_product_purchased = PriceBasket.get_product_by_description(
                                             discounted_product.product_description, basket)
@@ -99,11 +237,12 @@ class PriceBasket:
                                         # basket on regular price
                                         if discounted_product_purchased is None:
 
-                                            regular_bill = PriceBasket.bill_calculation_without_offer(
-                                                cart_product.price,
-                                                item.purchased_quantity)
-                                            sub_total = sub_total + regular_bill
-                                            total = total + regular_bill
+                                            regular_price, discounted_price, discounted_item = \
+                                                self._bill_without_own_offer(item, cart_product, priced_at)
+                                            if discounted_item is not None:
+                                                discounted_items.append(discounted_item)
+                                            sub_total = sub_total + regular_price
+                                            total = total + discounted_price
                                             item.change_billing_state()
 
                                         else:
@@ -111,13 +250,14 @@ class PriceBasket:
                                             # two more cases
 
                                             # Now check if all conditions are satisfied to get eligible for discount
-                                            if RuleInferenceEngine.all_conditions_satisfy(offer.conditions, item):
+                                            rules_evaluated += 1
+                                            if self._catalog_index.get_compiled_rule(offer).satisfied(item):
 
                                                 # check if discounted product has NOT yet been processed
                                                 if discounted_product_purchased.billing_state == BilledState.Unprocessed:
 
                                                     # apply discount
-                                                    regular_price, discounted_price, discounted_item = PriceBasket.bill_calculation_with_offer(
+                                                    regular_price, discounted_price, discounted_item = self.bill_calculation_with_offer(
                                                         discounted_product_purchased.purchased_quantity,
                                                         discounted_product,
                                                         offer)
@@ -138,7 +278,7 @@ class PriceBasket:
                                                 # needs adjustment
                                                 elif discounted_product_purchased.billing_state == BilledState.Processed:
 
-                                                    regular_price, discounted_price, discounted_item = PriceBasket.bill_calculation_with_offer(
+                                                    regular_price, discounted_price, discounted_item = self.bill_calculation_with_offer(
                                                         discounted_product_purchased.purchased_quantity,
                                                         discounted_product,
                                                         offer)
@@ -151,17 +291,18 @@ class PriceBasket:
                                                     item.change_billing_state()
                                             else:
                                                 # conditions are not satisfied , hence discount is not eligible
-                                                regular_bill = PriceBasket.bill_calculation_without_offer(
-                                                    cart_product.price,
-                                                    item.purchased_quantity)
-                                                sub_total = sub_total + regular_bill
-                                                total = total + regular_bill
+                                                regular_price, discounted_price, discounted_item = \
+                                                    self._bill_without_own_offer(item, cart_product, priced_at)
+                                                if discounted_item is not None:
+                                                    discounted_items.append(discounted_item)
+                                                sub_total = sub_total + regular_price
+                                                total = total + discounted_price
                                                 item.change_billing_state()
 
                                     # case when conditions required and discount available is on same product
                                     # Eg Buy 2 tins of soup get 50 percent off on soup
                                     else:
-                                        regular_price, discounted_price, discounted_item = PriceBasket.bill_calculation_with_offer(
+                                        regular_price, discounted_price, discounted_item = self.bill_calculation_with_offer(
                                             item.purchased_quantity,
                                             cart_product,
                                             offer)
@@ -174,19 +315,131 @@ class PriceBasket:
                         # there is no offer available on the product purchased
                         else:
 
-                            regular_bill = PriceBasket.bill_calculation_without_offer(cart_product.price,
+                            regular_bill = self.bill_calculation_without_offer(cart_product.price,
                                                                                       item.purchased_quantity)
                             sub_total = sub_total + regular_bill
                             total = total + regular_bill
                             item.change_billing_state()
 
                 except Exception as e:
+                    exceptions += 1
                     CustomLogging.log_error(e)
 
-        sub_total = CurrencyUtilityMethods.get_two_decimal_formatted_string(sub_total)
-        total = CurrencyUtilityMethods.get_two_decimal_formatted_string(total)
+        if metrics is not None:
+            metrics.counter("pricebasket_catalog_lookups_total", "Products looked up in the catalog").inc(lookups)
+            metrics.counter("pricebasket_offers_evaluated_total", "Offers of purchased products evaluated").inc(
+                offers_evaluated)
+            metrics.counter("pricebasket_rules_evaluated_total", "Offer conditions evaluated").inc(rules_evaluated)
+            if exceptions:
+                metrics.counter("pricebasket_exceptions_total", "Exceptions caught while pricing baskets").inc(
+                    exceptions)
+
+        return self.format_amount(sub_total), self.format_amount(total), discounted_items
+
+    def price_baskets(self,
+                      baskets: Iterable[List[BasketState]],
+                      mode: str = "serial",
+                      workers: int = None,
+                      chunksize: int = 64,
+                      priced_at: datetime.datetime = None) -> Iterator[tuple[str, str, list]]:
+        """
+        This method prices many baskets and yields the results in the same order as the baskets
+
+        Baskets are read lazily and sent to the workers in chunks, only a bounded number of chunks is in flight
+        at any time so millions of baskets can be priced without holding all of them or their results in memory
+
+        mode can be
+            serial - baskets are priced one after another on the calling thread
+            threads - chunks are priced on a thread pool, all threads share the cart products of this PriceBasket
+            processes - chunks are priced on a process pool, catalog index of this PriceBasket is sent once to
+                        each worker process when it starts instead of each worker loading the cache again
+                        (a ColumnarCatalog is sent as its path, workers map the same file and share its pages).
+                        Baskets are priced on copies so their billing state is not updated in the caller.
+                        If metrics are enabled, workers record the metrics of each chunk and send them back with
+                        its results to be merged in the active registry
+
+        :param baskets: iterable of baskets, each basket is a list of products in BasketState
+        :param mode: serial, threads or processes
+        :param workers: number of threads or processes, defaults to the number of cpus
+        :param chunksize: number of baskets sent to a worker at once
+        :param priced_at: time all the baskets are priced at, see price_basket
+        :return: iterator of results of price_basket for each basket
+        """
+        if mode == "serial":
+            for basket in baskets:
+                yield self.price_basket(basket, priced_at)
+            return
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if chunksize < 1:
+            raise ValueError(f"chunksize must be at least 1, got {chunksize}")
+
+        # imported here as pools are only needed by batches and importing them slows down starting the console
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        metrics = MetricsRegistry.active()
+        if mode == "threads":
+            executor = ThreadPoolExecutor(max_workers=workers)
+            price_chunk = self._price_chunk
+        elif mode == "processes":
+            executor = ProcessPoolExecutor(max_workers=workers,
+                                           initializer=_initialize_pricing_worker,
+                                           initargs=(type(self), self._catalog_index, self._worker_settings(),
+                                                     metrics is not None))
+            price_chunk = _price_chunk_in_worker
+        else:
+            raise ValueError(f"mode must be serial, threads or processes, got {mode}")
+
+        def results(future) -> list:
+            if mode == "threads":
+                return future.result()
+            chunk_results, chunk_metrics = future.result()
+            if chunk_metrics is not None:
+                metrics.merge(chunk_metrics)
+            return chunk_results
+
+        with executor:
+            pending = deque()
+            baskets = iter(baskets)
+            while True:
+                chunk = list(islice(baskets, chunksize))
+                if not chunk:
+                    break
+                pending.append(executor.submit(price_chunk, chunk, priced_at))
+
+                # waiting for the oldest chunk keeps the results in order and the memory bounded
+                if len(pending) >= 2 * workers:
+                    yield from results(pending.popleft())
+
+            while pending:
+                yield from results(pending.popleft())
+
+    def _bill_without_own_offer(self, item: BasketState, cart_product, priced_at: Optional[datetime.datetime]) -> tuple:
+        """
+        Bills a product none of whose own offers applies, with the first offer on its category if there is one
+        else at the regular price
+        :param item: product purchased
+        :param cart_product: cart product of the item
+        :param priced_at: time the basket is priced at, see price_basket
+        :return: a tuple containing regular price, final price and discounted item (None at the regular price)
+        """
+        category_offers = self._catalog_index.get_category_offers_at(cart_product, priced_at)
+        if category_offers:
+            return self.bill_calculation_with_offer(item.purchased_quantity, cart_product, category_offers[0])
+        regular_bill = self.bill_calculation_without_offer(cart_product.price, item.purchased_quantity)
+        return regular_bill, regular_bill, None
 
-        return sub_total, total, discounted_items
+    def _price_chunk(self, baskets: List[List[BasketState]], priced_at: datetime.datetime = None) -> list:
+        return [self.price_basket(basket, priced_at) for basket in baskets]
+
+    def _worker_settings(self) -> dict:
+        """
+        Returns attributes, other than the catalog, which a PriceBasket pricing in a worker process needs to price
+        like this one, subclasses with settings of their own add them
+        :return: attribute name to value
+        """
+        return {}
 
 
     @staticmethod
@@ -216,6 +469,15 @@ class PriceBasket:
 
         return regular_price, final_price, discounted_item
 
+    @staticmethod
+    def format_amount(amount: float) -> str:
+        """
+        This method formats subtotal and total returned by price_basket
+        :param amount: amount in pounds
+        :return: amount formatted with two decimals
+        """
+        return CurrencyUtilityMethods.get_two_decimal_formatted_string(amount)
+
     @staticmethod
     def bill_calculation_without_offer(price: float, quantity: int) -> float:
         """
@@ -230,15 +492,10 @@ class PriceBasket:
     def get_cart_products() -> Optional[tuple]:
         """
         This method fetches cart_products from the local cache
+        The cache is loaded once per process and reused until the cache file changes
         :return:
         """
-        with open('Cache/cartProducts.pkl', 'rb') as in_file:
-            try:
-                products = tuple(pickle.load(in_file))
-                return products
-            except Exception as e:
-                CustomLogging.log_error(e)
-                return None
+        return CatalogSnapshot.shared().cart_products
 
     @staticmethod
     def get_product_by_description(description, products) -> Optional:
@@ -261,3 +518,31 @@ class PriceBasket:
         except Exception as e:
             CustomLogging.log_error(e)
             return None
+
+
+# PriceBasket of a worker process, it is created once per process by the pool initializer
+_worker_price_basket: Optional[PriceBasket] = None
+# whether the worker process records metrics for the parent process
+_worker_records_metrics = False
+
+
+def _initialize_pricing_worker(price_basket_class, catalog_index, settings: dict = None,
+                               record_metrics: bool = False) -> None:
+    global _worker_price_basket, _worker_records_metrics
+    _worker_price_basket = price_basket_class.from_catalog_index(catalog_index)
+    for name, value in (settings or {}).items():
+        setattr(_worker_price_basket, name, value)
+    _worker_records_metrics = record_metrics
+
+
+def _price_chunk_in_worker(baskets: List[List[BasketState]],
+                           priced_at: datetime.datetime = None) -> tuple[list, Optional[MetricsRegistry]]:
+    if not _worker_records_metrics:
+        return _worker_price_basket._price_chunk(baskets, priced_at), None
+
+    # metrics of each chunk are recorded in a new registry and merged by the parent process
+    metrics = MetricsRegistry.enable(MetricsRegistry())
+    try:
+        return _worker_price_basket._price_chunk(baskets, priced_at), metrics
+    finally:
+        MetricsRegistry.disable()
@@ -0,0 +1,100 @@
+from typing import Iterable
+
+from pricebasket.currency_utility_methods import CurrencyUtilityMethods
+from pricebasket.discount_product_detail import PenceDiscountProductDetail
+
+
+class PricingResult:
+    """
+    This class represents the result of pricing a basket with amounts held in integer pence
+
+    Nothing is formatted when the result is created: subtotal, total and discount lines are formatted to strings
+    only when they are asked for, so callers adding up results (reports, reconciliation) use the integer amounts
+    and offer ids directly instead of parsing display strings back into numbers.
+
+    Discounts are plain tuples (description, offer id, discount percent, discount in pence), one per discount
+    applied, instead of a DiscountProductDetail object each.
+    to_tuple returns the result as (subtotal, total, discounted items) strings as returned by
+    PriceBasket.price_basket for callers which still need it
+        ...
+    Attributes
+    ----------
+    _sub_total : int
+        subtotal in pence
+    _total : int
+        total in pence
+    _discounts : tuple
+        discounts applied as (description, offer id, discount percent, discount in pence)
+    """
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_sub_total', '_total', '_discounts']
+
+    def __init__(self, sub_total: int = 0, total: int = 0, discounts: Iterable[tuple] = ()):
+        self._sub_total = sub_total
+        self._total = total
+        self._discounts = tuple(discounts)
+
+    @property
+    def sub_total_pence(self) -> int:
+        return self._sub_total
+
+    @property
+    def total_pence(self) -> int:
+        return self._total
+
+    @property
+    def discount_pence(self) -> int:
+        return self._sub_total - self._total
+
+    @property
+    def discounts(self) -> tuple:
+        return self._discounts
+
+    @property
+    def offer_ids(self) -> tuple:
+        return tuple(x[1] for x in self._discounts)
+
+    @property
+    def sub_total(self) -> str:
+        return CurrencyUtilityMethods.format_pence(self._sub_total)
+
+    @property
+    def total(self) -> str:
+        return CurrencyUtilityMethods.format_pence(self._total)
+
+    def discounted_items(self) -> list:
+        """
+        Returns the discounts as the discounted items PriceBasket returns, created on every call
+        :return: list of PenceDiscountProductDetail
+        """
+        return [PenceDiscountProductDetail(description, discount_percent, discount)
+                for description, _, discount_percent, discount in self._discounts]
+
+    def discount_lines(self) -> list:
+        """
+        Returns the discounts formatted as displayed to the user, e.g. Apples 10 % off: -10p
+        :return: list of strings
+        """
+        return [repr(x) for x in self.discounted_items()]
+
+    def to_tuple(self) -> tuple[str, str, list]:
+        """
+        Adapts the result to the tuple returned by PriceBasket.price_basket
+        :return: subtotal, total and the list of discounted items
+        """
+        return self.sub_total, self.total, self.discounted_items()
+
+    def __eq__(self, other):
+        if not isinstance(other, PricingResult):
+            return NotImplemented
+        return self._sub_total == other._sub_total and self._total == other._total and \
+            self._discounts == other._discounts
+
+    def __hash__(self):
+        return hash((self._sub_total, self._total, self._discounts))
+
+    def __repr__(self):
+        return f"PricingResult: sub_total = {self._sub_total}," \
+               f"total = {self._total}," \
+               f"discounts = {self._discounts}"
@@ -0,0 +1,210 @@
+import datetime
+import threading
+from typing import Dict, Iterable, Optional
+
+from pricebasket.catalog_index import CatalogIndex
+from pricebasket.offer_interval_index import OfferIntervalIndex
+from rule_engine.compiled_rule import CompiledRule
+
+
+class RegionalCatalog:
+    """
+    This class represents the catalog of a region (store) as a sparse overlay on the base catalog
+
+    Regions mostly sell the same products at the same prices, so instead of one full catalog per region the
+    base catalog (CatalogIndex or ColumnarCatalog) is shared by all regions and a region only stores the prices
+    and offers it overrides by product id. Lookups resolve the product in the base catalog and then the overlay:
+    a product with overrides is copied with the regional price and offers the first time it is looked up and
+    the copy is reused, every other product is the cart product of the base catalog itself, so loading a region
+    copies nothing and its memory only grows with its overrides.
+    Overrides are what differs from the base catalog when the overlay is prepared, so overlays are prepared again
+    from the saved feeds of the regions whenever the base catalog is rebuilt (see CartProduct.prepare_regions)
+
+    Regional offers replace the offers of the product in the base catalog, an empty tuple removes them.
+    Offers on categories are those of the base catalog.
+    It has the same lookups as CatalogIndex so PriceBasket can price baskets with it, it is also a sequence of
+    its cart products. It is read only, overlays are prepared by CartProduct.prepare_cart_products with a region
+        ...
+    Attributes
+    ----------
+    _base : CatalogIndex
+        base catalog shared by all the regions
+    _base_products : tuple
+        cart products of the base catalog, the ColumnarCatalog itself as it is a sequence
+    _region : str
+        name of the region
+    _prices : dict
+        product id to the regional price per unit
+    _offers : dict
+        product id to the regional offers
+    _version : int
+        version of the overlay, it changes whenever the overlay is loaded again
+    _products : dict
+        product id to the regional copies of the cart products created so far
+    _category_offers : dict
+        product type to the offers on the whole category, same as the base catalog
+    _offer_intervals : OfferIntervalIndex
+        validity windows of the regional offers, built on first use as only pricing at a timestamp needs it
+    _lock : Lock
+        so that concurrent lookups create one copy of a product
+    """
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_base', '_base_products', '_region', '_prices', '_offers', '_version', '_products',
+                 '_category_offers', '_offer_intervals', '_lock']
+
+    def __init__(self, base, region: str, prices: Dict = None, offers: Dict = None, version: int = 0):
+        self._base = base
+        self._base_products = base.products if isinstance(base, CatalogIndex) else base
+        self._region = region
+        self._prices = dict(prices or {})
+        self._offers = {x: tuple(y) for x, y in (offers or {}).items()}
+        self._version = version
+        self._products = {}
+        self._category_offers = CatalogIndex.index_category_offers(getattr(base, 'category_offers', ()))
+        self._offer_intervals = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # the lock and the regional copies are not sent to worker processes
+        return self._base, self._region, self._prices, self._offers, self._version
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __len__(self):
+        return len(self._base_products)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return tuple(self._resolve(x) for x in self._base_products[position])
+        return self._resolve(self._base_products[position])
+
+    def __iter__(self):
+        return (self._resolve(x) for x in self._base_products)
+
+    def __repr__(self):
+        return f"RegionalCatalog: region = {self._region}," \
+               f"version = {self._version}," \
+               f"prices = {len(self._prices)}," \
+               f"offers = {len(self._offers)}"
+
+    @property
+    def base(self):
+        return self._base
+
+    @property
+    def region(self):
+        return self._region
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def prices(self):
+        return self._prices
+
+    @property
+    def offers(self):
+        return self._offers
+
+    @property
+    def products(self):
+        return tuple(self)
+
+    @property
+    def category_offers(self) -> tuple:
+        return tuple(x for offers in self._category_offers.values() for x in offers)
+
+    def _resolve(self, cart_product) -> Optional:
+        if cart_product is None:
+            return None
+        product_id = cart_product.product_id
+        if product_id not in self._prices and product_id not in self._offers:
+            return cart_product
+
+        product = self._products.get(product_id)
+        if product is None:
+            with self._lock:
+                product = self._products.get(product_id)
+                if product is None:
+                    product = cart_product.copy()
+                    if product_id in self._prices:
+                        product.price = self._prices[product_id]
+                    if product_id in self._offers:
+                        product.offers = self._offers[product_id]
+                    self._products[product_id] = product
+        return product
+
+    def get_product_by_id(self, product_id) -> Optional:
+        return self._resolve(self._base.get_product_by_id(product_id))
+
+    def get_position(self, product_id) -> Optional[int]:
+        return self._base.get_position(product_id)
+
+    def get_product_by_description(self, description: str) -> Optional:
+        return self._resolve(self._base.get_product_by_description(description))
+
+    def match_description(self, description: str) -> Optional:
+        return self._resolve(self._base.match_description(description))
+
+    def get_product_ids_by_type(self, product_type) -> tuple:
+        return self._base.get_product_ids_by_type(product_type)
+
+    def get_category_offers(self, product_type) -> tuple:
+        return self._category_offers.get(product_type, ())
+
+    def get_compiled_rule(self, offer) -> CompiledRule:
+        # regional offers are compiled by the base catalog on first use and shared by the regions
+        return self._base.get_compiled_rule(offer)
+
+    def get_offers(self) -> tuple:
+        """
+        Returns all offers of the base catalog followed by the regional offers which are not in it
+        :return: tuple of offers
+        """
+        offers = {x.offer_id: x for x in self._base.get_offers()}
+        for regional_offers in self._offers.values():
+            for offer in regional_offers:
+                offers.setdefault(offer.offer_id, offer)
+        return tuple(offers.values())
+
+    def get_offer_intervals(self) -> OfferIntervalIndex:
+        if self._offer_intervals is None:
+            self._offer_intervals = OfferIntervalIndex(self.get_offers())
+        return self._offer_intervals
+
+    def get_offers_at(self, cart_product, priced_at: Optional[datetime.datetime]) -> tuple:
+        # same as CatalogIndex, it only depends on get_offer_intervals and the offers on categories
+        return CatalogIndex.get_offers_at(self, cart_product, priced_at)
+
+    def get_category_offers_at(self, cart_product, priced_at: Optional[datetime.datetime]) -> tuple:
+        return CatalogIndex.get_category_offers_at(self, cart_product, priced_at)
+
+    @staticmethod
+    def overlay(base, prices: Iterable = (), offers: Dict = None) -> tuple[dict, dict]:
+        """
+        Returns the overrides of a region, the regional prices and offers which differ from the base catalog
+        :param base: base catalog
+        :param prices: regional price list, first price of a product wins
+        :param offers: product id to regional offers, an empty tuple removes the offers of the product
+        :return: product id to price and product id to offers overridden by the region
+        """
+        price_overrides = {}
+        priced = set()
+        for price in prices or ():
+            if price.product_id in priced:
+                continue
+            priced.add(price.product_id)
+            cart_product = base.get_product_by_id(price.product_id)
+            if cart_product is not None and cart_product.price != price.price_per_unit:
+                price_overrides[price.product_id] = price.price_per_unit
+
+        offer_overrides = {}
+        for product_id, regional_offers in (offers or {}).items():
+            cart_product = base.get_product_by_id(product_id)
+            if cart_product is not None and \
+                    [x.offer_id for x in regional_offers] != [x.offer_id for x in cart_product.offers or ()]:
+                offer_overrides[product_id] = tuple(regional_offers)
+        return price_overrides, offer_overrides
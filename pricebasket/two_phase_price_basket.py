@@ -0,0 +1,157 @@
+import datetime
+from typing import Iterable, List
+
+from basket.basket_state import BasketState, BilledState
+from instrumentation.metrics_registry import MetricsRegistry
+from logs.logging import CustomLogging
+from mock_services.offer import OfferFlat, OfferGroup
+from pricebasket.price_basket import PriceBasket
+
+
+class TwoPhasePriceBasket(PriceBasket):
+    """
+    This class prices baskets in phases instead of billing item by item while searching and reordering the basket
+
+        1. quantities of the unprocessed items are added up per SKU (description entered) and each SKU is looked
+           up once in the catalog
+        2. offers of the purchased products are resolved: OfferFlat (or OfferGroup on the same product) discounts
+           the product itself, OfferGroup on a different product applies if its discounted product has been
+           purchased and its conditions are satisfied by the product carrying it
+        3. every SKU is billed in one pass
+
+    Cost is O(items + offers of the purchased products) and the basket given is never modified, billing state
+    of its items is left as it is and items already processed are not billed.
+
+    Pricing rules are the same as PriceBasket.price_basket and results are the same for the baskets it prices
+    consistently. Where PriceBasket depends on the order of the items this class gives one answer:
+        - a product is billed with the first of its offers which applies, else with the first offer on its
+          category, or at the regular price if there is none
+        - product carrying an OfferGroup on a different product is consumed by the offer (it is not billed) and
+          the discount is taken off the discounted product after it has been billed with its own offers,
+          which is what PriceBasket gives when the discounted product comes first in the basket
+        - discounted product of an OfferGroup is purchased if an item of the basket matches it in the catalog
+    Discounted items are in the order of the products in the basket
+
+    bill_calculation_with_offer, bill_calculation_without_offer and format_amount are used as in PriceBasket so
+    subclasses can change the arithmetic
+    """
+
+    __slots__ = []
+
+    def price_quantities(self, quantities: Iterable[tuple[str, int]], priced_at: datetime.datetime = None) -> tuple:
+        """
+        Prices a basket given as (SKU, quantity) pairs, e.g. a SkuBasket
+        :param quantities: iterable of SKU and quantity pairs
+        :param priced_at: time the basket is priced at, see PriceBasket.price_basket
+        :return: It returns total bill, Subtotal bill and the list of discounted items
+        """
+        return self.price_basket([BasketState(sku, quantity) for sku, quantity in quantities], priced_at)
+
+    def _results_depend_on_order(self) -> bool:
+        # offers are resolved for each product whatever the order of the products, see PriceBasket
+        return False
+
+    def _get_lines(self, basket: List[BasketState]) -> tuple[list, dict, int]:
+        """
+        Phase 1: adds up the quantity of each SKU, in the order they were first entered, and looks it up in the catalog
+        :param basket: list of products in BasketState
+        :return: lines as (BasketState, cart product) of the SKUs found in the catalog, product id to the position of
+        the first line of the product and the number of catalog lookups
+        """
+        quantities = {}
+        for item in basket:
+            if item.billing_state == BilledState.Unprocessed:
+                quantities[item.product_description] = quantities.get(item.product_description, 0) + \
+                                                       item.purchased_quantity
+
+        lines = []
+        purchased = {}
+        for description, quantity in quantities.items():
+            cart_product = self._catalog_index.match_description(description)
+            if cart_product is not None:
+                purchased.setdefault(cart_product.product_id, len(lines))
+                lines.append((BasketState(description, quantity), cart_product))
+        return lines, purchased, len(quantities)
+
+    def _price_basket(self, basket: List[BasketState], metrics: MetricsRegistry = None,
+                      priced_at: datetime.datetime = None) -> tuple:
+        catalog_index = self._catalog_index
+        flat_offer_class = OfferFlat.offer_class()
+        group_offer_class = OfferGroup.offer_class()
+
+        lines, purchased, lookups = self._get_lines(basket)
+
+        # phase 2: offer resolved for each line, None for the regular price
+        resolved = []
+        offers_evaluated = 0
+        rules_evaluated = 0
+        exceptions = 0
+        for line, cart_product in lines:
+            applied = None
+            discounted_line = None
+            for offer in catalog_index.get_offers_at(cart_product, priced_at):
+                offers_evaluated += 1
+                try:
+                    if offer.offer_type == flat_offer_class or offer.product_id == offer.discounted_product_id:
+                        applied = offer
+                        break
+                    if offer.offer_type == group_offer_class:
+                        position = purchased.get(offer.discounted_product_id)
+                        if position is not None:
+                            rules_evaluated += 1
+                            if catalog_index.get_compiled_rule(offer).satisfied(line):
+                                applied = offer
+                                discounted_line = position
+                                break
+                except Exception as e:
+                    exceptions += 1
+                    CustomLogging.log_error(e)
+            if applied is None:
+                # none of the offers of the product applies, offers on its category do
+                category_offers = catalog_index.get_category_offers_at(cart_product, priced_at)
+                if category_offers:
+                    offers_evaluated += 1
+                    applied = category_offers[0]
+            resolved.append((applied, discounted_line))
+
+        # phase 3: billing
+        total = 0
+        sub_total = 0
+        discounted_items = []
+        for (line, cart_product), (offer, discounted_line) in zip(lines, resolved):
+            try:
+                if offer is None:
+                    regular_bill = self.bill_calculation_without_offer(cart_product.price, line.purchased_quantity)
+                    sub_total = sub_total + regular_bill
+                    total = total + regular_bill
+                elif discounted_line is None:
+                    regular_price, discounted_price, discounted_item = self.bill_calculation_with_offer(
+                        line.purchased_quantity,
+                        cart_product,
+                        offer)
+                    discounted_items.append(discounted_item)
+                    sub_total = sub_total + regular_price
+                    total = total + discounted_price
+                else:
+                    # line carrying the offer is consumed, the discounted product is billed on its own line
+                    discounted_product_line, discounted_product = lines[discounted_line]
+                    regular_price, discounted_price, discounted_item = self.bill_calculation_with_offer(
+                        discounted_product_line.purchased_quantity,
+                        discounted_product,
+                        offer)
+                    discounted_items.append(discounted_item)
+                    total = total - (regular_price - discounted_price)
+            except Exception as e:
+                exceptions += 1
+                CustomLogging.log_error(e)
+
+        if metrics is not None:
+            metrics.counter("pricebasket_catalog_lookups_total", "Products looked up in the catalog").inc(lookups)
+            metrics.counter("pricebasket_offers_evaluated_total", "Offers of purchased products evaluated").inc(
+                offers_evaluated)
+            metrics.counter("pricebasket_rules_evaluated_total", "Offer conditions evaluated").inc(rules_evaluated)
+            if exceptions:
+                metrics.counter("pricebasket_exceptions_total", "Exceptions caught while pricing baskets").inc(
+                    exceptions)
+
+        return self.format_amount(sub_total), self.format_amount(total), discounted_items
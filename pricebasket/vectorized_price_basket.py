@@ -0,0 +1,437 @@
+from typing import Iterable, List, Optional
+
+from mock_services.offer import OfferFlat, OfferGroup
+from pricebasket.catalog_index import CatalogIndex
+from pricebasket.catalog_snapshot import CatalogSnapshot
+from pricebasket.currency_utility_methods import CurrencyUtilityMethods
+from pricebasket.discount_product_detail import DiscountProductDetail
+from rule_engine.custom_operator import CustomOperator
+
+try:
+    import numpy as np
+except ImportError:
+    # numpy is only needed for bulk repricing, rest of the project works without it
+    np = None
+
+# codes used for the operators of offer conditions in the condition arrays, NO_CONDITION pads the arrays
+NO_CONDITION = 0
+EQUAL = 1
+EQUAL_OR_GREATER = 2
+
+
+class VectorizedPricingResult:
+    """
+    This class represents the result of pricing a batch of baskets with VectorizedPriceBasket
+    All attributes are numpy arrays so results of millions of baskets can be aggregated without creating objects
+        ...
+    Attributes
+    ----------
+    _basket_ids : ndarray
+        sorted unique basket ids of the batch
+    _sub_totals : ndarray
+        subtotal of each basket in pounds, in the order of basket ids
+    _totals : ndarray
+        total of each basket in pounds, in the order of basket ids
+    _discount_baskets : ndarray
+        position (in basket ids) of the basket of each discount line
+    _discount_skus : ndarray
+        sku index of the discounted product of each discount line
+    _discount_offers : ndarray
+        offer index (in VectorizedPriceBasket.offers) of each discount line
+    _discount_amounts : ndarray
+        discount of each discount line in pounds
+    """
+
+    __slots__ = ['_basket_ids', '_sub_totals', '_totals', '_discount_baskets', '_discount_skus',
+                 '_discount_offers', '_discount_amounts']
+
+    def __init__(self, basket_ids, sub_totals, totals, discount_baskets, discount_skus, discount_offers,
+                 discount_amounts):
+        self._basket_ids = basket_ids
+        self._sub_totals = sub_totals
+        self._totals = totals
+        self._discount_baskets = discount_baskets
+        self._discount_skus = discount_skus
+        self._discount_offers = discount_offers
+        self._discount_amounts = discount_amounts
+
+    @property
+    def basket_ids(self):
+        return self._basket_ids
+
+    @property
+    def sub_totals(self):
+        return self._sub_totals
+
+    @property
+    def totals(self):
+        return self._totals
+
+    @property
+    def discount_baskets(self):
+        return self._discount_baskets
+
+    @property
+    def discount_skus(self):
+        return self._discount_skus
+
+    @property
+    def discount_offers(self):
+        return self._discount_offers
+
+    @property
+    def discount_amounts(self):
+        return self._discount_amounts
+
+    def __len__(self):
+        return len(self._basket_ids)
+
+    def __repr__(self):
+        return f"VectorizedPricingResult: baskets = {len(self._basket_ids)}," \
+               f"discount_lines = {len(self._discount_amounts)}"
+
+
+class VectorizedPriceBasket:
+    """
+    This class prices batches of baskets given as columnar numpy arrays, meant for bulk repricing
+
+    A batch is three arrays of the same length, one entry per line: basket id, sku index (position of the product
+    in the cart products) and quantity. Lines of the same sku in a basket are added up, which is what
+    BasketState.get_products_in_basket_state does for the items entered by the user, products keep the position
+    of their first line in the basket.
+
+    Instead of a python loop per item, baskets are priced together one position at a time: the products at the
+    same position of all baskets are billed at once with the same pricing rules as PriceBasket.price_basket:
+        - product without offers is billed at the regular price
+        - OfferFlat bills the product with the discount
+        - OfferGroup on a different product: if the discounted product is not in the basket or the conditions are not
+          satisfied the product is billed with the first offer on its category, if any, else at the regular price.
+          Otherwise the product carrying the offer is consumed by the offer and the discounted product is billed
+          with the discount, or its discount is taken off the total if it has already been billed
+        - OfferGroup on the same product bills the product with the discount
+    Amounts are added to the subtotal and total of each basket in the order PriceBasket adds them, so totals are
+    the same float values and are formatted to the same pence, including baskets whose result depends on the
+    order of the products (a discounted product with offers of its own)
+
+    Catalog arrays are built once from the cart products prepared by CartProduct.prepare_cart_products
+
+    This class needs numpy
+        ...
+    Attributes
+    ----------
+    _cart_products : tuple
+        cart products, sku index of a product is its position in this tuple
+    _catalog_index : CatalogIndex
+        index over the cart products used to convert descriptions to sku indexes
+    _sku_by_product_id : dict
+        product id to sku index
+    _prices : ndarray
+        price of each sku
+    _offers : list
+        offers referenced by the offer arrays
+    _entry_* : ndarray
+        offers of each sku in the order PriceBasket applies them, grouped by sku (start/count per sku), with the
+        discounted sku and conditions of group offers on a different product
+    _category_offer : ndarray
+        offer index of the first offer on the category of each sku, -1 if there is none
+    _category_percent : ndarray
+        discount of the offer on the category of each sku
+    """
+
+    __slots__ = ['_cart_products', '_catalog_index', '_sku_by_product_id', '_prices', '_offers',
+                 '_entry_start', '_entry_count', '_entry_offer', '_entry_percent', '_entry_is_group',
+                 '_entry_discounted_sku', '_entry_operators', '_entry_quantities', '_category_offer',
+                 '_category_percent']
+
+    def __init__(self, cart_products: Iterable = None, category_offers: Iterable = ()):
+        if np is None:
+            raise ImportError("VectorizedPriceBasket needs numpy, install it with pip install numpy")
+
+        if cart_products is None:
+            cart_products, catalog_index = CatalogSnapshot.shared().get()
+        else:
+            cart_products = tuple(cart_products)
+            catalog_index = CatalogIndex(cart_products, category_offers)
+
+        self._cart_products = cart_products
+        self._catalog_index = catalog_index
+        self._sku_by_product_id = {}
+        for sku, cart_product in enumerate(cart_products):
+            self._sku_by_product_id.setdefault(cart_product.product_id, sku)
+
+        self._build_catalog_arrays()
+
+    def _build_catalog_arrays(self) -> None:
+        sku_count = len(self._cart_products)
+        self._prices = np.array([x.price for x in self._cart_products], dtype=np.float64)
+        self._offers = []
+
+        # offers on categories are found by the index, see CatalogIndex.get_offers_at
+        entries = []
+        for sku, cart_product in enumerate(self._cart_products):
+            for offer in self._catalog_index.get_offers_at(cart_product, None):
+                offer_index = len(self._offers)
+                self._offers.append(offer)
+                if offer.offer_type == OfferGroup.offer_class() and offer.product_id != offer.discounted_product_id:
+                    discounted_sku = self._sku_by_product_id.get(offer.discounted_product_id, -1)
+                    entries.append((sku, offer_index, offer.discount_percent, True, discounted_sku, offer.conditions))
+                elif offer.offer_type in (OfferFlat.offer_class(), OfferGroup.offer_class()):
+                    entries.append((sku, offer_index, offer.discount_percent, False, -1, ()))
+
+        # first offer on the category of each product, used when none of the offers of the product applies
+        self._category_offer = np.full(sku_count, -1, dtype=np.int64)
+        self._category_percent = np.zeros(sku_count, dtype=np.float64)
+        for sku, cart_product in enumerate(self._cart_products):
+            category_offers = self._catalog_index.get_category_offers_at(cart_product, None)
+            if category_offers:
+                self._category_offer[sku] = len(self._offers)
+                self._category_percent[sku] = category_offers[0].discount_percent
+                self._offers.append(category_offers[0])
+
+        entry_skus = np.array([x[0] for x in entries], dtype=np.int64)
+        self._entry_count = np.bincount(entry_skus, minlength=sku_count).astype(np.int64)
+        self._entry_start = np.cumsum(self._entry_count) - self._entry_count
+        self._entry_offer = np.array([x[1] for x in entries], dtype=np.int64)
+        self._entry_percent = np.array([x[2] for x in entries], dtype=np.float64)
+        self._entry_is_group = np.array([x[3] for x in entries], dtype=bool)
+        self._entry_discounted_sku = np.array([x[4] for x in entries], dtype=np.int64)
+
+        # conditions are padded to the largest number of conditions of an offer
+        condition_count = max([len(x[5]) for x in entries], default=0)
+        self._entry_operators = np.full((len(entries), condition_count), NO_CONDITION, dtype=np.int8)
+        self._entry_quantities = np.zeros((len(entries), condition_count), dtype=np.int64)
+        for entry, (_, _, _, _, _, conditions) in enumerate(entries):
+            for position, condition in enumerate(conditions):
+                if condition.operator == CustomOperator.Equal:
+                    self._entry_operators[entry, position] = EQUAL
+                elif condition.operator == CustomOperator.EqualOrGreater:
+                    self._entry_operators[entry, position] = EQUAL_OR_GREATER
+                self._entry_quantities[entry, position] = condition.quantity
+
+    @property
+    def cart_products(self):
+        return self._cart_products
+
+    @property
+    def offers(self):
+        return self._offers
+
+    def get_sku(self, product_id) -> Optional[int]:
+        return self._sku_by_product_id.get(product_id)
+
+    def columns_from_baskets(self, baskets: Iterable[List[str]]) -> tuple:
+        """
+        Converts baskets of product descriptions (as entered by the user) to the columnar arrays
+        Items not found in the catalog are left out, PriceBasket does not bill them either
+        :param baskets: iterable of baskets, each basket is a list of product descriptions
+        :return: tuple of basket id, sku index and quantity arrays, basket id is the position of the basket
+        """
+        basket_ids = []
+        skus = []
+        for basket_id, basket in enumerate(baskets):
+            for description in basket:
+                cart_product = self._catalog_index.match_description(description)
+                if cart_product is not None:
+                    basket_ids.append(basket_id)
+                    skus.append(self._sku_by_product_id[cart_product.product_id])
+        return (np.array(basket_ids, dtype=np.int64),
+                np.array(skus, dtype=np.int64),
+                np.ones(len(skus), dtype=np.int64))
+
+    def price_baskets(self, basket_ids, skus, quantities) -> VectorizedPricingResult:
+        """
+        Prices a batch of baskets given as columnar arrays
+        :param basket_ids: basket id of each line
+        :param skus: sku index of each line
+        :param quantities: quantity of each line
+        :return: VectorizedPricingResult with subtotal, total and discount lines of every basket
+        """
+        basket_ids = np.asarray(basket_ids, dtype=np.int64)
+        skus = np.asarray(skus, dtype=np.int64)
+        quantities = np.asarray(quantities, dtype=np.int64)
+        sku_count = max(len(self._cart_products), 1)
+
+        # adding up lines of the same sku in a basket, rows are sorted by basket and sku
+        unique_basket_ids, basket_positions = np.unique(basket_ids, return_inverse=True)
+        keys = basket_positions.reshape(-1) * sku_count + skus
+        row_keys, first_lines, line_rows = np.unique(keys, return_index=True, return_inverse=True)
+        row_quantities = np.zeros(len(row_keys), dtype=np.int64)
+        np.add.at(row_quantities, line_rows.reshape(-1), quantities)
+        row_baskets = row_keys // sku_count
+        row_skus = row_keys % sku_count
+        row_regular = row_quantities * self._prices[row_skus]
+
+        # rows of each basket in the order their products were first entered
+        basket_count = len(unique_basket_ids)
+        ordered_rows = np.lexsort((first_lines, row_baskets))
+        row_counts = np.bincount(row_baskets, minlength=basket_count)
+        row_starts = np.cumsum(row_counts) - row_counts
+
+        # billing state of each row and amounts of each basket, updated as PriceBasket updates them
+        processed = np.zeros(len(row_keys), dtype=bool)
+        failed = np.zeros(len(row_keys), dtype=bool)
+        sub_totals = np.zeros(basket_count, dtype=np.float64)
+        totals = np.zeros(basket_count, dtype=np.float64)
+        discount_lines = _DiscountLines()
+
+        for position in range(int(row_counts.max(initial=0))):
+            baskets = np.flatnonzero(row_counts > position)
+            rows = ordered_rows[row_starts[baskets] + position]
+            # products already billed, discounted by an offer on a product entered before, are skipped
+            unprocessed = ~processed[rows]
+            baskets, rows = baskets[unprocessed], rows[unprocessed]
+            entry_counts = self._entry_count[row_skus[rows]]
+
+            # product without offers is billed at the regular price
+            without_offers = entry_counts == 0
+            VectorizedPriceBasket._bill(sub_totals, totals, baskets[without_offers], row_regular[rows[without_offers]],
+                                        row_regular[rows[without_offers]])
+            processed[rows[without_offers]] = True
+
+            # every offer of the product is applied in turn, each one bills the product again as PriceBasket does
+            for entry in range(int(entry_counts.max(initial=0))):
+                selected = (entry_counts > entry) & ~failed[rows]
+                entry_baskets, entry_rows = baskets[selected], rows[selected]
+                entries = self._entry_start[row_skus[entry_rows]] + entry
+                is_group = self._entry_is_group[entries]
+
+                # offer billed with the discount on the product itself
+                self._bill_with_offers(sub_totals, totals, discount_lines, entry_baskets[~is_group],
+                                       row_skus[entry_rows[~is_group]], row_regular[entry_rows[~is_group]],
+                                       self._entry_offer[entries[~is_group]],
+                                       self._entry_percent[entries[~is_group]])
+                processed[entry_rows[~is_group]] ^= True
+
+                self._apply_group_offers(entry_baskets[is_group], entry_rows[is_group], entries[is_group],
+                                         row_keys, row_baskets, row_skus, row_quantities, row_regular, processed,
+                                         failed, sub_totals, totals, discount_lines)
+
+        return VectorizedPricingResult(unique_basket_ids, sub_totals, totals, *discount_lines.to_arrays())
+
+    def _apply_group_offers(self, baskets, rows, entries, row_keys, row_baskets, row_skus, row_quantities,
+                            row_regular, processed, failed, sub_totals, totals, discount_lines) -> None:
+        """
+        Applies group offers on a different product, one offer of one product of each basket
+        """
+        sku_count = max(len(self._cart_products), 1)
+
+        # discounted product not in the catalog: PriceBasket logs the error and leaves the product unbilled
+        missing = self._entry_discounted_sku[entries] < 0
+        failed[rows[missing]] = True
+        baskets, rows, entries = baskets[~missing], rows[~missing], entries[~missing]
+
+        # find the discounted product in the same basket and check the conditions
+        discounted_keys = row_baskets[rows] * sku_count + self._entry_discounted_sku[entries]
+        discounted_rows = np.minimum(np.searchsorted(row_keys, discounted_keys), max(len(row_keys) - 1, 0))
+        discounted_present = row_keys[discounted_rows] == discounted_keys
+
+        satisfied = np.ones(len(entries), dtype=bool)
+        quantities = row_quantities[rows]
+        for position in range(self._entry_operators.shape[1]):
+            operators = self._entry_operators[entries, position]
+            required = self._entry_quantities[entries, position]
+            satisfied &= np.where(operators == EQUAL, required == quantities,
+                                  np.where(operators == EQUAL_OR_GREATER, required >= quantities, True))
+        applied = discounted_present & satisfied
+
+        # not applied: product carrying the offer is billed with the offer on its category or at the regular price
+        not_applied_rows = rows[~applied]
+        not_applied_skus = row_skus[not_applied_rows]
+        with_category = self._category_offer[not_applied_skus] >= 0
+        self._bill_with_offers(sub_totals, totals, discount_lines, baskets[~applied][with_category],
+                               not_applied_skus[with_category], row_regular[not_applied_rows[with_category]],
+                               self._category_offer[not_applied_skus[with_category]],
+                               self._category_percent[not_applied_skus[with_category]])
+        VectorizedPriceBasket._bill(sub_totals, totals, baskets[~applied][~with_category],
+                                    row_regular[not_applied_rows[~with_category]],
+                                    row_regular[not_applied_rows[~with_category]])
+
+        # applied: product carrying the offer is consumed, the discounted product is billed with the discount if it
+        # has not been billed yet, else its discount is taken off the total
+        applied_baskets = baskets[applied]
+        applied_rows = discounted_rows[applied]
+        applied_entries = entries[applied]
+        regular = row_regular[applied_rows]
+        discounts = (self._entry_percent[applied_entries] * regular) / 100.0
+        final = regular - discounts
+        billed = processed[applied_rows]
+        VectorizedPriceBasket._bill(sub_totals, totals, applied_baskets[~billed], regular[~billed], final[~billed])
+        processed[applied_rows[~billed]] = True
+        totals[applied_baskets[billed]] -= regular[billed] - final[billed]
+        discount_lines.add(applied_baskets, row_skus[applied_rows], self._entry_offer[applied_entries], discounts)
+
+        processed[rows] ^= True
+
+    @staticmethod
+    def _bill_with_offers(sub_totals, totals, discount_lines, baskets, skus, regular, offers, percents) -> None:
+        discounts = (percents * regular) / 100.0
+        VectorizedPriceBasket._bill(sub_totals, totals, baskets, regular, regular - discounts)
+        discount_lines.add(baskets, skus, offers, discounts)
+
+    @staticmethod
+    def _bill(sub_totals, totals, baskets, regular, final) -> None:
+        # baskets are distinct, every basket is billed for at most one product at a time
+        sub_totals[baskets] += regular
+        totals[baskets] += final
+
+    def to_price_basket_results(self, result: VectorizedPricingResult) -> list[tuple[str, str, list]]:
+        """
+        Converts the result to the values returned by PriceBasket.price_basket for each basket,
+        in the order of basket ids
+        :param result: result of price_baskets
+        :return: list of subtotal, total and discounted items of each basket
+        """
+        discounted_items = [[] for _ in range(len(result))]
+        for basket, sku, offer, amount in zip(result.discount_baskets.tolist(), result.discount_skus.tolist(),
+                                              result.discount_offers.tolist(), result.discount_amounts.tolist()):
+            discounted_items[basket].append(
+                DiscountProductDetail(self._cart_products[sku].product_description,
+                                      self._offers[offer].discount_percent,
+                                      CurrencyUtilityMethods.get_currency_with_unit(amount)))
+
+        return [(CurrencyUtilityMethods.get_two_decimal_formatted_string(sub_total),
+                 CurrencyUtilityMethods.get_two_decimal_formatted_string(total),
+                 items)
+                for sub_total, total, items in zip(result.sub_totals.tolist(), result.totals.tolist(),
+                                                   discounted_items)]
+
+    @staticmethod
+    def _expand(counts, starts) -> tuple:
+        """
+        Pairs every row with each of its entries, e.g. each basket line with each offer of its product
+        :param counts: number of entries of each row
+        :param starts: position of the first entry of each row
+        :return: tuple of row and entry arrays
+        """
+        rows = np.repeat(np.arange(len(counts)), counts)
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        return rows, np.repeat(starts, counts) + offsets
+
+    def __repr__(self):
+        return f"VectorizedPriceBasket: skus = {len(self._cart_products)}," \
+               f"offers = {len(self._offers)}"
+
+
+class _DiscountLines:
+    """
+    Discount lines of a batch collected in the order they are billed, converted to arrays once
+    """
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_baskets', '_skus', '_offers', '_amounts']
+
+    def __init__(self):
+        self._baskets = [np.zeros(0, dtype=np.int64)]
+        self._skus = [np.zeros(0, dtype=np.int64)]
+        self._offers = [np.zeros(0, dtype=np.int64)]
+        self._amounts = [np.zeros(0, dtype=np.float64)]
+
+    def add(self, baskets, skus, offers, amounts) -> None:
+        self._baskets.append(baskets)
+        self._skus.append(skus)
+        self._offers.append(offers)
+        self._amounts.append(amounts)
+
+    def to_arrays(self) -> tuple:
+        return (np.concatenate(self._baskets), np.concatenate(self._skus), np.concatenate(self._offers),
+                np.concatenate(self._amounts))
@@ -0,0 +1,370 @@
+"""
+Local HTTP pricing service, tills send baskets as JSON instead of starting a python process for each transaction
+
+    POST /price    {"items": ["apples", "milk", "bread"], "priced_at": "2022-03-01T10:00:00"}
+                   priced_at is optional, returns {"subtotal": "3.10", "total": "3.00", "discounts": [...]}
+    GET /metrics   metrics in Prometheus format
+    GET /health    200 when the server is up
+
+Run from the project directory:
+    python -m pricing_service.pricing_server [--host 127.0.0.1] [--port 8080] [--workers 4] [--queue-size 64]
+                                             [--mode threads|processes]
+"""
+import argparse
+import datetime
+import json
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Type
+
+from basket.basket_state import BasketState
+from instrumentation.metrics_registry import MetricsRegistry
+from logs.logging import CustomLogging
+from price_basket_result_display.PriceBasketResultDisplay import PriceBasketResultDisplay
+from pricebasket.basket_result_cache import BasketResultCache
+from pricebasket.catalog_snapshot import CatalogSnapshot
+from pricebasket.price_basket import PriceBasket
+
+# largest request body accepted, a basket of a few thousand items
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class PricingServer:
+    """
+    This class represents a long running HTTP server pricing baskets on localhost
+
+    The catalog is loaded once in the shared CatalogSnapshot, every request is priced by a PriceBasket created from
+    the snapshot so a rebuilt catalog is picked up by the next request without restarting the server.
+
+    Connections are kept alive (HTTP/1.1) and served by their own threads, pricing is done by a pool of workers.
+    At most workers + queue_size baskets are being priced or waiting for a worker, requests beyond that are
+    answered at once with 503 and Retry-After so a burst of traffic does not build an unbounded backlog
+    (load shedding). Requests waiting longer than request_timeout for their result are answered with 504.
+
+    mode can be
+        threads - workers are threads sharing the snapshot and the result cache of the server. Pricing holds the
+                  GIL so worker threads only bound how many baskets are priced at once, they don't price baskets
+                  in parallel and adding workers does not add throughput
+        processes - workers are processes pricing baskets in parallel, each worker uses the shared snapshot of
+                    the same cache file (a rebuilt or updated cache file is picked up when it is written) and a
+                    result cache of its own of the size of result_cache. If metrics are enabled, workers send the
+                    metrics of each basket back to be merged in the active registry
+
+    Metrics of the server are recorded in the registry given (a registry of its own by default) and served on
+    /metrics. Metrics of pricing are recorded by PriceBasket in the active registry, main enables the registry of
+    the server so that /metrics serves both, creating a server does not enable metrics in the process
+        ...
+    Attributes
+    ----------
+    _http_server : ThreadingHTTPServer
+        server accepting connections
+    _executor : ThreadPoolExecutor or ProcessPoolExecutor
+        workers pricing baskets
+    _capacity : BoundedSemaphore
+        free places among the baskets being priced or waiting
+    _snapshot : CatalogSnapshot
+        catalog baskets are priced with
+    _price_basket_class : type
+        PriceBasket or a subclass (e.g. TwoPhasePriceBasket) pricing the baskets
+    _result_cache : BasketResultCache
+        results of priced baskets, None to price every basket
+    _metrics : MetricsRegistry
+        metrics of the server and of pricing
+    _request_timeout : float
+        seconds a request waits for its basket to be priced
+    _mode : str
+        threads or processes
+    _thread : Thread
+        thread serving requests when started with start()
+    """
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_http_server', '_executor', '_capacity', '_snapshot', '_price_basket_class', '_result_cache',
+                 '_metrics', '_request_timeout', '_mode', '_thread']
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 8080,
+                 workers: int = 4,
+                 queue_size: int = 64,
+                 snapshot: CatalogSnapshot = None,
+                 price_basket_class: Type[PriceBasket] = PriceBasket,
+                 result_cache: Optional[BasketResultCache] = None,
+                 request_timeout: float = 5.0,
+                 metrics: MetricsRegistry = None,
+                 mode: str = "threads"):
+        if workers < 1 or queue_size < 0:
+            raise ValueError(f"workers must be at least 1 and queue_size at least 0, got {workers} and {queue_size}")
+        if mode not in ("threads", "processes"):
+            raise ValueError(f"mode must be threads or processes, got {mode}")
+        self._snapshot = snapshot if snapshot is not None else CatalogSnapshot.shared()
+        self._price_basket_class = price_basket_class
+        self._result_cache = result_cache
+        self._request_timeout = request_timeout
+        self._metrics = metrics if metrics is not None else MetricsRegistry()
+        self._mode = mode
+        if mode == "threads":
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pricing-worker")
+        else:
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers, initializer=_initialize_pricing_worker,
+                initargs=(price_basket_class, self._snapshot.path,
+                          result_cache.max_size if result_cache is not None else 0,
+                          MetricsRegistry.active() is not None))
+        self._capacity = threading.BoundedSemaphore(workers + queue_size)
+        self._thread = None
+
+        # catalog is loaded before the first request
+        self._snapshot.get()
+
+        self._http_server = ThreadingHTTPServer((host, port), _PricingRequestHandler)
+        self._http_server.daemon_threads = True
+        self._http_server.pricing_server = self
+
+    @property
+    def address(self) -> tuple:
+        return self._http_server.server_address
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    @property
+    def request_timeout(self):
+        return self._request_timeout
+
+    def serve_forever(self) -> None:
+        self._http_server.serve_forever()
+
+    def start(self) -> 'PricingServer':
+        """
+        Serves requests on a background thread
+        :return: self
+        """
+        self._thread = threading.Thread(target=self.serve_forever, name="pricing-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Stops serving requests started with start() and releases the socket and the workers
+        :return: None
+        """
+        if self._thread is not None:
+            self._http_server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._http_server.server_close()
+        self._executor.shutdown(wait=True)
+
+    def price(self, request: dict) -> dict:
+        """
+        Prices the basket of a request
+        :param request: {"items": [...], "priced_at": ISO timestamp (optional), "region": name (optional)}
+        :return: result as PriceBasketResultDisplay.to_dict
+        """
+        return _price_request(self._price_basket_class, self._snapshot, self._result_cache, request)
+
+    def submit(self, request: dict):
+        """
+        Queues the basket of a request for a worker
+        :param request: request as given to price
+        :return: future of the result or None if the server is full and the request must be shed
+        """
+        if not self._capacity.acquire(blocking=False):
+            return None
+        try:
+            if self._mode == "threads":
+                future = self._executor.submit(self.price, request)
+            else:
+                future = self._executor.submit(_price_in_worker, request)
+        except Exception:
+            self._capacity.release()
+            raise
+        future.add_done_callback(lambda x: self._capacity.release())
+        return future
+
+    def result(self, future, timeout: float) -> dict:
+        """
+        Waits for the result of a future returned by submit, metrics recorded by a worker process are merged in
+        the active registry
+        :param future: future returned by submit
+        :param timeout: seconds to wait
+        :return: result as PriceBasketResultDisplay.to_dict
+        """
+        if self._mode == "threads":
+            return future.result(timeout)
+        result, metrics = future.result(timeout)
+        active = MetricsRegistry.active()
+        if metrics is not None and active is not None:
+            active.merge(metrics)
+        return result
+
+    def __repr__(self):
+        return f"PricingServer: address = {self.address}, mode = {self._mode}"
+
+
+def _price_request(price_basket_class: Type[PriceBasket], snapshot: CatalogSnapshot,
+                   result_cache: Optional[BasketResultCache], request: dict) -> dict:
+    items = request.get("items")
+    if not isinstance(items, list):
+        raise ValueError("items must be a list of products")
+    priced_at = request.get("priced_at")
+    if priced_at is not None:
+        if not isinstance(priced_at, str):
+            raise ValueError("priced_at must be an ISO timestamp")
+        priced_at = datetime.datetime.fromisoformat(priced_at)
+
+    region = request.get("region")
+    if region is not None and not isinstance(region, str):
+        raise ValueError("region must be a string")
+
+    basket = BasketState.get_products_in_basket_state(str(x).lower() for x in items)
+    price_basket = price_basket_class(snapshot, result_cache, region=region)
+    sub_total, total, discounted_items = price_basket.price_basket(basket, priced_at)
+    return PriceBasketResultDisplay(sub_total, discounted_items, total).to_dict()
+
+
+# pricing of a worker process, it is set once per process by the pool initializer
+_worker_pricing: Optional[tuple] = None
+# whether the worker process records metrics for the server
+_worker_records_metrics = False
+
+
+def _initialize_pricing_worker(price_basket_class: Type[PriceBasket], snapshot_path: str, cache_size: int,
+                               record_metrics: bool) -> None:
+    global _worker_pricing, _worker_records_metrics
+    snapshot = CatalogSnapshot.shared(snapshot_path)
+    # catalog is loaded before the first request
+    snapshot.get()
+    result_cache = BasketResultCache(cache_size) if cache_size > 0 else None
+    _worker_pricing = (price_basket_class, snapshot, result_cache)
+    _worker_records_metrics = record_metrics
+
+
+def _price_in_worker(request: dict) -> tuple[dict, Optional[MetricsRegistry]]:
+    if not _worker_records_metrics:
+        return _price_request(*_worker_pricing, request), None
+
+    # metrics of each basket are recorded in a new registry and merged by the server
+    metrics = MetricsRegistry.enable(MetricsRegistry())
+    try:
+        return _price_request(*_worker_pricing, request), metrics
+    finally:
+        MetricsRegistry.disable()
+
+
+class _PricingRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles the requests of one connection, connection is kept alive between requests
+    """
+
+    protocol_version = "HTTP/1.1"
+    # idle connections are closed so their threads don't wait forever
+    timeout = 30
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._send(200, self.server.pricing_server.metrics.to_prometheus().encode(),
+                       "text/plain; version=0.0.4")
+        elif self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": f"{self.path} not found"})
+
+    def do_POST(self):
+        if self.path != "/price":
+            self._send_json(404, {"error": f"{self.path} not found"})
+            return
+
+        pricing_server = self.server.pricing_server
+        metrics = pricing_server.metrics
+        started = time.perf_counter()
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length < 0:
+                # body can't be read, the connection is closed as the next request can't be found
+                self.close_connection = True
+                self._send_json(400, {"error": "Content-Length must not be negative"})
+                return
+            if length > MAX_BODY_SIZE:
+                self.close_connection = True
+                self._send_json(413, {"error": f"request body is larger than {MAX_BODY_SIZE} bytes"})
+                return
+            request = json.loads(self.rfile.read(length) or b"null")
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        future = pricing_server.submit(request)
+        if future is None:
+            metrics.counter("pricing_server_shed_total", "Requests answered with 503 as the server was full").inc()
+            self._send_json(503, {"error": "server is busy"}, {"Retry-After": "1"})
+            return
+
+        try:
+            self._send_json(200, pricing_server.result(future, pricing_server.request_timeout))
+        except TimeoutError:
+            metrics.counter("pricing_server_timeouts_total", "Requests not priced in time").inc()
+            self._send_json(504, {"error": "basket was not priced in time"})
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            CustomLogging.log_error(e)
+            self._send_json(500, {"error": "basket could not be priced"})
+        finally:
+            metrics.counter("pricing_server_requests_total", "Pricing requests received").inc()
+            metrics.histogram("pricing_server_request_seconds", "Time taken to answer a pricing request").observe(
+                time.perf_counter() - started)
+
+    def _send_json(self, status: int, body: dict, headers: dict = None) -> None:
+        self._send(status, json.dumps(body).encode(), "application/json", headers)
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        # length is always sent so that the connection can be kept alive
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # requests are counted in the metrics instead of being written to stderr
+        pass
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queue-size", type=int, default=64)
+    parser.add_argument("--cache-size", type=int, default=0, help="number of basket results cached, 0 for none")
+    parser.add_argument("--mode", choices=["threads", "processes"], default="threads",
+                        help="price baskets on worker threads (bounds concurrency only) or worker processes")
+    args = parser.parse_args(argv)
+
+    # initializing custom logging class
+    # pricing threads must not wait on the log file when a bad offer makes every basket log an error
+    CustomLogging(queued=True)
+    result_cache = BasketResultCache(args.cache_size) if args.cache_size > 0 else None
+    server = PricingServer(args.host, args.port, args.workers, args.queue_size, result_cache=result_cache,
+                           metrics=MetricsRegistry.enable(), mode=args.mode)
+    print(f"Pricing baskets on http://{server.address[0]}:{server.address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
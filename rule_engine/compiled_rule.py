@@ -0,0 +1,73 @@
+import operator
+from typing import List
+
+from basket.basket_state import BasketState
+from logs.logging import CustomLogging
+from rule_engine.condition_rule import ConditionRule
+from rule_engine.custom_operator import CustomOperator
+
+
+class CompiledRule:
+    """
+    This class represents the conditions of an offer compiled once into a short-circuiting predicate
+
+    RuleInferenceEngine.all_conditions_satisfy interprets the conditions on every call, compiling resolves the
+    operator of each condition up front so checking a basket item is a loop over (comparison, quantity) pairs
+    which stops at the first condition not satisfied
+
+    Interpretation of the operators is the same as RuleInferenceEngine:
+        CustomOperator.Equal - RuleInferenceEngine.equal(condition quantity, purchased quantity)
+        CustomOperator.EqualOrGreater - RuleInferenceEngine.equal_or_greater(condition quantity, purchased quantity)
+    Conditions with any other operator are ignored
+        ...
+    Attributes
+    ----------
+    _checks : tuple
+        (comparison, required quantity) of each condition
+    """
+
+    # comparison used for each operator, arguments are condition quantity and purchased quantity
+    OPERATORS = {CustomOperator.Equal: operator.eq,
+                 CustomOperator.EqualOrGreater: operator.ge}
+
+    # slots are used for faster attribute access and space saving in memory resources
+    __slots__ = ['_checks']
+
+    def __init__(self, conditions: List[ConditionRule]):
+        checks = []
+        for condition in conditions or ():
+            comparison = CompiledRule.OPERATORS.get(condition.operator)
+            if comparison is not None:
+                checks.append((comparison, condition.quantity))
+        self._checks = tuple(checks)
+
+    def __len__(self):
+        return len(self._checks)
+
+    def satisfied(self, basket: BasketState) -> bool:
+        """
+        Checks if all conditions are satisfied by the purchased quantity of the basket item
+        :param basket: basket item the conditions are checked on
+        :return: True if all conditions are satisfied
+        """
+        quantity = basket.purchased_quantity
+        try:
+            for comparison, required_quantity in self._checks:
+                if not comparison(required_quantity, quantity):
+                    return False
+            return True
+        except Exception:
+            return self._satisfied_skipping_errors(quantity)
+
+    def _satisfied_skipping_errors(self, quantity) -> bool:
+        # same as RuleInferenceEngine, a condition which can't be checked is logged and left out
+        assessment = []
+        for comparison, required_quantity in self._checks:
+            try:
+                assessment.append(comparison(required_quantity, quantity))
+            except Exception as e:
+                CustomLogging.log_error(e)
+        return all(assessment)
+
+    def __repr__(self):
+        return f"CompiledRule: _checks {self._checks}"
@@ -1,6 +1,7 @@
 from typing import List
 from basket.basket_state import BasketState
 from logs.logging import CustomLogging
+from rule_engine.compiled_rule import CompiledRule
 from rule_engine.condition_rule import ConditionRule
 from rule_engine.custom_operator import CustomOperator
 
@@ -22,6 +23,15 @@ class RuleInferenceEngine:
     def equal_or_greater(value, required_value) -> bool:
         return value >= required_value
 
+    @staticmethod
+    def compile_conditions(conditions: List[ConditionRule]) -> CompiledRule:
+        """
+        Compiles the conditions of an offer once so they can be checked on many baskets without interpreting them
+        :param conditions: conditions of the offer
+        :return: compiled conditions, CompiledRule.satisfied gives the same result as all_conditions_satisfy
+        """
+        return CompiledRule(conditions)
+
     @staticmethod
     def all_conditions_satisfy(conditions: List[ConditionRule], basket: BasketState) -> bool:
         assessment = []
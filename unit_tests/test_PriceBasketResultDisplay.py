@@ -1,6 +1,9 @@
+import csv
+import io
+import json
 import unittest
-from price_basket_result_display.PriceBasketResultDisplay import PriceBasketResultDisplay
-from pricebasket.discount_product_detail import DiscountProductDetail
+from price_basket_result_display.PriceBasketResultDisplay import BulkResultRenderer, PriceBasketResultDisplay
+from pricebasket.discount_product_detail import DiscountProductDetail, PenceDiscountProductDetail
 
 
 class TestPriceBasketResultDisplay(unittest.TestCase):
@@ -24,6 +27,59 @@ class TestPriceBasketResultDisplay(unittest.TestCase):
 
         self.assertNotEqual(expected, output)
 
+
+class CountingStream(io.StringIO):
+
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        return super().write(text)
+
+
+class TestBulkResultRenderer(unittest.TestCase):
+
+    def setUp(self):
+        self.results = [("3.10", "3.00", [DiscountProductDetail('apples', 10, '10p')]),
+                        ("0.80", "0.80", []),
+                        ("5.30", "4.10", [PenceDiscountProductDetail('apples', 10, 20),
+                                          PenceDiscountProductDetail('bread, "white"', 50, 100)])]
+
+    def render(self, output_format, out=None):
+        out = io.StringIO() if out is None else out
+        count = BulkResultRenderer(out, output_format, buffer_size=2).write_all(self.results, ["a", "b", "c"])
+        self.assertEqual(3, count)
+        return out.getvalue()
+
+    def test_text_receipts_as_displayed(self):
+        expected = "".join(repr(PriceBasketResultDisplay(sub_total, discounted_items, total)) + "\n"
+                           for sub_total, total, discounted_items in self.results)
+        self.assertEqual(expected, self.render("text"))
+
+    def test_json_lines(self):
+        expected = [json.dumps(dict({"id": basket_id},
+                                    **PriceBasketResultDisplay(sub_total, discounted_items, total).to_dict()))
+                    for basket_id, (sub_total, total, discounted_items) in zip("abc", self.results)]
+        self.assertEqual(expected, self.render("jsonl").splitlines())
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(self.render("csv"))))
+        self.assertEqual(["id", "subtotal", "total", "discounts"], rows[0])
+        self.assertEqual(["b", "0.80", "0.80", ""], rows[2])
+        self.assertEqual(["c", "5.30", "4.10", 'Apples 10 % off: -20p; Bread, "white" 50 % off: -£1.00'], rows[3])
+
+    def test_buffered_writes_to_binary_stream(self):
+        out = io.BytesIO()
+        BulkResultRenderer(out, "text").write_all(self.results)
+        self.assertEqual(self.render("text").encode("utf-8"), out.getvalue())
+
+        stream = CountingStream()
+        self.render("jsonl", stream)
+        # three results written in two writes of at most two results
+        self.assertEqual(2, stream.writes)
+
     if __name__ == '__main__':
         # begin the unittest.main()
         unittest.main()
@@ -17,6 +17,19 @@ class TestRuleEngine(unittest.TestCase):
         c1 = ConditionRule(CustomOperator.Equal, "3944c2df-6a87-46e6-86a4-da45b0d371d3", 3)
         self.assertEqual(False, RuleInferenceEngine.all_conditions_satisfy([c1], basket))
 
+    def test_compiled_conditions_same_as_all_conditions_satisfy(self):
+        product_id = "3944c2df-6a87-46e6-86a4-da45b0d371d3"
+        condition_lists = [[], [ConditionRule(CustomOperator.Equal, product_id, 2)],
+                           [ConditionRule(CustomOperator.EqualOrGreater, product_id, 3)],
+                           [ConditionRule(CustomOperator.Equal, product_id, 2),
+                            ConditionRule(CustomOperator.EqualOrGreater, product_id, 2)]]
+        for conditions in condition_lists:
+            compiled_rule = RuleInferenceEngine.compile_conditions(conditions)
+            for quantity in range(5):
+                basket = BasketState("soup", quantity, BilledState.Unprocessed)
+                self.assertEqual(RuleInferenceEngine.all_conditions_satisfy(conditions, basket),
+                                 compiled_rule.satisfied(basket))
+
     if __name__ == '__main__':
         # begin the unittest.main()
         unittest.main()
@@ -0,0 +1,60 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from main import update_inventory_async
+from mock_services.async_dummy_api import AsyncDummyApi
+from pricebasket.catalog_snapshot import CACHE_DIRECTORY, CART_PRODUCTS_CACHE, CatalogSnapshot
+
+
+class TestAsyncUpdateInventory(unittest.TestCase):
+
+    def setUp(self):
+        # the update runs on a copy of the cache
+        self.directory = os.path.join(tempfile.mkdtemp(), 'Cache')
+        shutil.copytree(CACHE_DIRECTORY, self.directory)
+        self.cache_stat = os.stat(CART_PRODUCTS_CACHE)
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.directory))
+        # the project cache is not modified
+        self.assertEqual(self.cache_stat.st_mtime_ns, os.stat(CART_PRODUCTS_CACHE).st_mtime_ns)
+
+    def test_fetches_run_concurrently(self):
+        api = AsyncDummyApi(products_latency=0.2, price_list_latency=0.2, offers_latency=0.2)
+        started = time.perf_counter()
+        timings = asyncio.run(update_inventory_async(api, cache_directory=self.directory))
+        elapsed = time.perf_counter() - started
+
+        self.assertIsNotNone(timings)
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(1, CatalogSnapshot.read_version(os.path.join(self.directory, 'cartProducts.pkl')) -
+                         CatalogSnapshot.read_version(CART_PRODUCTS_CACHE))
+
+    def test_slow_service_times_out(self):
+        api = AsyncDummyApi(offers_latency=10)
+        started = time.perf_counter()
+        timings = asyncio.run(update_inventory_async(api, timeout=0.1, cache_directory=self.directory))
+
+        # cached offers are used for the service which timed out
+        self.assertIsNotNone(timings)
+        self.assertLess(time.perf_counter() - started, 1)
+
+    def test_cancel_cancels_fetches(self):
+        async def cancel_update():
+            task = asyncio.ensure_future(update_inventory_async(AsyncDummyApi(10, 10, 10),
+                                                               cache_directory=self.directory))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            # no fetch is left running once the update is cancelled
+            return [x for x in asyncio.all_tasks() if x is not asyncio.current_task()]
+
+        self.assertEqual([], asyncio.run(cancel_update()))
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()
@@ -1,5 +1,7 @@
 import unittest
 from basket.basket_state import BasketState, BilledState
+from basket.sku_basket import SkuBasket
+from pricebasket.price_basket import PriceBasket
 
 
 class TestBasketState(unittest.TestCase):
@@ -19,6 +21,24 @@ class TestBasketState(unittest.TestCase):
     def test_get_products_in_basket_state_method_case3(self):
         self.assertNotEqual([], BasketState.get_products_in_basket_state(["apples", "apples", "bread"]))
 
+    def test_get_products_in_basket_state_method_case4(self):
+        output = BasketState.get_products_in_basket_state(x for x in ["soup", "bread", "soup"])
+        self.assertEqual([("soup", 2), ("bread", 1)], [(x.product_description, x.purchased_quantity) for x in output])
+
+    def test_sku_basket(self):
+        basket = SkuBasket(x for x in ["apples"] * 20000 + ["milk", "bread"])
+        basket.add("milk", 2)
+        self.assertEqual(3, len(basket))
+        self.assertEqual(3, basket.get_quantity("milk"))
+        self.assertEqual(20004, basket.total_quantity())
+        self.assertEqual(basket, SkuBasket.from_quantities([("apples", 20000), ("milk", 3), ("bread", 1)]))
+
+    def test_sku_basket_to_basket_states(self):
+        basket = SkuBasket(["apples", "milk", "bread"])
+        states = basket.to_basket_states()
+        self.assertTrue(all(x.billing_state == BilledState.Unprocessed for x in states))
+        self.assertEqual(('3.10', '3.00'), PriceBasket().price_basket(states)[:2])
+
     if __name__ == '__main__':
         # begin the unittest.main()
         unittest.main()
\ No newline at end of file
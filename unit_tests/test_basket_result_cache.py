@@ -0,0 +1,97 @@
+import datetime as dt
+import os
+import shutil
+import tempfile
+import unittest
+from basket.basket_state import BasketState, BilledState
+from mock_services.change_set import ChangeSet
+from mock_services.offer import OfferFlat
+from pricebasket.basket_result_cache import BasketResultCache
+from pricebasket.cart_product import CartProduct
+from pricebasket.catalog_snapshot import CatalogSnapshot
+from pricebasket.price_basket import PriceBasket
+from pricebasket.two_phase_price_basket import TwoPhasePriceBasket
+
+BREAD = "a7c77b26-a41b-4ff7-ae8d-d8ec312eddae"
+
+
+class TestBasketResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cartProducts.pkl')
+        shutil.copy('Cache/cartProducts.pkl', self.path)
+        self.snapshot = CatalogSnapshot(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_result_reused(self):
+        result_cache = BasketResultCache()
+        price_basket = PriceBasket(self.snapshot, result_cache)
+        first = price_basket.price_basket(BasketState.get_products_in_basket_state(["soup", "soup", "bread"]))
+
+        basket = BasketState.get_products_in_basket_state(["soup", "soup", "bread"])
+        second = price_basket.price_basket(basket)
+        self.assertEqual(('0.80', '0.40'), second[:2])
+        self.assertEqual(str(first[2]), str(second[2]))
+        self.assertTrue(all(x.billing_state == BilledState.Processed for x in basket))
+        self.assertEqual(1, result_cache.hits)
+        self.assertEqual(1, result_cache.misses)
+
+    def test_order_of_products(self):
+        # bread has an offer of its own, PriceBasket gives another total when bread is entered first
+        offer = OfferFlat("flat-bread", "Bread 10% off", BREAD, dt.datetime(2022, 2, 12), dt.datetime(2022, 3, 12),
+                          True, 10)
+        CartProduct.apply_change_set(ChangeSet(1, offers=[offer]), self.snapshot)
+        expected = PriceBasket(self.snapshot).price_basket(
+            BasketState.get_products_in_basket_state(["bread", "soup", "soup"]))
+        self.assertEqual(('0.80', '0.32'), expected[:2])
+
+        result_cache = BasketResultCache()
+        price_basket = PriceBasket(self.snapshot, result_cache)
+        price_basket.price_basket(BasketState.get_products_in_basket_state(["soup", "soup", "bread"]))
+        result = price_basket.price_basket(BasketState.get_products_in_basket_state(["bread", "soup", "soup"]))
+        self.assertEqual(expected[:2], result[:2])
+        self.assertEqual(0, result_cache.hits)
+
+        # two phase pricing gives the same result in any order
+        price_basket = TwoPhasePriceBasket(self.snapshot, result_cache)
+        first = price_basket.price_basket(BasketState.get_products_in_basket_state(["soup", "soup", "bread"]))
+        second = price_basket.price_basket(BasketState.get_products_in_basket_state(["bread", "soup", "soup"]))
+        self.assertEqual(first[:2], second[:2])
+        self.assertEqual(1, result_cache.hits)
+
+    def test_discounted_items_not_shared(self):
+        price_basket = PriceBasket(self.snapshot, BasketResultCache())
+        first = price_basket.price_basket(BasketState.get_products_in_basket_state(["apples"]))
+        first[2][0].discount_in_currency = "changed"
+        second = price_basket.price_basket(BasketState.get_products_in_basket_state(["apples"]))
+        second[2][0].discount_in_currency = "changed again"
+        third = price_basket.price_basket(BasketState.get_products_in_basket_state(["apples"]))
+        self.assertEqual("[Apples 10 % off: -10p]", str(third[2]))
+
+    def test_least_recently_used_evicted(self):
+        result_cache = BasketResultCache(2)
+        price_basket = PriceBasket(self.snapshot, result_cache)
+        for items in [["milk"], ["bread"], ["milk"], ["apples"], ["milk"], ["bread"]]:
+            price_basket.price_basket(BasketState.get_products_in_basket_state(items))
+        self.assertEqual(2, len(result_cache))
+        self.assertEqual(2, result_cache.evictions)
+        self.assertEqual(2, result_cache.hits)
+
+    def test_invalidated_when_catalog_rebuilt(self):
+        result_cache = BasketResultCache()
+        PriceBasket(self.snapshot, result_cache).price_basket(BasketState.get_products_in_basket_state(["milk"]))
+
+        # prepare_cart_products writes a new version of the cache
+        CatalogSnapshot.write_version(self.path)
+        price_basket = PriceBasket(self.snapshot, result_cache)
+        price_basket.price_basket(BasketState.get_products_in_basket_state(["milk"]))
+        self.assertEqual(0, result_cache.hits)
+        self.assertEqual(2, result_cache.misses)
+        self.assertEqual(1, len(result_cache))
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()
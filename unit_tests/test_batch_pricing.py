@@ -0,0 +1,48 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from main import main, price_batch
+
+
+class TestBatchPricing(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.in_path = os.path.join(self.directory, 'in.jsonl')
+        self.out_path = os.path.join(self.directory, 'out.jsonl')
+        with open(self.in_path, 'w') as in_file:
+            for i in range(100):
+                in_file.write(json.dumps({"id": i, "items": ["Apples", "Milk", "Bread"]}) + "\n")
+            in_file.write("\n")
+            in_file.write(json.dumps({"items": ["soup", "soup", "bread"]}) + "\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read_results(self):
+        with open(self.out_path, 'r') as out_file:
+            return [json.loads(line) for line in out_file]
+
+    def test_price_batch(self):
+        self.assertEqual(101, price_batch(self.in_path, self.out_path, chunksize=8))
+        results = self.read_results()
+        self.assertEqual({"id": 0, "subtotal": "3.10", "total": "3.00", "discounts": ["Apples 10 % off: -10p"]},
+                         results[0])
+        self.assertEqual(list(range(100)), [x["id"] for x in results[:100]])
+        # id defaults to the line number
+        self.assertEqual({"id": 102, "subtotal": "0.80", "total": "0.40", "discounts": ["Bread 50 % off: -40p"]},
+                         results[100])
+
+    def test_price_batch_on_threads(self):
+        price_batch(self.in_path, self.out_path, "threads", 4, 8)
+        self.assertEqual(list(range(100)) + [102], [x["id"] for x in self.read_results()])
+
+    def test_main_batch(self):
+        self.assertEqual(0, main(["--batch", self.in_path, "--out", self.out_path]))
+        self.assertEqual(101, len(self.read_results()))
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+from pricebasket.cart_product import CartProduct
+
+
+class TestCartProduct(unittest.TestCase):
+
+    def test_index_offers_by_product_same_as_filter(self):
+        products = CartProduct.get_updated_products()
+        offers = CartProduct.get_updated_offers()
+        offers_by_product = CartProduct.index_offers_by_product(offers)
+
+        for product in products:
+            self.assertEqual(CartProduct.get_offer_by_product(product.product_id, offers),
+                             offers_by_product.get(product.product_id, ()))
+
+    def test_index_prices_by_product_same_as_filter(self):
+        price_list = CartProduct.get_updated_price_list()
+        prices_by_product = CartProduct.index_prices_by_product(price_list)
+
+        for price in price_list:
+            self.assertIs(CartProduct.get_price_by_product(price.product_id, price_list),
+                          prices_by_product[price.product_id])
+
+    def test_index_empty(self):
+        self.assertEqual({}, CartProduct.index_offers_by_product(None))
+        self.assertEqual({}, CartProduct.index_prices_by_product([]))
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()
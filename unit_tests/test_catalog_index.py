@@ -0,0 +1,32 @@
+import unittest
+from pricebasket.cart_product import CartProduct
+from pricebasket.catalog_index import CatalogIndex
+from pricebasket.price_basket import PriceBasket
+
+
+class TestCatalogIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.cart_products = [CartProduct("1", "soup", "drinks", 0.65, "tin"),
+                              CartProduct("2", "bread", "bakery", 0.80, "loaf"),
+                              CartProduct("3", "Milk", "bakery", 1.30, "bottle"),
+                              CartProduct("4", "apples", "fruit", 1.00, "bag")]
+        self.index = CatalogIndex(self.cart_products)
+
+    def test_get_product_by_id(self):
+        self.assertIs(self.cart_products[1], self.index.get_product_by_id("2"))
+        self.assertIsNone(self.index.get_product_by_id("5"))
+
+    def test_get_product_by_description(self):
+        self.assertIs(self.cart_products[2], self.index.get_product_by_description("MILK"))
+        self.assertIs(self.cart_products[2], CartProduct.get_product_by_description("milk", self.index))
+        self.assertIsNone(self.index.get_product_by_description("mil"))
+
+    def test_match_description_same_as_linear_scan(self):
+        for description in ["soup", "apples", "milk", "soups", "breadsoup", "bread soup", "Apples", "tea", ""]:
+            expected = PriceBasket.get_product_by_description(description, self.cart_products)
+            self.assertIs(expected, self.index.match_description(description))
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()
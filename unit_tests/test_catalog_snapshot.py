@@ -0,0 +1,46 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from pricebasket.cart_product import CartProduct
+from pricebasket.catalog_snapshot import CatalogSnapshot
+from pricebasket.price_basket import PriceBasket
+
+
+class TestCatalogSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cartProducts.pkl')
+        shutil.copy('Cache/cartProducts.pkl', self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_snapshot_loaded_once(self):
+        snapshot = CatalogSnapshot(self.path)
+        PriceBasket(snapshot)
+        PriceBasket(snapshot)
+        self.assertEqual(1, snapshot.load_count)
+        self.assertEqual(1, snapshot.hit_count)
+        self.assertEqual(4, len(snapshot.cart_products))
+
+    def test_snapshot_reloaded_when_version_changes(self):
+        snapshot = CatalogSnapshot(self.path)
+        snapshot.get()
+        with open(self.path, 'wb') as out_file:
+            pickle.dump([CartProduct("1", "tea", "drinks", 1.5, "box")], out_file)
+        CatalogSnapshot.write_version(self.path)
+
+        cart_products, catalog_index = snapshot.get()
+        self.assertEqual(2, snapshot.load_count)
+        self.assertEqual(1, snapshot.version)
+        self.assertEqual("tea", catalog_index.get_product_by_id("1").product_description)
+
+    def test_shared_snapshot(self):
+        self.assertIs(CatalogSnapshot.shared(self.path), CatalogSnapshot.shared(self.path))
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()
@@ -0,0 +1,137 @@
+import datetime as dt
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from basket.basket_state import BasketState
+from mock_services.change_set import ChangeSet
+from mock_services.offer import OfferCategory, OfferFlat
+from mock_services.price import Price
+from mock_services.product import Product
+from pricebasket.cart_product import CartProduct
+from pricebasket.catalog_index import CatalogIndex
+from pricebasket.catalog_snapshot import CatalogSnapshot
+from pricebasket.columnar_catalog import ColumnarCatalog
+from pricebasket.optimal_offer_price_basket import OptimalOfferPriceBasket
+from pricebasket.price_basket import PriceBasket
+from pricebasket.two_phase_price_basket import TwoPhasePriceBasket
+
+try:
+    from pricebasket.vectorized_price_basket import VectorizedPriceBasket
+    import numpy
+except ImportError:
+    numpy = None
+
+START = dt.datetime(2022, 2, 12)
+END = dt.datetime(2022, 3, 12)
+
+
+class TestCategoryOffers(unittest.TestCase):
+
+    def setUp(self):
+        self.apples_offer = OfferFlat(1, "Apples 10% off", "1", START, END, True, 10)
+        self.fruit_offer = OfferCategory(2, "20% off all fruit", "fruit", START, END, True, 20)
+        self.apples = CartProduct("1", "apples", "fruit", 1.00, "bag", (self.apples_offer,))
+        self.oranges = CartProduct("2", "oranges", "fruit", 0.50, "bag", ())
+        self.bread = CartProduct("3", "bread", "bakery", 0.80, "loaf", ())
+        self.cart_products = (self.apples, self.oranges, self.bread)
+
+    def price(self, price_basket, items, priced_at=None):
+        return price_basket.price_basket(BasketState.get_products_in_basket_state(items), priced_at)
+
+    def test_category_offers_found_by_product_type(self):
+        catalog_index = CatalogIndex(self.cart_products, [self.fruit_offer])
+
+        self.assertEqual(("1", "2"), catalog_index.get_product_ids_by_type("fruit"))
+        self.assertEqual((self.fruit_offer,), catalog_index.get_offers_at(self.oranges, None))
+        # offers of the product take precedence over the offers of its category
+        self.assertEqual((self.apples_offer,), catalog_index.get_offers_at(self.apples, None))
+        self.assertEqual((), catalog_index.get_offers_at(self.bread, None))
+        self.assertEqual((self.fruit_offer,), catalog_index.get_offers_at(self.oranges, dt.datetime(2022, 3, 1)))
+        self.assertEqual((), catalog_index.get_offers_at(self.oranges, dt.datetime(2022, 4, 1)))
+        # cart products don't carry the offer
+        self.assertEqual((), self.oranges.offers)
+        self.assertIn(self.fruit_offer, catalog_index.get_offers())
+
+    def test_engines_price_category_offers(self):
+        catalog_index = CatalogIndex(self.cart_products, [self.fruit_offer])
+        for cls in [PriceBasket, TwoPhasePriceBasket, OptimalOfferPriceBasket]:
+            sub_total, total, discounted_items = self.price(cls.from_catalog_index(catalog_index),
+                                                            ["apples", "oranges", "oranges", "bread"])
+            self.assertEqual(('2.80', '2.50'), (sub_total, total), cls.__name__)
+            self.assertEqual(2, len(discounted_items), cls.__name__)
+
+    def test_category_offer_when_own_offer_does_not_apply(self):
+        # soup only carries the OfferGroup on bread, which does not apply without bread
+        drinks_offer = OfferCategory(3, "20% off all drinks", "drinks", START, END, True, 20)
+        catalog_index = CatalogIndex(PriceBasket().cart_products, [drinks_offer])
+        for items, expected in [(["soup"], ("0.65", "0.52", ["Soup 20 % off: -13p"])),
+                                (["soup", "milk"], ("1.95", "1.82", ["Soup 20 % off: -13p"])),
+                                (["soup", "soup", "bread"], ("0.80", "0.40", ["Bread 50 % off: -40p"]))]:
+            for cls in [PriceBasket, TwoPhasePriceBasket, OptimalOfferPriceBasket]:
+                sub_total, total, discounted_items = self.price(cls.from_catalog_index(catalog_index), items)
+                # soup consumed by the offer on bread is billed by OptimalOfferPriceBasket only
+                cls_expected = ("2.10", "1.70", expected[2]) if cls is OptimalOfferPriceBasket and \
+                    "bread" in items else expected
+                self.assertEqual(cls_expected, (sub_total, total, [str(x) for x in discounted_items]),
+                                 (cls.__name__, items))
+
+            if numpy is not None:
+                engine = VectorizedPriceBasket(catalog_index.products, [drinks_offer])
+                result = engine.to_price_basket_results(engine.price_baskets(*engine.columns_from_baskets([items])))
+                self.assertEqual(expected, (result[0][0], result[0][1], [str(x) for x in result[0][2]]), items)
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_vectorized_price_basket(self):
+        engine = VectorizedPriceBasket(self.cart_products, [self.fruit_offer])
+        result = engine.price_baskets(*engine.columns_from_baskets([["apples", "oranges", "oranges", "bread"]]))
+        self.assertEqual(('2.80', '2.50'), engine.to_price_basket_results(result)[0][:2])
+
+    def test_prepare_cart_products_saves_category_offers_once(self):
+        directory = tempfile.mkdtemp()
+        pickle_path = os.path.join(directory, 'cartProducts.pkl')
+        try:
+            products = [Product("1", "apples", "fruit", 0.0, "bag"), Product("2", "oranges", "fruit", 0.0, "bag")]
+            self.assertIsNotNone(CartProduct.prepare_cart_products(
+                products, [self.apples_offer, self.fruit_offer], [Price("1", 1.00), Price("2", 0.50)],
+                path=pickle_path))
+
+            with open(pickle_path, 'rb') as in_file:
+                cart_products = pickle.load(in_file)
+            self.assertEqual([1, 0], [len(x.offers) for x in cart_products])
+            self.assertEqual([2], [x.offer_id for x in CatalogSnapshot.read_category_offers(pickle_path)])
+
+            columnar_path = ColumnarCatalog.convert_pickle(pickle_path, os.path.join(directory, 'cartProducts.pbcat'))
+            for path in [pickle_path, columnar_path]:
+                snapshot = CatalogSnapshot(path)
+                self.assertEqual(('1.50', '1.30'), self.price(PriceBasket(snapshot), ["apples", "oranges"])[:2])
+                if path.endswith('.pbcat'):
+                    snapshot.catalog_index.close()
+
+            # offers on categories removed from the services are removed from the cache
+            CartProduct.prepare_cart_products(products, [self.apples_offer], [Price("1", 1.00), Price("2", 0.50)],
+                                              path=pickle_path)
+            self.assertEqual((), CatalogSnapshot.read_category_offers(pickle_path))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_change_set_updates_category_offers_only(self):
+        directory = tempfile.mkdtemp()
+        try:
+            snapshot = CatalogSnapshot(os.path.join(directory, 'cartProducts.pkl'))
+            snapshot.publish(self.cart_products, CatalogIndex(self.cart_products))
+
+            CartProduct.apply_change_set(ChangeSet(1, offers=[self.fruit_offer]), snapshot)
+            cart_products, catalog_index = snapshot.get()
+            self.assertIs(self.oranges, cart_products[1])
+            self.assertEqual((self.fruit_offer,), catalog_index.get_offers_at(cart_products[1], None))
+
+            CartProduct.apply_change_set(ChangeSet(2, removed_offer_ids=[2]), snapshot)
+            self.assertEqual((), snapshot.catalog_index.get_offers_at(cart_products[1], None))
+        finally:
+            shutil.rmtree(directory)
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()
@@ -0,0 +1,112 @@
+import datetime as dt
+import os
+import shutil
+import tempfile
+import unittest
+from basket.basket_state import BasketState
+from mock_services.change_set import ChangeSet
+from mock_services.offer import OfferFlat
+from mock_services.price import Price
+from mock_services.product import Product
+from pricebasket.cart_product import CartProduct
+from pricebasket.catalog_snapshot import CatalogSnapshot
+from pricebasket.columnar_catalog import ColumnarCatalog
+from pricebasket.price_basket import PriceBasket
+
+BREAD = "a7c77b26-a41b-4ff7-ae8d-d8ec312eddae"
+APPLES = "67e69f18-db75-464d-9cd1-a60183279f41"
+
+
+class TestChangeSet(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cartProducts.pkl')
+        shutil.copy('Cache/cartProducts.pkl', self.path)
+        self.snapshot = CatalogSnapshot(self.path)
+        self.snapshot.get()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def price(self, items):
+        return PriceBasket(self.snapshot).price_basket(BasketState.get_products_in_basket_state(items))
+
+    def test_price_change(self):
+        cart_products, _ = self.snapshot.get()
+        version = CartProduct.apply_change_set(ChangeSet(1, prices=[Price(BREAD, 0.9)]), self.snapshot)
+
+        self.assertEqual(self.snapshot.version, version)
+        self.assertEqual(1, self.snapshot.change_set_version)
+        self.assertEqual(("0.90", "0.90"), self.price(['bread'])[:2])
+        # cart products in use are not modified
+        self.assertEqual(0.8, cart_products[1].price)
+
+    def test_offer_and_product_changes(self):
+        offer = OfferFlat("flat-bread", "Bread 25% off", BREAD, dt.datetime(2022, 2, 12), dt.datetime(2022, 3, 12),
+                          True, 25)
+        CartProduct.apply_change_set(ChangeSet(1, products=[Product("tea-id", "tea", "drinks", 1.5, "box")],
+                                               offers=[offer]), self.snapshot)
+        self.assertEqual(("2.30", "2.10"), self.price(['bread', 'tea'])[:2])
+
+        CartProduct.apply_change_set(ChangeSet(2, removed_offer_ids=["flat-bread"], removed_product_ids=[APPLES]),
+                                     self.snapshot)
+        self.assertEqual(("0.80", "0.80"), self.price(['bread', 'apples'])[:2])
+        self.assertEqual(4, len(self.snapshot.cart_products))
+
+    def test_persisted_changes_not_reloaded(self):
+        CartProduct.apply_change_set(ChangeSet(1, prices=[Price(BREAD, 0.9)]), self.snapshot, persist=True)
+        self.assertEqual(("0.90", "0.90"), self.price(['bread'])[:2])
+        self.assertEqual(1, self.snapshot.load_count)
+        self.assertEqual(("0.90", "0.90"), self.price_from_new_snapshot(['bread'])[:2])
+        # files are written next to the cache and renamed
+        self.assertEqual([], [x for x in os.listdir(self.directory) if x.endswith('.tmp')])
+
+    def test_persist_in_background(self):
+        CartProduct.apply_change_set(ChangeSet(1, prices=[Price(BREAD, 0.9)]), self.snapshot)
+        CartProduct.apply_change_set(ChangeSet(2, prices=[Price(BREAD, 0.95)]), self.snapshot)
+        # changes are priced with before they are written
+        self.assertEqual(("0.95", "0.95"), self.price(['bread'])[:2])
+
+        self.snapshot.persist_in_background()
+        self.snapshot.flush()
+        self.assertFalse(self.snapshot.persist())
+        self.assertEqual(1, self.snapshot.load_count)
+        self.assertEqual(("0.95", "0.95"), self.price(['bread'])[:2])
+
+        # after a restart changes are fetched from the last change set applied
+        snapshot = CatalogSnapshot(self.path)
+        self.assertEqual(("0.95", "0.95"), PriceBasket(snapshot).price_basket(
+            BasketState.get_products_in_basket_state(['bread']))[:2])
+        self.assertEqual(2, snapshot.change_set_version)
+
+    def price_from_new_snapshot(self, items):
+        return PriceBasket(CatalogSnapshot(self.path)).price_basket(BasketState.get_products_in_basket_state(items))
+
+    def test_changes_to_columnar_catalog(self):
+        path = ColumnarCatalog.convert_pickle(self.path, os.path.join(self.directory, 'cartProducts.pbcat'))
+        snapshot = CatalogSnapshot(path)
+        CatalogSnapshot.write_version(self.path)
+        version = CartProduct.apply_change_set(ChangeSet(1, prices=[Price(BREAD, 0.9)]), snapshot, persist=True)
+
+        self.assertEqual(snapshot.version, version)
+        self.assertEqual(("0.90", "0.90"), PriceBasket(snapshot).price_basket(
+            BasketState.get_products_in_basket_state(['bread']))[:2])
+        # file is still a columnar catalog with its own version, the cache file is not changed
+        catalog = ColumnarCatalog(path)
+        self.assertEqual(0.9, catalog.get_product_by_id(BREAD).price)
+        catalog.close()
+        self.assertEqual(1, CatalogSnapshot.read_version(path))
+        self.assertEqual(1, CatalogSnapshot.read_version(self.path))
+        self.assertEqual(("0.80", "0.80"), self.price_from_new_snapshot(['bread'])[:2])
+
+    def test_merge_later_changes_win(self):
+        merged = ChangeSet.merge([ChangeSet(2, products=[Product("1", "tea")]), ChangeSet(1, removed_product_ids=["1"]),
+                                  ChangeSet(3, prices=[Price("1", 1.0)])])
+        self.assertEqual(3, merged.version)
+        self.assertEqual([], merged.removed_product_ids)
+        self.assertEqual(1, len(merged.products))
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()
@@ -0,0 +1,60 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from basket.basket_state import BasketState
+from pricebasket.catalog_snapshot import CatalogSnapshot
+from pricebasket.columnar_catalog import ColumnarCatalog
+from pricebasket.price_basket import PriceBasket
+
+
+class TestColumnarCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = ColumnarCatalog.convert_pickle('Cache/cartProducts.pkl',
+                                                   os.path.join(self.directory, 'cartProducts.pbcat'))
+        self.catalog = ColumnarCatalog(self.path)
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.directory)
+
+    def test_same_cart_products_as_pickle(self):
+        with open('Cache/cartProducts.pkl', 'rb') as in_file:
+            cart_products = pickle.load(in_file)
+
+        self.assertEqual(len(cart_products), len(self.catalog))
+        for expected, output in zip(cart_products, self.catalog):
+            self.assertEqual((expected.product_id, expected.product_description, expected.product_type,
+                              expected.price, expected.product_unit),
+                             (output.product_id, output.product_description, output.product_type,
+                              output.price, output.product_unit))
+            self.assertEqual([(x.offer_id, x.offer_type, x.product_id, x.discount_percent, x.start_date)
+                              for x in expected.offers],
+                             [(x.offer_id, x.offer_type, x.product_id, x.discount_percent, x.start_date)
+                              for x in output.offers])
+
+    def test_lookups(self):
+        bread = self.catalog.get_product_by_id("a7c77b26-a41b-4ff7-ae8d-d8ec312eddae")
+        self.assertEqual("bread", bread.product_description)
+        self.assertIs(bread, self.catalog.get_product_by_description("Bread"))
+        self.assertIs(bread, self.catalog.match_description("breads"))
+        self.assertIsNone(self.catalog.get_product_by_id("missing"))
+        self.assertIsNone(self.catalog.match_description("tea"))
+
+    def test_price_basket_with_columnar_catalog(self):
+        snapshot = CatalogSnapshot(self.path)
+        for items, expected in [(['apples', 'milk', 'bread'], ("3.10", "3.00")),
+                                (['soup', 'soup', 'bread'], ("0.80", "0.40"))]:
+            output = PriceBasket(snapshot).price_basket(BasketState.get_products_in_basket_state(items))
+            self.assertEqual(expected, output[:2])
+
+        output = PriceBasket(snapshot).price_baskets([BasketState.get_products_in_basket_state(['apples'])],
+                                                     mode="processes", workers=1)
+        self.assertEqual(("1.00", "0.90"), next(output)[:2])
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()
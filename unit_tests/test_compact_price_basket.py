@@ -0,0 +1,71 @@
+import io
+import pickle
+import unittest
+from basket.basket_state import BasketState
+from price_basket_result_display.PriceBasketResultDisplay import BulkResultRenderer, PriceBasketResultDisplay
+from pricebasket.compact_price_basket import CompactPriceBasket
+from pricebasket.price_basket import PriceBasket
+from pricebasket.pricing_result import PricingResult
+
+BASKETS = [['apples', 'milk', 'bread'], ['bread', 'bread'], ['soup', 'soup', 'bread'], ['milk'],
+           ['apples', 'apples', 'soup', 'milk'], []]
+
+
+class TestCompactPriceBasket(unittest.TestCase):
+
+    def price(self, price_basket, items):
+        return price_basket.price_basket(BasketState.get_products_in_basket_state(items))
+
+    def price_result(self, items):
+        return CompactPriceBasket().price_basket_result(BasketState.get_products_in_basket_state(items))
+
+    def test_result_holds_pence_and_offer_ids(self):
+        result = self.price_result(['apples', 'milk', 'bread'])
+
+        self.assertIsInstance(result, PricingResult)
+        self.assertEqual((310, 300, 10), (result.sub_total_pence, result.total_pence, result.discount_pence))
+        self.assertEqual(1, len(result.offer_ids))
+        self.assertEqual(('apples', result.offer_ids[0], 10, 10), result.discounts[0])
+        self.assertEqual(('3.10', '3.00', ['Apples 10 % off: -10p']), (result.sub_total, result.total,
+                                                                        result.discount_lines()))
+
+    def test_price_basket_same_as_price_basket(self):
+        for items in BASKETS:
+            expected = self.price(PriceBasket(), items)
+            sub_total, total, discounted_items = CompactPriceBasket().price_basket(
+                BasketState.get_products_in_basket_state(items))
+            self.assertEqual((expected[0], expected[1], list(map(repr, expected[2]))),
+                             (sub_total, total, list(map(repr, discounted_items))), items)
+
+            result = self.price_result(items)
+            self.assertEqual(repr(PriceBasketResultDisplay(*expected[:1], expected[2], expected[1])),
+                             repr(PriceBasketResultDisplay.from_result(result)))
+
+    def test_price_baskets_same_as_price_basket(self):
+        expected = [self.price(PriceBasket(), x) for x in BASKETS]
+        results = CompactPriceBasket().price_baskets(BasketState.get_products_in_basket_state(x) for x in BASKETS)
+        for (sub_total, total, discounted_items), items in zip(results, expected):
+            self.assertEqual((items[0], items[1], list(map(repr, items[2]))),
+                             (sub_total, total, list(map(repr, discounted_items))))
+
+    def test_aggregation_and_pickling(self):
+        results = [self.price_result(x) for x in BASKETS]
+        expected = [self.price(PriceBasket(), x)[1] for x in BASKETS]
+        self.assertEqual(expected, [x.total for x in results])
+        self.assertEqual(1005, sum(x.total_pence for x in results))
+        self.assertEqual(results, pickle.loads(pickle.dumps(results)))
+
+    def test_bulk_rendering(self):
+        results = [self.price_result(x) for x in BASKETS]
+        expected = io.StringIO()
+        BulkResultRenderer(expected, "jsonl").write_all([x.to_tuple() for x in results], range(len(results)))
+
+        out = io.StringIO()
+        with BulkResultRenderer(out, "jsonl") as renderer:
+            for basket_id, result in enumerate(results):
+                renderer.write_result(result, basket_id)
+        self.assertEqual(expected.getvalue(), out.getvalue())
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()
@@ -0,0 +1,88 @@
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import time
+import unittest
+from logs.logging import CustomLogging, _DroppingQueueHandler
+
+
+class TestCustomLogging(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'app.log')
+        # handlers added by other tests write to the log file of the project
+        self.handlers = logging.getLogger().handlers[:]
+        logging.getLogger().handlers.clear()
+
+    def tearDown(self):
+        CustomLogging.stop()
+        logging.getLogger().handlers[:] = self.handlers
+        shutil.rmtree(self.directory)
+
+    def read_log(self):
+        with open(self.path, 'r') as log_file:
+            return log_file.read()
+
+    @staticmethod
+    def fail(message):
+        raise ValueError(message)
+
+    def log_failure(self, message):
+        try:
+            TestCustomLogging.fail(message)
+        except Exception as e:
+            CustomLogging.log_error(e)
+
+    def test_repeated_errors_are_rate_limited(self):
+        CustomLogging(queued=True, repeat_interval=60, path=self.path)
+        for _ in range(100):
+            self.log_failure("bad offer")
+        self.log_failure("other offer")
+        self.assertEqual(99, CustomLogging.suppressed_count())
+        CustomLogging.stop()
+
+        log = self.read_log()
+        self.assertEqual(2, log.count("Exception occured"))
+        self.assertEqual(1, log.count("ValueError: bad offer"))
+        self.assertIn("Traceback", log)
+
+    def test_repeats_counted_in_next_record(self):
+        CustomLogging(queued=True, repeat_interval=0.05, path=self.path)
+        for _ in range(3):
+            self.log_failure("bad offer")
+        self.assertEqual(2, CustomLogging.suppressed_count())
+        # waiting for the interval to pass
+        time.sleep(0.06)
+        self.log_failure("bad offer")
+        CustomLogging.stop()
+        self.assertIn("Exception occured (2 repeats suppressed)", self.read_log())
+
+    def test_configured_once(self):
+        for _ in range(3):
+            CustomLogging(path=self.path)
+        self.assertEqual(1, len(logging.getLogger().handlers))
+        self.log_failure("bad offer")
+
+        CustomLogging(queued=True, path=self.path)
+        CustomLogging(path=self.path)
+        self.assertEqual([CustomLogging._queue_handler], logging.getLogger().handlers)
+        self.log_failure("other offer")
+        CustomLogging.stop()
+
+        log = self.read_log()
+        self.assertEqual(1, log.count("ValueError: bad offer"))
+        self.assertEqual(1, log.count("ValueError: other offer"))
+
+    def test_records_dropped_when_queue_full(self):
+        handler = _DroppingQueueHandler(queue.Queue(1))
+        for i in range(5):
+            handler.handle(logging.LogRecord("root", logging.ERROR, __file__, 1, f"error {i}", None, None))
+        self.assertEqual(4, handler.dropped)
+        self.assertEqual("error 0", handler.queue.get_nowait().getMessage())
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()
@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from main import build_snapshot
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# seconds a cold start of --fast may take to price a basket, interpreter start included
+COLD_START_BUDGET = 2.0
+
+# modules only needed to refresh the inventory which --fast must not import
+DEFERRED_MODULES = ['asyncio', 'mock_services.dummy_api', 'mock_services.async_dummy_api', 'concurrent.futures']
+
+PROBE = """
+import sys
+import main
+status = main.main(sys.argv[1:])
+print(sorted(x for x in %r if x in sys.modules))
+exit(status)
+""" % (DEFERRED_MODULES,)
+
+
+class TestFastStartup(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.snapshot_path = os.path.join(self.directory, 'cartProducts.pbcat')
+        self.in_path = os.path.join(self.directory, 'in.jsonl')
+        self.out_path = os.path.join(self.directory, 'out.jsonl')
+        build_snapshot(self.snapshot_path)
+        # the cli runs in its own directory so that it logs and falls back to a copy of the cache
+        os.mkdir(os.path.join(self.directory, 'logs'))
+        os.mkdir(os.path.join(self.directory, 'Cache'))
+        shutil.copy(os.path.join(ROOT, 'Cache', 'cartProducts.pkl'), os.path.join(self.directory, 'Cache'))
+        with open(self.in_path, 'w') as in_file:
+            in_file.write(json.dumps({"id": "basket-1", "items": ["Apples", "Milk", "Bread"]}) + "\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def cache_signature(self):
+        cache = os.path.join(self.directory, 'Cache')
+        return {x: os.stat(os.path.join(cache, x)).st_mtime_ns for x in os.listdir(cache)}
+
+    def run_fast(self, *args):
+        started = time.perf_counter()
+        process = subprocess.run([sys.executable, "-c", PROBE, "--fast", "--batch", self.in_path,
+                                  "--out", self.out_path] + list(args),
+                                 cwd=self.directory, env=dict(os.environ, PYTHONPATH=ROOT),
+                                 capture_output=True, text=True, timeout=60)
+        return process, time.perf_counter() - started
+
+    def test_cold_start_within_budget(self):
+        cache = self.cache_signature()
+        process, elapsed = self.run_fast("--snapshot", self.snapshot_path)
+
+        self.assertEqual(0, process.returncode, process.stderr)
+        self.assertEqual("[]", process.stdout.strip())
+        self.assertLess(elapsed, COLD_START_BUDGET)
+        self.assertEqual(cache, self.cache_signature())
+        # nothing logged so the log file is never opened
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'logs', 'app.log')))
+        with open(self.out_path, 'r') as out_file:
+            self.assertEqual({"id": "basket-1", "subtotal": "3.10", "total": "3.00",
+                              "discounts": ["Apples 10 % off: -10p"]}, json.loads(out_file.readline()))
+
+    def test_missing_snapshot_uses_cache(self):
+        process, elapsed = self.run_fast("--snapshot", os.path.join(self.directory, 'missing.pbcat'))
+
+        self.assertEqual(0, process.returncode, process.stderr)
+        with open(self.out_path, 'r') as out_file:
+            self.assertEqual("3.00", json.loads(out_file.readline())["total"])
+        with open(os.path.join(self.directory, 'logs', 'app.log'), 'r') as log_file:
+            self.assertIn("missing.pbcat", log_file.read())
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()
@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+from basket.basket_state import BasketState
+from instrumentation.metrics_registry import MetricsRegistry, SnapshotWriter
+from pricebasket.basket_result_cache import BasketResultCache
+from pricebasket.catalog_snapshot import CatalogSnapshot
+from pricebasket.price_basket import PriceBasket
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.registry = MetricsRegistry.enable(MetricsRegistry())
+
+    def tearDown(self):
+        MetricsRegistry.disable()
+        shutil.rmtree(self.directory)
+
+    def test_nothing_recorded_when_disabled(self):
+        MetricsRegistry.disable()
+        PriceBasket().price_basket(BasketState.get_products_in_basket_state(["milk"]))
+        with MetricsRegistry.timed("disabled_seconds"):
+            pass
+        self.assertIsNone(MetricsRegistry.active())
+        self.assertIsNone(self.registry.get("pricebasket_baskets_total"))
+
+    def test_price_basket_recorded(self):
+        snapshot = CatalogSnapshot(CatalogSnapshot.shared().path)
+        price_basket = PriceBasket(snapshot, BasketResultCache())
+        for _ in range(2):
+            price_basket.price_basket(BasketState.get_products_in_basket_state(["soup", "soup", "bread"]))
+
+        self.assertEqual(2, self.registry.get("pricebasket_baskets_total").value)
+        self.assertEqual(2, self.registry.get("pricebasket_basket_seconds").count)
+        self.assertEqual(1, self.registry.get("pricebasket_result_cache_hits_total").value)
+        self.assertEqual(1, self.registry.get("pricebasket_result_cache_misses_total").value)
+        # soup and bread discounted by the offer on soup, which is then not looked up again
+        self.assertEqual(2, self.registry.get("pricebasket_catalog_lookups_total").value)
+        self.assertEqual(1, self.registry.get("pricebasket_rules_evaluated_total").value)
+
+    def test_price_baskets_recorded_in_worker_processes(self):
+        for mode in ["threads", "processes"]:
+            # threads update the billing state of the baskets given
+            baskets = [BasketState.get_products_in_basket_state(["apples", "milk"]) for _ in range(50)]
+            registry = MetricsRegistry.enable(MetricsRegistry())
+            results = list(PriceBasket().price_baskets(baskets, mode=mode, workers=2, chunksize=8))
+            self.assertEqual(50, len(results))
+            self.assertEqual(50, registry.get("pricebasket_baskets_total").value, mode)
+            self.assertEqual(50, registry.get("pricebasket_basket_seconds").count, mode)
+            self.assertEqual(100, registry.get("pricebasket_catalog_lookups_total").value, mode)
+
+    def test_histogram(self):
+        histogram = self.registry.histogram("latency_seconds", buckets=[0.1, 1])
+        for value in [0.05, 0.5, 0.5, 5]:
+            histogram.observe(value)
+        self.assertEqual([1, 3], histogram.cumulative_counts())
+        self.assertEqual(1, histogram.quantile(0.5))
+        self.assertIsNone(histogram.quantile(1))
+
+    def test_prometheus_format(self):
+        self.registry.counter("baskets_total", "Baskets priced").inc(3)
+        self.registry.histogram("latency_seconds", buckets=[0.1]).observe(0.05)
+        self.assertEqual("# HELP baskets_total Baskets priced\n"
+                         "# TYPE baskets_total counter\n"
+                         "baskets_total 3\n"
+                         "# TYPE latency_seconds histogram\n"
+                         'latency_seconds_bucket{le="0.1"} 1\n'
+                         'latency_seconds_bucket{le="+Inf"} 1\n'
+                         "latency_seconds_sum 0.05\n"
+                         "latency_seconds_count 1\n", self.registry.to_prometheus())
+
+    def test_snapshot_writer(self):
+        text_path = os.path.join(self.directory, 'metrics.txt')
+        prometheus_path = os.path.join(self.directory, 'metrics.prom')
+        self.registry.counter("baskets_total").inc()
+        SnapshotWriter(self.registry, 60, text_path, prometheus_path).start().stop()
+        with open(text_path) as in_file:
+            self.assertIn("baskets_total 1", in_file.read())
+        with open(prometheus_path) as in_file:
+            self.assertIn("baskets_total 1", in_file.read())
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()
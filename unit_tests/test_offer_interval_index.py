@@ -0,0 +1,85 @@
+import datetime as dt
+import random
+import unittest
+from basket.basket_state import BasketState
+from mock_services.offer import OfferFlat
+from pricebasket.basket_result_cache import BasketResultCache
+from pricebasket.cart_product import CartProduct
+from pricebasket.catalog_snapshot import CatalogSnapshot
+from pricebasket.catalog_index import CatalogIndex
+from pricebasket.offer_interval_index import OfferIntervalIndex
+from pricebasket.price_basket import PriceBasket
+from pricebasket.two_phase_price_basket import TwoPhasePriceBasket
+
+
+class TestOfferIntervalIndex(unittest.TestCase):
+
+    def test_same_offers_as_checking_every_offer(self):
+        generator = random.Random(5)
+        day = dt.datetime(2022, 1, 1)
+        offers = []
+        for offer_id in range(300):
+            start = day + dt.timedelta(days=generator.randint(0, 60))
+            end = start + dt.timedelta(days=generator.randint(0, 30))
+            offers.append(OfferFlat(offer_id, "offer", "1", generator.choice([start, None]), end, True, 10))
+        offers.append(OfferFlat(300, "offer", "1", None, None, True, 10))
+        index = OfferIntervalIndex(offers)
+
+        for hours in range(0, 24 * 100, 7):
+            timestamp = day + dt.timedelta(hours=hours)
+            expected = {x.offer_id for x in offers
+                        if (x.start_date is None or x.start_date <= timestamp) and x.end_date is None or
+                        (x.start_date is None or x.start_date <= timestamp) and timestamp <= x.end_date}
+            self.assertEqual(expected, index.valid_at(timestamp))
+            self.assertEqual(expected, set(index.find(timestamp)))
+
+    def test_window(self):
+        offer = OfferFlat(1, "offer", "1", dt.datetime(2022, 2, 12), dt.datetime(2022, 3, 12), True, 10)
+        index = OfferIntervalIndex([offer])
+        self.assertEqual(index.window(dt.datetime(2022, 2, 20)), index.window(dt.datetime(2022, 3, 1)))
+        self.assertNotEqual(index.window(dt.datetime(2022, 3, 12)), index.window(dt.datetime(2022, 3, 1)))
+        self.assertEqual({1}, index.valid_at(dt.datetime(2022, 3, 12)))
+        self.assertEqual(frozenset(), index.valid_at(dt.datetime(2022, 3, 12, 0, 1)))
+
+    def test_get_offers_at(self):
+        scheduled = OfferFlat(1, "Tea 10% off in March", "1", dt.datetime(2022, 3, 1), dt.datetime(2022, 3, 31),
+                              True, 10)
+        inactive = OfferFlat(2, "Tea 20% off", "1", dt.datetime(2022, 1, 1), dt.datetime(2022, 12, 31), False, 20)
+        tea = CartProduct("1", "tea", "drinks", 2.0, "box", [scheduled, inactive])
+        catalog_index = CatalogIndex([tea])
+
+        self.assertEqual((), catalog_index.get_offers_at(tea, dt.datetime(2022, 2, 1)))
+        self.assertEqual((scheduled,), catalog_index.get_offers_at(tea, dt.datetime(2022, 3, 15)))
+        # activation takes effect without building the index again
+        inactive.active = True
+        self.assertEqual((scheduled, inactive), catalog_index.get_offers_at(tea, dt.datetime(2022, 3, 15)))
+        self.assertEqual((scheduled, inactive), catalog_index.get_offers_at(tea, None))
+
+    def test_price_basket_at(self):
+        for price_basket in [PriceBasket(), TwoPhasePriceBasket()]:
+            # offers of the cache are valid from 12 February to 12 March 2022
+            self.assertEqual(('3.10', '3.00'), price_basket.price_basket(
+                BasketState.get_products_in_basket_state(["apples", "milk", "bread"]), dt.datetime(2022, 3, 1))[:2])
+            self.assertEqual(('3.10', '3.10'), price_basket.price_basket(
+                BasketState.get_products_in_basket_state(["apples", "milk", "bread"]), dt.datetime(2022, 4, 1))[:2])
+
+    def test_cached_results_not_reused_after_deactivation(self):
+        # snapshot of its own so the offers of the shared catalog are not changed
+        snapshot = CatalogSnapshot(CatalogSnapshot.shared().path)
+        price_basket = PriceBasket(snapshot, BasketResultCache())
+        items = ["apples", "milk", "bread"]
+        priced_at = dt.datetime(2022, 3, 1)
+        self.assertEqual(('3.10', '3.00'), price_basket.price_basket(
+            BasketState.get_products_in_basket_state(items), priced_at)[:2])
+
+        apples = snapshot.catalog_index.get_product_by_description("apples")
+        apples.offers[0].active = False
+        self.assertEqual(('3.10', '3.10'), price_basket.price_basket(
+            BasketState.get_products_in_basket_state(items), priced_at)[:2])
+        apples.offers[0].active = True
+        self.assertEqual(('3.10', '3.00'), price_basket.price_basket(
+            BasketState.get_products_in_basket_state(items), priced_at)[:2])
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()
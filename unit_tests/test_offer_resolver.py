@@ -0,0 +1,111 @@
+import datetime as dt
+import itertools
+import random
+import unittest
+from basket.basket_state import BasketState
+from mock_services.offer import OfferFlat, OfferGroup
+from pricebasket.cart_product import CartProduct
+from pricebasket.offer_resolver import OfferOption, OfferResolver
+from pricebasket.optimal_offer_price_basket import OptimalOfferPriceBasket
+from pricebasket.price_basket import PriceBasket
+from rule_engine.condition_rule import ConditionRule
+from rule_engine.custom_operator import CustomOperator
+
+DATE = dt.datetime(2022, 2, 12)
+
+
+def option(offer_id, target, carrier, value):
+    return OfferOption(OfferFlat(offer_id, "offer", None, DATE, DATE, True, 10), target, carrier, value, ())
+
+
+class TestOfferResolver(unittest.TestCase):
+
+    def test_line_discounted_once(self):
+        options = [option(1, 0, None, 5), option(2, 0, None, 7), option(3, 1, None, 1)]
+        self.assertEqual([2, 3], [x.offer.offer_id for x in OfferResolver().resolve(options, 2)])
+
+    def test_pair_chosen_when_worth_more_than_singles(self):
+        options = [option(1, 0, None, 3), option(2, 1, 0, 5), option(3, 1, None, 1)]
+        self.assertEqual([2], [x.offer.offer_id for x in OfferResolver().resolve(options, 2)])
+        options = [option(1, 0, None, 3), option(2, 1, 0, 3), option(3, 1, None, 1)]
+        self.assertEqual([1, 3], [x.offer.offer_id for x in OfferResolver().resolve(options, 2)])
+
+    def test_policies(self):
+        options = [option(1, 1, 0, 2), option(2, 1, None, 5)]
+        self.assertEqual([1], [x.offer.offer_id for x in OfferResolver(OfferResolver.FIRST).resolve(options, 2)])
+        # options scored 0 or less are never applied
+        self.assertEqual([], OfferResolver(lambda x: -x.value).resolve(options, 2))
+        self.assertEqual([1], [x.offer.offer_id for x in OfferResolver(lambda x: x.offer.offer_id == 1).resolve(
+            options, 2)])
+        with self.assertRaises(ValueError):
+            OfferResolver("cheapest")
+
+    def test_largest_discount_found(self):
+        generator = random.Random(3)
+        for _ in range(200):
+            lines = generator.randint(1, 7)
+            options = []
+            for offer_id in range(generator.randint(1, 12)):
+                target = generator.randrange(lines)
+                carrier = generator.choice([None, generator.randrange(lines)])
+                options.append(option(offer_id, target, None if carrier == target else carrier,
+                                      generator.randint(1, 20)))
+
+            chosen = OfferResolver().resolve(options, lines)
+            best = 0
+            for count in range(len(options) + 1):
+                for subset in itertools.combinations(options, count):
+                    used = [line for x in subset for line in x.lines()]
+                    if len(used) == len(set(used)):
+                        best = max(best, sum(x.value for x in subset))
+            self.assertEqual(best, sum(x.value for x in chosen))
+
+
+class TestOptimalOfferPriceBasket(unittest.TestCase):
+
+    def test_same_results_as_price_basket(self):
+        for items in [["apples", "milk", "bread"], ["soup", "bread"], ["apples", "apples"], ["milk"]]:
+            expected = PriceBasket().price_basket(BasketState.get_products_in_basket_state(items))
+            result = OptimalOfferPriceBasket().price_basket(BasketState.get_products_in_basket_state(items))
+            self.assertEqual(expected[:2], result[:2])
+            self.assertEqual(str(expected[2]), str(result[2]))
+
+    def test_product_carrying_group_offer_billed(self):
+        for items in [["soup", "soup", "bread"], ["bread", "soup", "soup"]]:
+            sub_total, total, discounted_items = OptimalOfferPriceBasket().price_basket(
+                BasketState.get_products_in_basket_state(items))
+            self.assertEqual(("2.10", "1.70"), (sub_total, total))
+            self.assertEqual(["Bread 50 % off: -40p"], [str(x) for x in discounted_items])
+
+    def test_best_offer_applied_once(self):
+        tea = CartProduct("1", "tea", "drinks", 2.0, "box")
+        milk = CartProduct("2", "milk", "dairy", 1.0, "bottle")
+        tea.offers = [OfferFlat(1, "Tea 10% off", "1", DATE, DATE, True, 10),
+                      OfferFlat(2, "Tea 20% off", "1", DATE, DATE, True, 20),
+                      OfferGroup(3, "Buy tea get milk half price", ["1"], DATE, DATE, True, "2", 50,
+                                 [ConditionRule(CustomOperator.EqualOrGreater, "1", 1)])]
+        price_basket = OptimalOfferPriceBasket.from_cart_products([tea, milk])
+
+        sub_total, total, discounted_items = price_basket.price_basket(
+            BasketState.get_products_in_basket_state(["tea", "milk"]))
+        # tea is billed at the regular price, milk half price takes 50p off against 40p for tea 20% off
+        self.assertEqual(["Milk 50 % off: -50p"], [str(x) for x in discounted_items])
+        self.assertEqual(("3.00", "2.50"), (sub_total, total))
+
+        price_basket.offer_resolver = OfferResolver(OfferResolver.FIRST)
+        sub_total, total, discounted_items = price_basket.price_basket(
+            BasketState.get_products_in_basket_state(["tea", "milk"]))
+        self.assertEqual(["Tea 10 % off: -20p"], [str(x) for x in discounted_items])
+        self.assertEqual(("3.00", "2.80"), (sub_total, total))
+
+        # with milk at 60p the group offer takes 30p off, tea 20% off is better
+        milk.price = 0.6
+        price_basket = OptimalOfferPriceBasket.from_cart_products([tea, milk])
+        sub_total, total, discounted_items = price_basket.price_basket(
+            BasketState.get_products_in_basket_state(["tea", "milk"]))
+        self.assertEqual(["Tea 20 % off: -40p"], [str(x) for x in discounted_items])
+        self.assertEqual(("2.60", "2.20"), (sub_total, total))
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+from basket.basket_state import BasketState
+from price_basket_result_display.PriceBasketResultDisplay import PriceBasketResultDisplay
+from pricebasket.currency_utility_methods import CurrencyUtilityMethods
+from pricebasket.pence_price_basket import PencePriceBasket
+from pricebasket.price_basket import PriceBasket
+
+
+class TestPencePriceBasket(unittest.TestCase):
+
+    def test_pence_same_as_float_pricing(self):
+        for items in [['apples', 'milk', 'bread'], ['bread', 'bread'], ['soup', 'soup', 'bread'], ['apples'] * 7]:
+            sub_total, total, discounted_items = PencePriceBasket().price_basket(
+                BasketState.get_products_in_basket_state(items))
+            expected_sub_total, expected_total, expected_items = PriceBasket().price_basket(
+                BasketState.get_products_in_basket_state(items))
+
+            self.assertIsInstance(total, int)
+            self.assertEqual(repr(PriceBasketResultDisplay(expected_sub_total, expected_items, expected_total)),
+                             repr(PriceBasketResultDisplay.from_pence(sub_total, discounted_items, total)))
+
+    def test_rounding_rules(self):
+        self.assertEqual(29, CurrencyUtilityMethods.to_pence(0.29))
+        self.assertEqual(33, CurrencyUtilityMethods.percentage_in_pence(50, 65))
+        self.assertEqual(8, CurrencyUtilityMethods.percentage_in_pence(12.5, 65))
+        self.assertEqual("-0.05", CurrencyUtilityMethods.format_pence(-5))
+        self.assertEqual("£1.30", CurrencyUtilityMethods.get_currency_with_unit_from_pence(130))
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+from basket.basket_state import BasketState
+from pricebasket.price_basket import PriceBasket
+
+
+class TestPriceBaskets(unittest.TestCase):
+
+    @staticmethod
+    def get_baskets():
+        items = [['apples', 'milk', 'bread'], ['bread', 'bread'], ['soup', 'soup', 'bread'], ['milk'], []]
+        return (BasketState.get_products_in_basket_state(x) for x in items * 20)
+
+    def test_price_baskets_in_order(self):
+        expected = [(x[0], x[1], len(x[2])) for x in PriceBasket().price_baskets(self.get_baskets())]
+        self.assertEqual(("3.10", "3.00", 1), expected[0])
+        self.assertEqual(("0.80", "0.40", 1), expected[2])
+
+        for mode in ["threads", "processes"]:
+            output = PriceBasket().price_baskets(self.get_baskets(), mode=mode, workers=2, chunksize=3)
+            self.assertEqual(expected, [(x[0], x[1], len(x[2])) for x in output])
+
+    def test_price_baskets_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            list(PriceBasket().price_baskets(self.get_baskets(), mode="gpu"))
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()
@@ -0,0 +1,130 @@
+import http.client
+import json
+import threading
+import unittest
+from instrumentation.metrics_registry import MetricsRegistry
+from pricebasket.price_basket import PriceBasket
+from pricing_service.pricing_server import PricingServer
+
+
+class BlockedPriceBasket(PriceBasket):
+    """
+    Prices a basket only once released, so requests stay in the server as long as the test needs
+    """
+
+    __slots__ = []
+
+    started = threading.Semaphore(0)
+    released = threading.Event()
+
+    def price_basket(self, basket, priced_at=None):
+        BlockedPriceBasket.started.release()
+        BlockedPriceBasket.released.wait(5)
+        return super().price_basket(basket, priced_at)
+
+
+class TestPricingServer(unittest.TestCase):
+
+    def start_server(self, **kwargs):
+        self.server = PricingServer(port=0, **kwargs).start()
+        self.addCleanup(self.server.stop)
+        connection = http.client.HTTPConnection(*self.server.address, timeout=5)
+        self.addCleanup(connection.close)
+        return connection
+
+    def request(self, connection, method, path, body=None):
+        connection.request(method, path, json.dumps(body) if body is not None else None,
+                           {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        return response.status, response.read()
+
+    def test_price_on_kept_alive_connection(self):
+        connection = self.start_server(metrics=MetricsRegistry.enable(MetricsRegistry()))
+        self.addCleanup(MetricsRegistry.disable)
+        for _ in range(3):
+            status, body = self.request(connection, "POST", "/price", {"items": ["Apples", "Milk", "Bread"]})
+            self.assertEqual(200, status)
+            self.assertEqual({"subtotal": "3.10", "total": "3.00", "discounts": ["Apples 10 % off: -10p"]},
+                             json.loads(body))
+
+        status, body = self.request(connection, "POST", "/price", {"items": ["apples"], "priced_at": "2023-01-01"})
+        self.assertEqual({"subtotal": "1.00", "total": "1.00", "discounts": []}, json.loads(body))
+
+        status, body = self.request(connection, "GET", "/metrics")
+        self.assertEqual(200, status)
+        self.assertIn(b"pricing_server_requests_total 4", body)
+        self.assertIn(b"pricebasket_baskets_total 4", body)
+
+    def test_bad_requests(self):
+        connection = self.start_server()
+        self.assertEqual(400, self.request(connection, "POST", "/price", {"products": "milk"})[0])
+        self.assertEqual(400, self.request(connection, "POST", "/price", ["milk"])[0])
+        self.assertEqual(400, self.request(connection, "POST", "/price", {"items": ["milk"], "region": "../x"})[0])
+        self.assertEqual(400, self.request(connection, "POST", "/price", {"items": ["milk"], "priced_at": 5})[0])
+        self.assertEqual(404, self.request(connection, "GET", "/price")[0])
+        self.assertEqual(200, self.request(connection, "GET", "/health")[0])
+
+    def test_negative_content_length(self):
+        connection = self.start_server()
+        connection.putrequest("POST", "/price")
+        connection.putheader("Content-Length", "-1")
+        connection.endheaders()
+        response = connection.getresponse()
+        self.assertEqual(400, response.status)
+        response.read()
+
+    def test_metrics_not_enabled_by_server(self):
+        connection = self.start_server()
+        self.assertIsNone(MetricsRegistry.active())
+        self.assertEqual(200, self.request(connection, "POST", "/price", {"items": ["milk"]})[0])
+        self.assertEqual(1, self.server.metrics.get("pricing_server_requests_total").value)
+
+    def test_load_shedding(self):
+        BlockedPriceBasket.started = threading.Semaphore(0)
+        BlockedPriceBasket.released = threading.Event()
+        connection = self.start_server(workers=2, queue_size=0, price_basket_class=BlockedPriceBasket)
+        statuses = []
+
+        def send():
+            sender = http.client.HTTPConnection(*self.server.address, timeout=5)
+            statuses.append(self.request(sender, "POST", "/price", {"items": ["milk"]})[0])
+            sender.close()
+
+        threads = [threading.Thread(target=send) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        # both workers are pricing, the server is full until they are released
+        for _ in threads:
+            self.assertTrue(BlockedPriceBasket.started.acquire(timeout=5))
+
+        for _ in range(4):
+            self.assertEqual(503, self.request(connection, "POST", "/price", {"items": ["milk"]})[0])
+        BlockedPriceBasket.released.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([200, 200], statuses)
+        self.assertEqual(4, self.server.metrics.get("pricing_server_shed_total").value)
+
+    def test_price_on_worker_processes(self):
+        MetricsRegistry.enable(MetricsRegistry())
+        self.addCleanup(MetricsRegistry.disable)
+        connection = self.start_server(workers=2, mode="processes", metrics=MetricsRegistry.active())
+        for _ in range(3):
+            status, body = self.request(connection, "POST", "/price", {"items": ["Apples", "Milk", "Bread"]})
+            self.assertEqual(200, status)
+            self.assertEqual({"subtotal": "3.10", "total": "3.00", "discounts": ["Apples 10 % off: -10p"]},
+                             json.loads(body))
+        self.assertEqual(400, self.request(connection, "POST", "/price", {"items": ["milk"], "priced_at": "x"})[0])
+
+        status, body = self.request(connection, "GET", "/metrics")
+        self.assertIn(b"pricing_server_requests_total 4", body)
+        self.assertIn(b"pricebasket_baskets_total 3", body)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            PricingServer(port=0, mode="fibers")
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()
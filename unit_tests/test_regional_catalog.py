@@ -0,0 +1,130 @@
+import datetime as dt
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from basket.basket_state import BasketState
+from mock_services.change_set import ChangeSet
+from mock_services.offer import OfferFlat
+from mock_services.price import Price
+from mock_services.product import Product
+from pricebasket.basket_result_cache import BasketResultCache
+from pricebasket.cart_product import CartProduct
+from pricebasket.catalog_snapshot import CatalogSnapshot
+from pricebasket.optimal_offer_price_basket import OptimalOfferPriceBasket
+from pricebasket.price_basket import PriceBasket
+
+
+class TestRegionalCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cartProducts.pkl')
+        shutil.copy('Cache/cartProducts.pkl', self.path)
+        self.snapshot = CatalogSnapshot(self.path)
+        self.base = self.snapshot.catalog_index
+        self.apples = self.base.get_product_by_description("apples")
+        self.milk = self.base.get_product_by_description("milk")
+        self.bread = self.base.get_product_by_description("bread")
+        self.apples_offer = OfferFlat(1, "Apples 50% off in London", self.apples.product_id,
+                                      dt.datetime(2022, 2, 12), dt.datetime(2022, 3, 12), True, 50)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def prepare_london(self, milk_price=1.50):
+        return CartProduct.prepare_region("london", [self.apples_offer],
+                                          [Price(self.milk.product_id, milk_price),
+                                           Price(self.bread.product_id, self.bread.price)], self.snapshot)
+
+    def price(self, price_basket, items):
+        return price_basket.price_basket(BasketState.get_products_in_basket_state(items))
+
+    def rebuild_base(self, prices):
+        products = [Product(x.product_id, x.product_description, x.product_type, x.price, x.product_unit)
+                    for x in self.base]
+        price_list = [Price(x.product_id, prices.get(x.product_id, x.price)) for x in self.base]
+        return CartProduct.prepare_cart_products(products, list(self.base.get_offers()), price_list, path=self.path)
+
+    def test_overlay_stores_overrides_only(self):
+        self.assertIsNotNone(self.prepare_london())
+        prices, offers = CatalogSnapshot.read_region("london", self.path)
+        # bread costs the same as in the base catalog
+        self.assertEqual({self.milk.product_id: 1.50}, prices)
+        self.assertEqual({self.apples.product_id: [1]}, {x: [y.offer_id for y in z] for x, z in offers.items()})
+        self.assertEqual(["london"], CatalogSnapshot.regions(self.path))
+        price_list, _ = CatalogSnapshot.read_region_feed("london", self.path)
+        self.assertEqual([1.50, 0.80], [x.price_per_unit for x in price_list])
+
+    def test_base_rebuild_prepares_overrides_again(self):
+        self.prepare_london()
+        self.assertIsNotNone(self.rebuild_base({self.bread.product_id: 0.90, self.milk.product_id: 1.50}))
+        prices, _ = CatalogSnapshot.read_region("london", self.path)
+        # bread of the region is an override now, milk costs the same as in the base catalog
+        self.assertEqual({self.bread.product_id: 0.80}, prices)
+        self.assertEqual(('2.40', '2.40'), self.price(PriceBasket(self.snapshot), ["bread", "milk"])[:2])
+        self.assertEqual(('2.30', '2.30'), self.price(PriceBasket(self.snapshot, region="london"),
+                                                      ["bread", "milk"])[:2])
+
+    def test_change_set_applied_to_base_only(self):
+        self.prepare_london()
+        CartProduct.apply_change_set(ChangeSet(1, prices=[Price(self.milk.product_id, 1.40)]), self.snapshot)
+        self.assertEqual('1.40', self.price(PriceBasket(self.snapshot), ["milk"])[0])
+        self.assertEqual('1.50', self.price(PriceBasket(self.snapshot, region="london"), ["milk"])[0])
+
+    def test_region_removes_offers(self):
+        soup = self.base.get_product_by_description("soup")
+        CartProduct.prepare_region("leeds", [], [], self.snapshot, products_without_offers=[soup.product_id])
+        leeds = self.snapshot.get_region("leeds")
+        self.assertEqual((), leeds.get_product_by_id(soup.product_id).offers)
+        self.assertEqual(('2.10', '2.10'), self.price(PriceBasket(self.snapshot, region="leeds"),
+                                                      ["soup", "soup", "bread"])[:2])
+
+    def test_regional_lookups_resolve_overlay_then_base(self):
+        self.prepare_london()
+        london = self.snapshot.get_region("london")
+        self.assertIs(london, self.snapshot.get_region("london"))
+        self.assertIs(self.base, london.base)
+
+        self.assertIs(self.bread, london.match_description("bread"))
+        milk = london.get_product_by_id(self.milk.product_id)
+        self.assertEqual(1.50, milk.price)
+        self.assertIs(milk, london.match_description("milk"))
+        # base catalog is not changed
+        self.assertEqual(1.30, self.base.get_product_by_id(self.milk.product_id).price)
+        self.assertEqual(4, len(london))
+        self.assertEqual([x.product_id for x in self.base], [x.product_id for x in london])
+
+    def test_price_basket_in_region(self):
+        self.prepare_london()
+        items = ["apples", "milk", "bread"]
+        for cls in [PriceBasket, OptimalOfferPriceBasket]:
+            self.assertEqual(('3.30', '2.80'), self.price(cls(self.snapshot, region="london"), items)[:2])
+            self.assertEqual(('3.10', '3.00'), self.price(cls(self.snapshot), items)[:2])
+        # region without overrides prices as the base catalog
+        self.assertEqual(('3.10', '3.00'), self.price(PriceBasket(self.snapshot, region="leeds"), items)[:2])
+
+        # regional catalog can be sent to worker processes
+        london = pickle.loads(pickle.dumps(self.snapshot.get_region("london")))
+        self.assertEqual(('3.30', '2.80'), self.price(PriceBasket.from_catalog_index(london), items)[:2])
+
+    def test_result_cache_by_region(self):
+        result_cache = BasketResultCache()
+        self.prepare_london()
+        items = ["milk"]
+        self.assertEqual('1.30', self.price(PriceBasket(self.snapshot, result_cache), items)[0])
+        self.assertEqual('1.50', self.price(PriceBasket(self.snapshot, result_cache, "london"), items)[0])
+
+        # overlay is loaded again when its file changes
+        self.prepare_london(1.70)
+        os.utime(CatalogSnapshot.region_path("london", self.path), ns=(0, 0))
+        self.assertEqual('1.70', self.price(PriceBasket(self.snapshot, result_cache, "london"), items)[0])
+
+    def test_region_name_validated(self):
+        with self.assertRaises(ValueError):
+            PriceBasket(self.snapshot, region="../cartProducts")
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()
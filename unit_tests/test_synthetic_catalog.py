@@ -0,0 +1,37 @@
+import os
+import unittest
+from benchmarks.bench_pipeline import run_benchmark, summarize
+from benchmarks.synthetic_catalog import SyntheticCatalog
+from pricebasket.catalog_snapshot import CART_PRODUCTS_CACHE
+
+
+class TestSyntheticCatalog(unittest.TestCase):
+
+    def test_catalog_is_seeded(self):
+        first = SyntheticCatalog(100, 10, seed=7)
+        second = SyntheticCatalog(100, 10, seed=7)
+        self.assertEqual([x.product_id for x in first.products], [x.product_id for x in second.products])
+        self.assertEqual([x.price_per_unit for x in first.price_list], [x.price_per_unit for x in second.price_list])
+        self.assertEqual(first.generate_baskets(5, 4), second.generate_baskets(5, 4))
+        self.assertEqual(10, len(first.offers))
+
+    def test_summarize(self):
+        summary = summarize([x / 1e6 for x in range(1, 101)])
+        self.assertAlmostEqual(50, summary["p50_us"])
+        self.assertAlmostEqual(99, summary["p99_us"])
+        self.assertAlmostEqual(100, summary["max_us"])
+
+    def test_run_benchmark(self):
+        working_directory = os.getcwd()
+        cache_stat = os.stat(CART_PRODUCTS_CACHE)
+        results = run_benchmark(products=50, offers=10, baskets=20, basket_size=3, repeat=1)
+        self.assertEqual(["prepare_cart_products", "cache_load", "basket_state", "price_basket", "render"],
+                         list(results["phases"]))
+        self.assertEqual(20, results["phases"]["price_basket"]["count"])
+        # caches are written in a temporary directory without changing the working directory
+        self.assertEqual(working_directory, os.getcwd())
+        self.assertEqual(cache_stat.st_mtime_ns, os.stat(CART_PRODUCTS_CACHE).st_mtime_ns)
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+from basket.basket_state import BasketState, BilledState
+from basket.sku_basket import SkuBasket
+from pricebasket.price_basket import PriceBasket
+from pricebasket.two_phase_price_basket import TwoPhasePriceBasket
+
+
+class TestTwoPhasePriceBasket(unittest.TestCase):
+
+    def setUp(self):
+        self.price_basket = TwoPhasePriceBasket()
+
+    def test_same_results_as_price_basket(self):
+        for items in [["apples", "milk", "bread"], ["soup", "soup", "bread"], ["bread", "soup", "soup"],
+                      ["soup", "bread"], ["apples", "apples"], ["milk"], ["unknown"], []]:
+            expected = PriceBasket().price_basket(BasketState.get_products_in_basket_state(items))
+            result = self.price_basket.price_basket(BasketState.get_products_in_basket_state(items))
+            self.assertEqual(expected[:2], result[:2])
+            self.assertEqual(str(expected[2]), str(result[2]))
+
+    def test_basket_not_modified(self):
+        basket = BasketState.get_products_in_basket_state(["bread", "soup", "soup"])
+        items = list(basket)
+        self.assertEqual(("0.80", "0.40"), self.price_basket.price_basket(basket)[:2])
+        self.assertEqual(items, basket)
+        self.assertTrue(all(x.billing_state == BilledState.Unprocessed for x in basket))
+
+    def test_processed_items_not_billed(self):
+        basket = [BasketState("milk", 1), BasketState("bread", 1, BilledState.Processed)]
+        self.assertEqual(("1.30", "1.30"), self.price_basket.price_basket(basket)[:2])
+
+    def test_price_quantities(self):
+        basket = SkuBasket(["apples"] * 1000 + ["milk"] * 1000)
+        sub_total, total, discounted_items = self.price_basket.price_quantities(basket)
+        self.assertEqual(("2300.00", "2200.00"), (sub_total, total))
+        self.assertEqual(1, len(discounted_items))
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()
@@ -0,0 +1,74 @@
+import os
+import pickle
+import random
+import tempfile
+import unittest
+import uuid
+from basket.basket_state import BasketState
+from benchmarks.synthetic_catalog import SyntheticCatalog
+from mock_services.offer import OfferFlat, OfferGroup
+from pricebasket.cart_product import CartProduct
+from pricebasket.price_basket import PriceBasket
+
+try:
+    from pricebasket.vectorized_price_basket import VectorizedPriceBasket
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestVectorizedPriceBasket(unittest.TestCase):
+
+    def assert_same_as_price_basket(self, baskets, cart_products=None):
+        engine = VectorizedPriceBasket(cart_products)
+        result = engine.price_baskets(*engine.columns_from_baskets(baskets))
+        output = dict(zip(result.basket_ids.tolist(), engine.to_price_basket_results(result)))
+
+        price_basket = PriceBasket() if cart_products is None else PriceBasket.from_cart_products(cart_products)
+        for basket_id, items in enumerate(baskets):
+            expected = price_basket.price_basket(BasketState.get_products_in_basket_state(items))
+            sub_total, total, discounted_items = output.get(basket_id, ("0.00", "0.00", []))
+            self.assertEqual((expected[0], expected[1]), (sub_total, total), items)
+            self.assertEqual(list(map(repr, expected[2])), list(map(repr, discounted_items)), items)
+
+    @staticmethod
+    def prepare_cart_products(catalog, offers):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cart_products.pkl')
+            CartProduct.prepare_cart_products(catalog.products, offers, catalog.price_list, path=path)
+            with open(path, 'rb') as in_file:
+                return pickle.load(in_file)
+
+    def test_unit_test_baskets(self):
+        self.assert_same_as_price_basket([['apples', 'milk', 'bread'], ['bread', 'bread'], ['soup', 'soup', 'bread'],
+                                          []])
+
+    def test_random_baskets(self):
+        generator = random.Random(7)
+        products = ['soup', 'bread', 'milk', 'apples', 'tea']
+        baskets = [[generator.choice(products) for _ in range(generator.randint(0, 8))] for _ in range(500)]
+        self.assert_same_as_price_basket(baskets)
+
+    def test_random_catalogs(self):
+        # totals are added in the order of PriceBasket, otherwise some of them differ by a penny
+        for seed in range(3):
+            catalog = SyntheticCatalog(300, 120, seed=seed)
+            self.assert_same_as_price_basket(catalog.generate_baskets(500, 8),
+                                             self.prepare_cart_products(catalog, catalog.offers))
+
+    def test_discounted_products_with_offers(self):
+        # result of PriceBasket depends on whether the discounted product is entered before the product carrying
+        # the offer
+        catalog = SyntheticCatalog(60, 30, seed=3)
+        offers = list(catalog.offers)
+        for number, offer in enumerate(catalog.offers):
+            if isinstance(offer, OfferGroup):
+                offers.append(OfferFlat(uuid.UUID(int=number, version=4), offer.offer_description,
+                                        offer.discounted_product_id, offer.start_date, offer.end_date, True, 10))
+        cart_products = self.prepare_cart_products(catalog, offers)
+        self.assert_same_as_price_basket(catalog.generate_baskets(500, 6, 0.9), cart_products)
+
+    if __name__ == '__main__':
+        # begin the unittest.main()
+        unittest.main()